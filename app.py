@@ -1,13 +1,28 @@
+import time
+
+START = time.perf_counter()
+
 import streamlit as st
 import os
-import numpy as np
 import re
+from models.resources import KeyedResources, resources
 from models.scaledown_client import ScaleDownClient
 from models.paper_compressor import PaperCompressor
+from models.chunker import TokenChunker
 from models.text_encoder import TextEncoder
-from models.vector_engine import VectorEngine
+from models.document_indexer import index_document
+from models.index_service import DEFAULT_USER, Collection, index_directory, namespace_name, open_service
 from models.citation_graph import CitationGraph
+from models.corpus_citation_graph import CorpusCitationGraph, find_doi, parse_references
 from models.recommender import Recommender
+from models.search_cache import SearchCache
+from models.dedup import file_hash
+from models.metrics import metrics
+from models.job_runner import (
+    CANCELLED, DONE, FAILED, FINISHED, QUEUED, RUNNING, JobCancelled, JobRunner, job_key
+)
+
+IMPORT_TIME = time.perf_counter() - START
 
 # HIGHLIGHT FUNCTION
 def highlight_query(text, query):
@@ -25,19 +40,56 @@ def highlight_query(text, query):
 st.set_page_config(page_title="Sci-Lit Explorer", layout="wide")
 
 
-# SESSION STATE INITIALIZATION
-if "vector_db" not in st.session_state:
-    st.session_state.vector_db = VectorEngine(dimension=768)
-
-if "encoder" not in st.session_state:
-    st.session_state.encoder = TextEncoder()
+# SHARED RESOURCES
+# Built once per process and shared by all sessions; nothing heavy is
+# loaded before the first render. The warm-up thread builds them in the
+# background, slowest first, and resources.get() waits for it if needed.
+def open_recommender(namespace):
+    """
+    The paper catalog of one collection. A new one starts with the
+    papers already in the collection's index.
+    """
+    # Locked while the app runs, so ingest.py refuses to write it meanwhile
+    recommender = Recommender(store_dir=index_directory(namespace, "data/recommender"), lock=True)
+
+    if not len(recommender):
+        index_service = resources.get("index_service")
+        for source in index_service.sources(namespace):
+            recommender.add_paper(source, index_service.paper_embedding(namespace, source))
+        recommender.save()
+
+    return recommender
+
+
+resources.register("encoder", TextEncoder)
+resources.register("index_service", open_service)
+# Like the index, recommendations and the library citation graph are
+# kept per collection
+resources.register("recommenders", lambda: KeyedResources(open_recommender))
+resources.register("corpus_graphs", lambda: KeyedResources(
+    lambda namespace: CorpusCitationGraph(index_directory(namespace, "data/citation_graph"), lock=True)
+))
+resources.register("search_cache", lambda: SearchCache(resources.get("encoder")))
+# One client (HTTP session and response cache) per API key, shared by
+# the ingest jobs
+resources.register("scaledown_clients", lambda: KeyedResources(ScaleDownClient))
+resources.register("jobs", JobRunner)
+
+resources.warm_up("encoder", "index_service")
 
-if "recommender" not in st.session_state:
-    st.session_state.recommender = Recommender()
 
+# SESSION STATE INITIALIZATION
 if "processed" not in st.session_state:
     st.session_state.processed = False
 
+# Ingestion jobs started by this session, their arguments (for retries),
+# the finished ones already shown and (level, text) notes for the sidebar
+if "jobs" not in st.session_state:
+    st.session_state.jobs = []
+    st.session_state.job_args = {}
+    st.session_state.shown_jobs = set()
+    st.session_state.job_notices = []
+
 
 # SIDEBAR
 st.sidebar.title("Sci-Lit Explorer")
@@ -66,138 +118,273 @@ if use_ai and not user_api_key:
 if use_ai and user_api_key:
     st.sidebar.success("AI Compression Enabled")
 
+# Collections persist across sessions and are shared with ingest.py
+collection_name = st.sidebar.text_input("Collection", value="default")
+
+try:
+    st.session_state.namespace = namespace_name(DEFAULT_USER, collection_name)
+except ValueError:
+    st.sidebar.warning("Collection names may only use letters, digits, '_', '-' and '.'")
+    st.session_state.namespace = namespace_name(DEFAULT_USER)
+
 if st.sidebar.button("Clear Database"):
-    st.session_state.vector_db.reset()
+    # Stop this session's ingestion and let the same files be indexed
+    # again. A cancelled job still writes (and rolls back) until its next
+    # check, so wait for it before clearing.
+    jobs = resources.get("jobs")
+    for job_id in st.session_state.jobs:
+        jobs.cancel(job_id)
+    for job_id in st.session_state.jobs:
+        jobs.wait(job_id)
+        jobs.forget(job_id)
+    st.session_state.jobs = []
+    st.session_state.shown_jobs.clear()
+
+    resources.get("index_service").reset(st.session_state.namespace)
+    resources.get("recommenders").get(st.session_state.namespace).reset()
+    resources.get("corpus_graphs").get(st.session_state.namespace).reset()
     st.session_state.processed = False
     st.sidebar.success("Database Cleared!")
 
 
-# PROCESS FILE (ONLY ONCE)
-if uploaded_file and not st.session_state.processed:
+# PROCESS FILES IN THE BACKGROUND
+# The pipeline runs as a job, so the page stays responsive and papers
+# already indexed can be searched while new ones are ingested.
+def ingest_paper(job, save_path, name, namespace, api_key, digest):
+    """
+    Extract, optionally compress, and index one uploaded paper, then add
+    it to the recommender and the library citation graph. Runs in a job
+    thread: it reports through the job instead of st.* calls.
 
-    st.session_state.vector_db.reset()
+    Returns:
+        {"title", "citations", "full_text"} of the paper
+    """
+    job.update("Extracting text")
 
-    with st.spinner("Processing Paper..."):
+    # Chunks are sized by the encoder's own tokenizer
+    compressor = PaperCompressor(
+        chunker=TokenChunker.for_encoder(resources.get("encoder"))
+    )
+    data = compressor.extract_content(save_path)
 
-        # Save file
-        os.makedirs("data/uploads", exist_ok=True)
-        save_path = os.path.join("data/uploads", uploaded_file.name)
+    if "error" in data:
+        raise ValueError(data["error"])
 
-        with open(save_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+    full_text = data["full_text"]
+    job.check_cancelled()
 
-        # Extract content
-        compressor = PaperCompressor()
-        data = compressor.extract_content(save_path)
+    # 🔹 CONDITIONAL COMPRESSION
+    if api_key:
+        job.update("Compressing paper with ScaleDown", done=0)
+        try:
+            scaledown_client = resources.get("scaledown_clients").get(api_key)
 
-        if "error" in data:
-            st.error(data["error"])
-        else:
-            full_text = data["full_text"]
-
-            # 🔹 CONDITIONAL COMPRESSION
-            if use_ai and user_api_key:
-                with st.spinner("Compressing paper with ScaleDown..."):
-                    try:
-                        scaledown_client = ScaleDownClient(user_api_key.strip())
-            
-                        chunks = compressor.split_into_chunks(full_text)
-                        compressed_chunks = []
-            
-                        success_count = 0
-            
-                        for chunk in chunks:
-                            compressed_chunk = scaledown_client.compress_paper(chunk)
-            
-                            if compressed_chunk and isinstance(compressed_chunk, str):
-                                compressed_chunks.append(compressed_chunk)
-                                success_count += 1
-                            else:
-                                compressed_chunks.append(chunk)  # fallback safely
-            
-                        full_text = "\n".join(compressed_chunks)
-            
-                        if success_count > 0:
-                            st.success(f"Compression successful on {success_count}/{len(chunks)} chunks.")
-                        else:
-                            st.warning("Compression failed on all chunks. Using original text.")
-            
-                    except Exception as e:
-                        st.error(f"ScaleDown Error: {str(e)}")
-
-
-            elif use_ai and not user_api_key:
-                st.warning("Please enter your ScaleDown API key to enable compression.")
-
-            # Recreate chunks from compressed/full text
             chunks = compressor.split_into_chunks(full_text)
+            compressed_chunks = []
 
-            if len(chunks) > 150:
-                chunks = chunks[:150]
-
-            # Encode chunks
-            vectors = st.session_state.encoder.encode(chunks)
+            success_count = 0
 
-            # Store in vector DB
-            st.session_state.vector_db.add_documents(
-                vectors,
+            # Chunks are sent concurrently; cached ones are free
+            results = scaledown_client.compress_many(
                 chunks,
-                uploaded_file.name
+                progress=lambda done, total: job.update(done=done, total=total)
             )
 
-            st.session_state.vector_db.save_index()
+            for chunk, compressed_chunk in zip(chunks, results):
 
-            # Compute document embedding
-            paper_embedding = np.mean(vectors, axis=0)
+                if compressed_chunk and isinstance(compressed_chunk, str):
+                    compressed_chunks.append(compressed_chunk)
+                    success_count += 1
+                else:
+                    compressed_chunks.append(chunk)  # fallback safely
 
-            st.session_state.recommender.add_paper(
-                uploaded_file.name,
-                paper_embedding
-            )
+            full_text = "\n".join(compressed_chunks)
 
-            # Store metadata
-            st.session_state.citation_data = data["citations"]
-            st.session_state.paper_title = uploaded_file.name
-            st.session_state.full_text = full_text
+            if success_count > 0:
+                job.message("success", f"Compression successful on {success_count}/{len(chunks)} chunks.")
+            else:
+                job.message("warning", "Compression failed on all chunks. Using original text.")
 
-            st.session_state.processed = True
+        except Exception as e:
+            job.message("error", f"ScaleDown Error: {str(e)}")
 
-            st.sidebar.success("Paper Processed Successfully!")
+        job.check_cancelled()
 
-            '''# Encode chunks
-            vectors = st.session_state.encoder.encode(data["chunks"])
+    # Recreate chunks from compressed/full text
+    chunks = compressor.chunk_text(full_text)
 
-            # Store in FAISS
-            st.session_state.vector_db.add_documents(
-                vectors,
-                data["chunks"],
-                uploaded_file.name
-            )
+    collection = Collection(resources.get("index_service"), namespace)
 
-            st.session_state.vector_db.save_index()
+    # A new upload under the same file name replaces the old one, also
+    # in the recommender and the citation graph
+    collection.remove_document(name)
 
-            # Compute document embedding using mean of chunks (FAST)
-            paper_embedding = np.mean(vectors, axis=0)
+    recommender = resources.get("recommenders").get(namespace)
+    if recommender.remove_paper(name):
+        recommender.save()
 
-            st.session_state.recommender.add_paper(
-                uploaded_file.name,
-                paper_embedding
-            )
+    corpus_graph = resources.get("corpus_graphs").get(namespace)
+    if corpus_graph.remove_paper(name):
+        corpus_graph.save()
+
+    # Encoded and stored batch by batch, with section vectors for
+    # section-first search. A cancelled job is rolled back.
+    job.update("Indexing chunks", done=0, total=len(chunks))
+
+    indexed = index_document(
+        resources.get("encoder"),
+        collection,
+        chunks,
+        name,
+        progress=lambda done, total: job.update(done=done, total=total),
+        cancel_event=job.cancel_event,
+        year=data["year"]
+    )
+
+    if indexed["cancelled"]:
+        raise JobCancelled()
+
+    # Uploads of the same content are skipped from now on
+    collection.register_file(digest, name)
 
-            # Store metadata
-            st.session_state.citation_data = data["citations"]
-            st.session_state.paper_title = uploaded_file.name
-            st.session_state.full_text = data["full_text"]
+    job.update("Updating recommendations")
 
-            st.session_state.processed = True
+    # Document embedding (mean of the chunk vectors)
+    paper_embedding = indexed["embedding"]
 
-            st.sidebar.success("Paper Processed Successfully!")'''
+    recommender.add_paper(
+        name,
+        paper_embedding
+    )
+    recommender.save()
+
+    # Add to the library-wide citation graph (references are parsed from
+    # the uncompressed text)
+    corpus_graph.add_paper(
+        name,
+        parse_references(data["full_text"]),
+        doi=find_doi(data["full_text"][:5000])
+    )
+    corpus_graph.save()
+
+    return {"title": name, "citations": data["citations"], "full_text": full_text}
+
+
+def show_paper(result):
+    """
+    Make a finished paper the current one of the session.
+    """
+    st.session_state.citation_data = result["citations"]
+    st.session_state.paper_title = result["title"]
+    st.session_state.full_text = result["full_text"]
+
+    # Built once per paper; its layout and figure are cached
+    st.session_state.citation_graph = CitationGraph()
+    st.session_state.citation_graph.build_star_graph(
+        result["title"],
+        result["citations"]
+    )
+
+    st.session_state.processed = True
+
+
+jobs = resources.get("jobs")
+
+if uploaded_file:
+    compression_key = user_api_key.strip() if use_ai and user_api_key else ""
+    digest = file_hash(uploaded_file.getvalue())
+
+    # The same file, namespace and options always map to the same job,
+    # so reruns don't process an upload twice
+    job_id = job_key(bytes.fromhex(digest), st.session_state.namespace, bool(compression_key))
+
+    # The same content uploaded before, possibly under another name
+    indexed_as = None
+    if job_id not in st.session_state.jobs:
+        indexed_as = resources.get("index_service").indexed_file(st.session_state.namespace, digest)
+
+    if indexed_as:
+        st.sidebar.info(f"This paper is already indexed as {indexed_as}.")
+
+    elif job_id not in st.session_state.jobs:
+        # Save file
+        os.makedirs("data/uploads", exist_ok=True)
+        save_path = os.path.join("data/uploads", uploaded_file.name)
+
+        with open(save_path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+
+        st.session_state.job_args[job_id] = (
+            save_path, uploaded_file.name, st.session_state.namespace, compression_key, digest
+        )
+        jobs.submit(job_id, ingest_paper, *st.session_state.job_args[job_id], name=uploaded_file.name)
+        st.session_state.jobs.append(job_id)
 
 
 # MAIN UI
 st.title("Scientific Literature Explorer")
 st.markdown("### Interactive Research Analysis (Student Edition)")
 
+# INGESTION STATUS
+# Polled every second while a job of this session is queued or running
+def session_jobs():
+    return [jobs.get(job_id) for job_id in st.session_state.jobs if jobs.get(job_id)]
+
+
+polling = any(job.status not in FINISHED for job in session_jobs())
+
+# Fragments may not write to the sidebar, so notes of finished jobs are
+# shown here, on the full rerun that follows them
+for level, text in st.session_state.job_notices:
+    getattr(st.sidebar, level)(text)
+st.session_state.job_notices = []
+
+
+@st.fragment(run_every=1.0 if polling else None)
+def ingestion_status():
+    current = session_jobs()
+
+    for job in current:
+
+        if job.status in (QUEUED, RUNNING):
+            progress_text = f"{job.name}: {job.stage}"
+            if job.total:
+                progress_text += f" ({job.done}/{job.total})"
+
+            left, right = st.columns([5, 1])
+            left.progress(job.fraction, text=progress_text)
+            if right.button("Cancel", key=f"cancel-{job.id}"):
+                jobs.cancel(job.id)
+
+        elif job.status == DONE and job.id not in st.session_state.shown_jobs:
+            # The newest finished paper becomes the current one
+            show_paper(job.result)
+            st.session_state.shown_jobs.add(job.id)
+
+            st.session_state.job_notices.extend(job.messages)
+            st.session_state.job_notices.append(("success", f"{job.name} processed successfully!"))
+
+            st.rerun()
+
+        elif job.status in (FAILED, CANCELLED):
+            left, right = st.columns([5, 1])
+            if job.status == FAILED:
+                left.error(f"{job.name}: {job.error}")
+            else:
+                left.warning(f"{job.name}: cancelled")
+
+            if right.button("Retry", key=f"retry-{job.id}"):
+                jobs.submit(job.id, ingest_paper, *st.session_state.job_args[job.id], name=job.name)
+                st.rerun()
+
+    # The last job ended (failed or cancelled): a full rerun stops polling
+    if polling and not any(job.status not in FINISHED for job in current):
+        st.rerun()
+
+
+ingestion_status()
+
+
 tab1, tab2, tab3 = st.tabs(
     ["Semantic Search", "Citation Graph", "Recommendations"]
 )
@@ -209,22 +396,88 @@ with tab1:
         "Search for a concept (e.g., 'Methodology', 'Architecture'):"
     )
 
-    if user_query and st.session_state.processed:
+    use_hybrid = st.checkbox(
+        "Hybrid search (boost exact keyword matches)", value=True
+    )
 
-        with st.spinner("Searching through embeddings..."):
+    use_sections = st.checkbox(
+        "Search the best-matching sections first (long papers)"
+    )
 
-            query_vec = st.session_state.encoder.encode(user_query)[0]
+    # Papers are searchable as soon as they are indexed, even while
+    # others are still being ingested. Until the warm-up thread has
+    # loaded the index the page renders without it.
+    index_ready = resources.is_ready("index_service")
+    has_papers = index_ready and resources.get("index_service").size(st.session_state.namespace) > 0
+
+    # Metadata filters, applied inside the index before the scan
+    search_filter = {}
+
+    if has_papers:
+        with st.expander("Filters"):
+            papers = st.multiselect(
+                "Papers",
+                resources.get("index_service").sources(st.session_state.namespace)
+            )
 
-            results = st.session_state.vector_db.search(query_vec, k=3)
+            year_col1, year_col2, page_col1, page_col2 = st.columns(4)
+            first_year = year_col1.number_input("From year", min_value=1900, step=1, value=None)
+            last_year = year_col2.number_input("To year", min_value=1900, step=1, value=None)
+            first_page = page_col1.number_input("From page", min_value=1, step=1, value=None)
+            last_page = page_col2.number_input("To page", min_value=1, step=1, value=None)
+
+        if papers:
+            search_filter["source"] = papers
+        if first_year is not None or last_year is not None:
+            search_filter["year"] = (first_year, last_year)
+        if first_page is not None or last_page is not None:
+            search_filter["page"] = (first_page, last_page)
+
+    if user_query and has_papers:
+
+        with st.spinner("Searching through embeddings..."):
+
+            index_service = resources.get("index_service")
+            search_cache = resources.get("search_cache")
+            namespace = st.session_state.namespace
+
+            def run_search():
+                # Popular queries skip the transformer entirely
+                query_vec = search_cache.embed(user_query)
+
+                if use_sections:
+                    return index_service.hierarchical_search(
+                        namespace, query_vec, k=3, filter=search_filter
+                    )
+                if use_hybrid:
+                    return index_service.hybrid_search(
+                        namespace, query_vec, user_query, k=3, filter=search_filter
+                    )
+                return index_service.search(namespace, query_vec, k=3, filter=search_filter)
+
+            # Reruns with an unchanged query and index are served from the cache
+            mode = "sections" if use_sections else "hybrid" if use_hybrid else "dense"
+            filter_key = tuple(
+                (key, tuple(value) if isinstance(value, list) else value)
+                for key, value in sorted(search_filter.items())
+            )
+            results = search_cache.search(
+                (namespace, mode, user_query, 3, filter_key),
+                index_service.version(namespace),
+                run_search
+            )
 
             if results:
                 st.success("Top Semantic Matches Found:")
 
                 for i, result in enumerate(results):
                     with st.expander(
-                        f"Result {i+1} | Similarity: {result['score']:.4f}",
+                        f"Result {i+1} | Similarity: {result.get('dense_score') or result['score']:.4f}",
                         expanded=True
                     ):
+                        if result.get("section"):
+                            st.caption(f"Section: {result['section']}")
+
                         highlighted_text = highlight_query(
                             result["text"], user_query
                         )
@@ -241,7 +494,10 @@ with tab1:
             else:
                 st.warning("No matching sections found.")
 
-    elif not st.session_state.processed:
+    elif not index_ready:
+        st.info("Loading the search index...")
+
+    elif not has_papers:
         st.info("Upload a PDF to begin searching.")
 
 
@@ -252,23 +508,89 @@ with tab2:
 
     if st.session_state.processed:
 
-        graph_builder = CitationGraph()
+        graph_builder = st.session_state.citation_graph
 
-        graph_builder.build_star_graph(
-            st.session_state.paper_title,
-            st.session_state.citation_data
+        render_mode = st.radio(
+            "Render as",
+            ["Image", "Interactive"],
+            horizontal=True
         )
 
-        fig = graph_builder.get_matplotlib_figure()
-
         if st.session_state.citation_data:
-            st.pyplot(fig)
+
+            if render_mode == "Image":
+                st.pyplot(graph_builder.get_matplotlib_figure())
+            else:
+                graph_data = graph_builder.to_serializable()
+                positions = {node["id"]: node for node in graph_data["nodes"]}
+
+                st.vega_lite_chart(
+                    {
+                        "layer": [
+                            {
+                                "data": {"values": [
+                                    {
+                                        "x": positions[u]["x"], "y": positions[u]["y"],
+                                        "x2": positions[v]["x"], "y2": positions[v]["y"]
+                                    }
+                                    for u, v in graph_data["edges"]
+                                ]},
+                                "mark": {"type": "rule", "color": "gray", "opacity": 0.5},
+                                "encoding": {
+                                    "x": {"field": "x", "type": "quantitative", "axis": None},
+                                    "y": {"field": "y", "type": "quantitative", "axis": None},
+                                    "x2": {"field": "x2"},
+                                    "y2": {"field": "y2"}
+                                }
+                            },
+                            {
+                                "data": {"values": graph_data["nodes"]},
+                                "mark": {"type": "circle", "opacity": 1},
+                                "encoding": {
+                                    "x": {"field": "x", "type": "quantitative", "axis": None},
+                                    "y": {"field": "y", "type": "quantitative", "axis": None},
+                                    "color": {"field": "color", "type": "nominal", "scale": None},
+                                    "size": {"field": "size", "type": "quantitative", "legend": None},
+                                    "tooltip": [{"field": "label", "type": "nominal"}]
+                                }
+                            }
+                        ],
+                        "height": 550
+                    },
+                    use_container_width=True
+                )
+
             st.write(
                 f"Detected {len(st.session_state.citation_data)} references."
             )
         else:
             st.warning("No citation markers like [1], [2] found.")
 
+        corpus_graph = resources.get("corpus_graphs").get(st.session_state.namespace)
+        graph_stats = corpus_graph.stats()
+
+        st.subheader("Library Citation Graph")
+        st.write(
+            f"{graph_stats['num_papers']} papers citing {graph_stats['num_nodes']} works "
+            f"({graph_stats['num_edges']} citations, {graph_stats['num_components']} connected components)."
+        )
+
+        if graph_stats["num_edges"]:
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.markdown("**Most central works (PageRank)**")
+                for work in corpus_graph.top_papers(5):
+                    st.write(f"{work['label']} ({work['score']:.4f})")
+
+            with col2:
+                st.markdown("**Papers sharing references with this one**")
+                coupled = corpus_graph.bibliographic_coupling(st.session_state.paper_title, 5)
+                for work in coupled:
+                    st.write(f"{work['label']} ({int(work['score'])} shared)")
+                if not coupled:
+                    st.caption("None in the library yet.")
+
     else:
         st.info("Upload a paper to see citation network.")
 
@@ -279,17 +601,17 @@ with tab3:
 
     if st.session_state.processed:
 
-        # Use mean embedding we already computed
-        query_embedding = np.mean(
-            st.session_state.vector_db.index.reconstruct_n(
-                0, st.session_state.vector_db.index.ntotal
-            ),
-            axis=0
+        # Centroid of the uploaded paper, maintained by the index (O(1))
+        query_embedding = resources.get("index_service").paper_embedding(
+            st.session_state.namespace,
+            st.session_state.paper_title
         )
 
-        recommendations = st.session_state.recommender.get_recommendations(
-            query_embedding
-        )
+        recommendations = None
+        if query_embedding is not None:
+            recommendations = resources.get("recommenders").get(st.session_state.namespace).get_recommendations(
+                query_embedding
+            )
 
         if recommendations:
             for rec in recommendations:
@@ -329,3 +651,55 @@ with tab3:
 #                 st.warning("Could not generate insights.")
 #     else:
 #         st.info("Upload paper and configure API key to use AI insights.")
+
+
+# SEARCH CACHE
+if resources.is_ready("search_cache"):
+    with st.sidebar.expander("Search cache"):
+        for name, counts in resources.get("search_cache").stats().items():
+            lookups = counts["hits"] + counts["misses"]
+            hit_rate = counts["hits"] / lookups if lookups else 0.0
+            st.write(
+                f"{name.capitalize()}: {counts['hits']} hits, {counts['misses']} misses "
+                f"({hit_rate:.0%}), {counts['entries']} entries"
+            )
+
+
+# PERFORMANCE
+with st.sidebar.expander("Performance"):
+    # Recording is process-wide and set when the app starts
+    # (SCILIT_METRICS=1); this only chooses what this session shows
+    if not metrics.enabled:
+        st.write("Stage timings are not recorded. Start the app with SCILIT_METRICS=1 to record them.")
+    elif st.checkbox("Show stage timings", key="show_metrics"):
+        snapshot = metrics.snapshot()
+        if snapshot["timers"]:
+            st.table([
+                {
+                    "stage": name,
+                    "calls": stats["count"],
+                    "mean ms": round(stats["mean_ms"], 1),
+                    "max ms": round(stats["max_ms"], 1),
+                    "total s": round(stats["total_s"], 2),
+                }
+                for name, stats in sorted(snapshot["timers"].items())
+            ])
+            for name, value in sorted(snapshot["counters"].items()):
+                st.write(f"{name}: {value}")
+            st.download_button("Download (Prometheus)", metrics.to_prometheus(), "metrics.txt")
+        else:
+            st.write("No timings recorded yet.")
+
+
+# STARTUP TIMINGS
+with st.sidebar.expander("Startup timings"):
+    st.write(f"Imports: {IMPORT_TIME * 1000:.0f} ms")
+    st.write(f"Page render: {(time.perf_counter() - START) * 1000:.0f} ms")
+
+    for name, seconds in resources.report().items():
+        if name in resources.errors:
+            st.write(f"{name}: failed ({resources.errors[name]})")
+        elif seconds is None:
+            st.write(f"{name}: loading...")
+        else:
+            st.write(f"{name}: loaded in {seconds:.2f} s")
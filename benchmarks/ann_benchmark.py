@@ -0,0 +1,154 @@
+"""
+Recall / latency / memory benchmark of the VectorEngine index types
+against the exact flat baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.ann_benchmark                    # synthetic vectors
+    python -m benchmarks.ann_benchmark --from-index data/indexes/shared/default
+    python -m benchmarks.ann_benchmark --n 200000 --k 10 --json results.json
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from models.vector_engine import VectorEngine
+
+
+def synthetic_vectors(n, dimension, clusters=200, seed=0):
+    """
+    Normalized vectors drawn around random centres, which is closer to
+    real embedding distributions than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+
+    vectors = centres[labels] + 0.5 * rng.standard_normal((n, dimension)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return vectors
+
+
+def index_bytes(index):
+    return faiss.serialize_index(index).nbytes
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_search(engine, queries, k, **params):
+    search_params = engine._search_params(**params)
+    latencies = []
+
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = engine.index.search(query[None, :], k, params=search_params)
+        latencies.append(time.perf_counter() - start)
+
+    _, ids = engine.index.search(queries, k, params=search_params)
+    latencies = np.array(latencies) * 1000
+
+    return ids, {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "qps_single": float(1000 / latencies.mean()),
+    }
+
+
+def run(vectors, queries, k, configs):
+    dimension = vectors.shape[1]
+    results = []
+
+    baseline = VectorEngine(dimension=dimension, index_dir=None)
+    baseline.index.add_with_ids(vectors, np.arange(len(vectors)))
+    truth_ids, _ = time_search(baseline, queries, k)
+
+    for index_type, options, sweep in configs:
+        engine = VectorEngine(dimension=dimension, index_type=index_type, index_dir=None, **options)
+
+        start = time.perf_counter()
+        engine.train(vectors)
+        train_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine.index.add_with_ids(vectors, np.arange(len(vectors)))
+        add_seconds = time.perf_counter() - start
+
+        memory = index_bytes(engine.index)
+
+        for params in sweep:
+            ids, latency = time_search(engine, queries, k, **params)
+
+            results.append({
+                "index_type": index_type,
+                "options": options,
+                "params": params,
+                f"recall@{k}": recall_at_k(ids, truth_ids),
+                "train_s": train_seconds,
+                "add_s": add_seconds,
+                "index_mb": memory / 2**20,
+                "bytes_per_vector": memory / len(vectors),
+                **latency,
+            })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN index types against flat search")
+    parser.add_argument("--from-index", help="Use the vectors of a saved index directory")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic corpus size")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = VectorEngine(index_dir=args.from_index).reconstruct_all()
+    else:
+        vectors = synthetic_vectors(args.n, args.dimension)
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    nlist = min(args.nlist, len(vectors) // 39 or 1)
+    nprobe_sweep = [{"nprobe": n} for n in (1, 4, 16, 64) if n <= nlist]
+
+    configs = [
+        ("flat", {}, [{}]),
+        ("ivf_flat", {"nlist": nlist}, nprobe_sweep),
+        ("ivf_pq", {"nlist": nlist, "pq_m": args.pq_m}, nprobe_sweep),
+        ("hnsw", {"hnsw_m": args.hnsw_m}, [{"ef_search": e} for e in (16, 64, 256)]),
+    ]
+
+    results = run(vectors, queries, args.k, configs)
+
+    print(f"{len(vectors)} vectors, d={vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':10} {'params':18} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8} {'B/vec':>7}")
+    for row in results:
+        params = ",".join(f"{name}={value}" for name, value in row["params"].items()) or "-"
+        print(
+            f"{row['index_type']:10} {params:18} {row[f'recall@{args.k}']:7.3f} "
+            f"{row['p50_ms']:8.3f} {row['p95_ms']:8.3f} {row['index_mb']:8.1f} "
+            f"{row['bytes_per_vector']:7.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
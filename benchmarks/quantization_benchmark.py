@@ -0,0 +1,121 @@
+"""
+Recall vs bytes per vector of the VectorEngine storage modes (float16,
+int8, PCA / truncation), with and without full-precision re-ranking.
+
+Usage (from the repository root):
+    python -m benchmarks.quantization_benchmark
+    python -m benchmarks.quantization_benchmark --from-index data/indexes/shared/default
+    python -m benchmarks.quantization_benchmark --n 200000 --rerank 8 --json results.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.ann_benchmark import index_bytes, recall_at_k, synthetic_vectors
+from models.vector_engine import VectorEngine
+
+
+def build(vectors, **options):
+    engine = VectorEngine(dimension=vectors.shape[1], index_dir=None, **options)
+    # Texts are irrelevant here; the store only serves vectors for re-ranking
+    engine.add_documents(vectors, [""] * len(vectors), "benchmark")
+    return engine
+
+
+def time_search(engine, queries, k, rerank):
+    latencies = []
+
+    for query in queries:
+        start = time.perf_counter()
+        engine._dense_search(query[None, :], k, rerank=rerank)
+        latencies.append(time.perf_counter() - start)
+
+    _, ids = engine._dense_search(queries, k, rerank=rerank)
+    latencies = np.array(latencies) * 1000
+
+    return ids, {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def run(vectors, queries, k, configs, rerank):
+    baseline = build(vectors)
+    truth_ids, _ = time_search(baseline, queries, k, 0)
+    baseline_bytes = index_bytes(baseline.index)
+
+    results = []
+
+    for options in configs:
+        engine = build(vectors, **options)
+        memory = index_bytes(engine.index)
+
+        raw_ids, _ = time_search(engine, queries, k, 0)
+        reranked_ids, latency = time_search(engine, queries, k, rerank)
+
+        results.append({
+            "options": options,
+            f"recall@{k}": recall_at_k(raw_ids, truth_ids),
+            f"recall@{k}_reranked": recall_at_k(reranked_ids, truth_ids),
+            "bytes_per_vector": memory / len(vectors),
+            "compression": baseline_bytes / memory,
+            **latency,
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed vector storage modes")
+    parser.add_argument("--from-index", help="Use the vectors of a saved index directory")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic corpus size")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4, help="Candidates re-ranked per result")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = VectorEngine(index_dir=args.from_index).reconstruct_all()
+    else:
+        vectors = synthetic_vectors(args.n, args.dimension)
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    dimension = vectors.shape[1]
+    configs = [
+        {"storage": "float16"},
+        {"storage": "int8"},
+        {"reduce_dim": dimension // 2},
+        {"reduce_dim": dimension // 4},
+        {"reduce_dim": dimension // 4, "reduction": "truncate"},
+        {"reduce_dim": dimension // 2, "storage": "int8"},
+        {"index_type": "hnsw", "storage": "int8"},
+    ]
+
+    results = run(vectors, queries, args.k, configs, args.rerank)
+
+    print(f"{len(vectors)} vectors, d={dimension}, {len(queries)} queries, k={args.k}, rerank={args.rerank}")
+    print(f"{'storage mode':40} {'B/vec':>7} {'ratio':>6} {'recall':>7} {'rerank':>7} {'p50 ms':>8}")
+    for row in results:
+        mode = ",".join(f"{name}={value}" for name, value in row["options"].items())
+        print(
+            f"{mode:40} {row['bytes_per_vector']:7.0f} {row['compression']:6.1f} "
+            f"{row[f'recall@{args.k}']:7.3f} {row[f'recall@{args.k}_reranked']:7.3f} "
+            f"{row['p50_ms']:8.3f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
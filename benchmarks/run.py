@@ -0,0 +1,394 @@
+"""
+End-to-end benchmark of the paper pipeline on a synthetic PDF corpus:
+extraction, chunking, encoding, indexing, save / load, search latency
+(also with a metadata filter matching half of the papers),
+recommendation, citation graph and graph layout. Each stage reports
+throughput and peak memory (Python and numpy allocations, traced with
+tracemalloc; FAISS's own C++ allocations are not included). tracemalloc
+slows Python-heavy stages several times over, so timings come from an
+untraced pass and peak memory from a second, traced pass.
+
+Runs offline on a CPU: by default the encoder is a hashing stand-in
+(benchmarks/stand_in_encoder.py); pass --encoder with a
+sentence-transformers model name to time a real model.
+
+Usage (from the repository root):
+    python -m benchmarks.run
+    python -m benchmarks.run --papers 50 --pages 20 --json results.json
+    python -m benchmarks.run --encoder all-MiniLM-L6-v2
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.15
+
+With --baseline the exit status is 1 if any stage regressed by more than
+the tolerance, so the suite can gate CI.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.stand_in_encoder import HashingEncoder
+from benchmarks.synthetic_corpus import generate_corpus
+from models.chunker import TokenChunker
+from models.citation_graph import CitationGraph
+from models.document_indexer import chunk_metadata
+from models.corpus_citation_graph import CorpusCitationGraph, parse_references
+from models.paper_compressor import CITATION_MARKER, PaperCompressor, clean_text
+from models.recommender import Recommender
+from models.vector_engine import VectorEngine
+
+
+# Metrics compared against a baseline, and whether higher is better
+COMPARED_METRICS = {"per_second": True, "p95_ms": False, "peak_mb": False}
+
+
+def latency_stats(seconds):
+    latencies = np.array(seconds) * 1000
+
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+class Harness:
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stages = {}
+
+    def measure(self, stage, unit, fn):
+        """
+        Run fn() once as one stage. fn returns (value, items processed)
+        or (value, items, extra stats).
+        """
+        if self.trace:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        value, items, *extra = fn()
+        seconds = time.perf_counter() - start
+
+        stats = {
+            "seconds": seconds,
+            "items": items,
+            "unit": unit,
+            "per_second": items / seconds if seconds else 0.0,
+        }
+
+        if self.trace:
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+        if extra:
+            stats.update(extra[0])
+
+        self.stages[stage] = stats
+        return value
+
+
+def load_encoder(name, dimension):
+    if name == "hashing":
+        return HashingEncoder(dimension=dimension)
+
+    from models.text_encoder import TextEncoder
+    # No embedding cache: every run encodes from scratch
+    return TextEncoder(model_name=name, cache_dir=None)
+
+
+def run(args, paths, titles, workdir, trace=False):
+    """
+    One pass over every stage.
+
+    Returns:
+        (meta, stages)
+    """
+    harness = Harness(trace)
+    rng = np.random.default_rng(args.seed)
+
+    encoder = load_encoder(args.encoder, args.dimension)
+    dimension = encoder.encode(["probe"]).shape[1]
+
+    compressor = PaperCompressor()
+    chunker = TokenChunker.for_encoder(encoder)
+
+    # ---------- extraction ----------
+    def extract():
+        texts = []
+        pages = 0
+        for path in paths:
+            segments = []
+            for page_number, page_text in compressor.iter_pages(path):
+                pages += 1
+                segments.append(f"\n\n[Page {page_number}]\n\n{page_text}")
+            texts.append(clean_text("".join(segments)).strip())
+        return texts, pages
+
+    texts = harness.measure("extract", "pages", extract)
+
+    # ---------- chunking ----------
+    def chunk():
+        papers = [chunker.chunk_text(text) for text in texts]
+        return papers, sum(len(chunks) for chunks in papers)
+
+    papers = harness.measure("chunk", "chunks", chunk)
+    all_chunks = [chunk["text"] for chunks in papers for chunk in chunks]
+
+    # ---------- encoding ----------
+    def encode():
+        vectors = [
+            encoder.encode(all_chunks[start:start + args.batch_size], use_cache=False)
+            for start in range(0, len(all_chunks), args.batch_size)
+        ]
+        return np.vstack(vectors), len(all_chunks)
+
+    vectors = harness.measure("encode", "chunks", encode)
+
+    # ---------- indexing ----------
+    index_dir = os.path.join(workdir, "index")
+
+    # Synthetic publication years, 2000-2019, for the filtered search
+    years = [2000 + position % 20 for position in range(len(papers))]
+
+    def index():
+        engine = VectorEngine(dimension=dimension, index_type=args.index_type, index_dir=index_dir)
+        start = 0
+        for title, chunks, year in zip(titles, papers, years):
+            end = start + len(chunks)
+            engine.add_documents(
+                vectors[start:end],
+                [chunk["text"] for chunk in chunks],
+                title,
+                [chunk_metadata(chunk, year) for chunk in chunks]
+            )
+            start = end
+        return engine, len(all_chunks)
+
+    engine = harness.measure("index", "chunks", index)
+
+    harness.measure("save", "chunks", lambda: (engine.save_index(), len(all_chunks)))
+
+    engine = harness.measure(
+        "load", "chunks",
+        lambda: (VectorEngine(dimension=dimension, index_dir=index_dir), len(all_chunks))
+    )
+
+    # ---------- search ----------
+    # Queries are a few consecutive words taken from random chunks
+    queries = []
+    for position in rng.integers(0, len(all_chunks), args.queries):
+        words = all_chunks[position].split()
+        start = rng.integers(0, max(1, len(words) - 6))
+        queries.append(" ".join(words[start:start + rng.integers(3, 7)]))
+
+    query_vectors = harness.measure(
+        "query_encode", "queries",
+        lambda: ([encoder.encode_query(query) for query in queries], len(queries))
+    )
+
+    def search(method):
+        def run_search():
+            seconds = []
+            for query, vector in zip(queries, query_vectors):
+                start = time.perf_counter()
+                if method == "hybrid":
+                    engine.hybrid_search(vector, query, k=args.k)
+                elif method == "filtered":
+                    engine.search(vector, k=args.k, filter={"year": (2000, 2009)})
+                else:
+                    engine.search(vector, k=args.k)
+                seconds.append(time.perf_counter() - start)
+            return None, len(queries), latency_stats(seconds)
+        return run_search
+
+    harness.measure("search", "queries", search("dense"))
+    harness.measure("filtered_search", "queries", search("filtered"))
+    harness.measure("hybrid_search", "queries", search("hybrid"))
+
+    # ---------- recommendation ----------
+    def recommend():
+        recommender = Recommender(store_dir=None)
+        for title in titles:
+            recommender.add_paper(title, engine.get_paper_embedding(title))
+
+        seconds = []
+        for title in titles:
+            start = time.perf_counter()
+            recommender.get_recommendations(engine.get_paper_embedding(title), top_k=5)
+            seconds.append(time.perf_counter() - start)
+        return None, len(titles), latency_stats(seconds)
+
+    harness.measure("recommend", "papers", recommend)
+
+    # ---------- citation graphs ----------
+    def corpus_graph():
+        graph = CorpusCitationGraph(directory=None)
+        for title, text in zip(titles, texts):
+            graph.add_paper(title, parse_references(text))
+        graph.pagerank()
+        return None, len(titles), {"nodes": len(graph.labels)}
+
+    harness.measure("citation_graph", "papers", corpus_graph)
+
+    def layout():
+        for title, text in zip(titles, texts):
+            graph = CitationGraph()
+            graph.build_star_graph(title, sorted(set(CITATION_MARKER.findall(text)), key=int))
+            graph.layout()
+        return None, len(titles)
+
+    harness.measure("graph_layout", "papers", layout)
+
+    def render():
+        import matplotlib.pyplot as plt
+
+        for title, text in zip(titles[:args.renders], texts):
+            graph = CitationGraph()
+            graph.build_star_graph(title, sorted(set(CITATION_MARKER.findall(text)), key=int))
+            plt.close(graph.get_matplotlib_figure())
+        return None, min(args.renders, len(titles))
+
+    harness.measure("graph_render", "papers", render)
+
+    meta = {
+        "papers": args.papers,
+        "pages": args.pages,
+        "citation_density": args.citation_density,
+        "encoder": args.encoder,
+        "dimension": int(dimension),
+        "index_type": args.index_type,
+        "chunks": len(all_chunks),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    return meta, harness.stages
+
+
+def run_all(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_dir = args.corpus_dir or os.path.join(workdir, "corpus")
+        paths, titles = generate_corpus(
+            corpus_dir, args.papers, args.pages, args.citation_density, args.references, args.seed
+        )
+
+        meta, stages = run(args, paths, titles, os.path.join(workdir, "timed"))
+
+        if not args.no_memory:
+            _, traced = run(args, paths, titles, os.path.join(workdir, "traced"), trace=True)
+            for stage, stats in traced.items():
+                stages[stage]["peak_mb"] = stats["peak_mb"]
+
+    return {"meta": meta, "stages": stages}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns (rows, regressions): one row per stage and metric present in
+    both runs, with the change relative to the baseline.
+    """
+    rows = []
+    regressions = []
+
+    for stage, stats in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            continue
+
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in stats or not base.get(metric):
+                continue
+
+            change = stats[metric] / base[metric] - 1
+            worse = -change if higher_is_better else change
+
+            row = (stage, metric, base[metric], stats[metric], change, worse > tolerance)
+            rows.append(row)
+            if row[-1]:
+                regressions.append(row)
+
+    return rows, regressions
+
+
+def print_results(results):
+    meta = results["meta"]
+    print(
+        f"{meta['papers']} papers x {meta['pages']} pages, {meta['chunks']} chunks, "
+        f"encoder={meta['encoder']} (d={meta['dimension']}), index={meta['index_type']}"
+    )
+    print(f"{'stage':15} {'seconds':>9} {'throughput':>18} {'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8}")
+
+    for stage, stats in results["stages"].items():
+        throughput = f"{stats['per_second']:.1f} {stats['unit']}/s"
+        p50 = f"{stats['p50_ms']:.3f}" if "p50_ms" in stats else "-"
+        p95 = f"{stats['p95_ms']:.3f}" if "p95_ms" in stats else "-"
+        peak = f"{stats['peak_mb']:.1f}" if "peak_mb" in stats else "-"
+        print(f"{stage:15} {stats['seconds']:9.3f} {throughput:>18} {p50:>8} {p95:>8} {peak:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic papers")
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--citation-density", type=float, default=0.3,
+                        help="Mean citation markers per sentence")
+    parser.add_argument("--references", type=int, default=20)
+    parser.add_argument("--corpus-dir", help="Keep the generated PDFs here (default: temporary)")
+    parser.add_argument("--encoder", default="hashing",
+                        help="'hashing' (stand-in) or a sentence-transformers model name")
+    parser.add_argument("--dimension", type=int, default=384, help="Stand-in encoder dimension")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--renders", type=int, default=3, help="Graph figures drawn")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the traced pass that measures peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    results = run_all(args)
+
+    print_results(results)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        for key in ("papers", "pages", "encoder", "index_type", "machine"):
+            if baseline["meta"].get(key) != results["meta"].get(key):
+                print(f"Warning: {key} differs from the baseline "
+                      f"({baseline['meta'].get(key)} vs {results['meta'].get(key)})")
+
+        rows, regressions = compare(results, baseline, args.tolerance)
+
+        print(f"\nAgainst {args.baseline}:")
+        for stage, metric, before, after, change, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{stage:15} {metric:11} {before:10.3f} -> {after:10.3f} ({change:+.1%}){flag}")
+
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Small CPU-only stand-in for TextEncoder, so benchmarks run without
+torch or downloaded models.
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+from models.chunker import estimate_token_lengths
+from models.quantization import check_precision, quantize, truncate
+
+
+WORD = re.compile(r"\w+")
+
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words embeddings: word unigrams and bigrams are
+    hashed (signed) into `dimension` buckets. Texts sharing words get
+    similar vectors, which is enough to exercise indexing, search and
+    recommendation realistically. Same interface as TextEncoder.
+    """
+
+    def __init__(self, dimension=384, max_tokens=256):
+        self.dimension = dimension
+        self.max_tokens = max_tokens
+
+    def _features(self, text):
+        words = WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return [zlib.crc32(feature.encode("utf-8")) for feature in features]
+
+    def encode(self, texts, normalize=True, use_cache=True, precision="float32", truncate_dim=None):
+        check_precision(precision)
+
+        if isinstance(texts, str):
+            texts = [texts]
+
+        embeddings = np.zeros((len(texts), self.dimension), dtype="float32")
+
+        for row, text in enumerate(texts):
+            hashes = np.array(self._features(text), dtype="uint32")
+            if not len(hashes):
+                continue
+
+            signs = np.where(hashes & 1, 1.0, -1.0).astype("float32")
+            np.add.at(embeddings[row], (hashes >> 1) % self.dimension, signs)
+
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= norms + 1e-10
+
+        if truncate_dim:
+            embeddings = truncate(embeddings, truncate_dim, normalize)
+
+        return quantize(embeddings, precision)
+
+    def encode_query(self, text, normalize=True):
+        return self.encode([text], normalize)[0]
+
+    def token_lengths(self, texts):
+        return estimate_token_lengths(texts)
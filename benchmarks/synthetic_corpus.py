@@ -0,0 +1,244 @@
+"""
+Offline generator of synthetic research papers as real PDF files, for
+benchmarking the pipeline without a paper collection or a network.
+
+Each paper has a title, numbered sections, body text with "[n]" citation
+markers and an IEEE-style reference list. References are drawn from a
+shared pool (including the other generated papers), so the corpus
+citation graph has co-citations and shared references.
+
+Usage (from the repository root):
+    python -m benchmarks.synthetic_corpus out_dir --papers 20 --pages 12
+    python -m benchmarks.synthetic_corpus out_dir --citation-density 0.5
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+
+VOCABULARY = (
+    "model models data dataset training learning neural network networks deep "
+    "representation representations attention transformer layer layers feature "
+    "features graph graphs node embedding embeddings loss function gradient "
+    "optimization accuracy baseline baselines benchmark evaluation experiment "
+    "experiments result results method methods approach analysis performance "
+    "task tasks language vision image images text sequence sequences retrieval "
+    "search query queries document documents index semantic similarity vector "
+    "vectors cluster clustering classification regression prediction inference "
+    "parameter parameters distribution sample samples noise robust robustness "
+    "efficient efficiency scalable memory latency throughput compute hardware "
+    "propose proposed show shows improve improves outperform outperforms achieve "
+    "achieves reduce reduces increase increases demonstrate study studies "
+    "the a an of in on for with by from to and or we our this that which is are "
+    "significant significantly large small novel simple effective state art"
+).split()
+
+SECTIONS = (
+    "Introduction", "Related Work", "Background", "Method", "Experimental Setup",
+    "Experiments", "Results", "Discussion", "Conclusion"
+)
+
+SURNAMES = (
+    "Smith Chen Garcia Kumar Müller Rossi Tanaka Novak Silva Kim Ivanova Okafor "
+    "Dubois Larsen Haddad Nakamura Schmidt Costa Park Jensen"
+).split()
+
+VENUES = ("in Proc. NeurIPS", "in Proc. ICML", "in Proc. ACL", "J. Mach. Learn. Res.", "in Proc. CVPR")
+
+LINE_WIDTH = 90
+LINES_PER_PAGE = 58
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, font_size=10, leading=12):
+    """
+    Write a minimal PDF with one Helvetica text block per page.
+
+    Parameters:
+        pages (list[list[str]]): lines of text of each page
+    """
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] "
+            f"/Count {len(pages)} >>"
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+
+    for page_id, lines in zip(page_ids, pages):
+        content = ["BT", f"/F1 {font_size} Tf", f"{leading} TL", "50 760 Td"]
+        content.extend(f"({_escape(line)}) '" for line in lines)
+        content.append("ET")
+        stream = "\n".join(content).encode("cp1252", "replace")
+
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _wrap(text, width=LINE_WIDTH):
+    lines = []
+    line = ""
+
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+
+    if line:
+        lines.append(line)
+
+    return lines
+
+
+def _title(rng, topic):
+    words = rng.choice(topic, 3).tolist() + rng.choice(VOCABULARY, 4).tolist()
+    rng.shuffle(words)
+    return " ".join(words).capitalize()
+
+
+def _reference(rng, number, title):
+    authors = ", ".join(
+        f"{chr(65 + rng.integers(26))}. {rng.choice(SURNAMES)}"
+        for _ in range(rng.integers(1, 4))
+    )
+    year = rng.integers(1995, 2025)
+    return f"[{number}] {authors}, \"{title},\" {rng.choice(VENUES)}, {year}."
+
+
+def _sentence(rng, topic, citation_density, num_references):
+    length = rng.integers(8, 26)
+    # Topic words make papers distinguishable for search and recommendation
+    words = np.where(
+        rng.random(length) < 0.25,
+        rng.choice(topic, length),
+        rng.choice(VOCABULARY, length)
+    ).tolist()
+
+    sentence = " ".join(words).capitalize()
+
+    markers = rng.poisson(citation_density)
+    if markers and num_references:
+        cited = sorted(set(rng.integers(1, num_references + 1, markers).tolist()))
+        sentence += " " + "".join(f"[{n}]" for n in cited)
+
+    return sentence + "."
+
+
+def generate_paper(rng, title, pages, citation_density, reference_pool, references=20):
+    """
+    Returns the pages (lists of lines) of one synthetic paper.
+
+    Parameters:
+        pages (int): number of pages
+        citation_density (float): mean citation markers per sentence
+        reference_pool (list[str]): titles the reference list draws from
+    """
+    topic = rng.choice(VOCABULARY[:120], 10)
+
+    # Popular references are cited by many papers (Zipf-like)
+    weights = 1.0 / np.arange(1, len(reference_pool) + 1)
+    picked = rng.choice(
+        len(reference_pool),
+        min(references, len(reference_pool)),
+        replace=False,
+        p=weights / weights.sum()
+    )
+    reference_lines = ["References"]
+    for number, position in enumerate(picked, start=1):
+        reference_lines.extend(_wrap(_reference(rng, number, reference_pool[position])))
+
+    body_lines = max(LINES_PER_PAGE, pages * LINES_PER_PAGE - len(reference_lines) - 8)
+    lines = _wrap(title) + ["", "Abstract"]
+    lines += _wrap(" ".join(_sentence(rng, topic, 0, 0) for _ in range(5)))
+
+    sections = list(SECTIONS)
+    per_section = max(1, (body_lines - len(lines)) // len(sections))
+
+    for number, section in enumerate(sections, start=1):
+        lines.append(f"{number} {section}")
+        section_lines = []
+        while len(section_lines) < per_section:
+            paragraph = " ".join(
+                _sentence(rng, topic, citation_density, len(picked)) for _ in range(6)
+            )
+            section_lines.extend(_wrap(paragraph))
+        lines.extend(section_lines[:per_section])
+
+    lines.extend(reference_lines)
+
+    return [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def generate_corpus(directory, papers=10, pages=10, citation_density=0.3, references=20, seed=0):
+    """
+    Write `papers` synthetic PDFs into directory.
+
+    Returns:
+        (list of paths, list of paper titles)
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    titles = [_title(rng, rng.choice(VOCABULARY[:120], 10)) for _ in range(papers)]
+    external = [_title(rng, rng.choice(VOCABULARY[:120], 10)) for _ in range(4 * references)]
+    # The generated papers also cite each other
+    reference_pool = external + titles
+
+    paths = []
+    for i, title in enumerate(titles):
+        path = os.path.join(directory, f"paper_{i:04d}.pdf")
+        write_pdf(path, generate_paper(rng, title, pages, citation_density, reference_pool, references))
+        paths.append(path)
+
+    return paths, titles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic research paper PDFs")
+    parser.add_argument("out_dir")
+    parser.add_argument("--papers", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--citation-density", type=float, default=0.3,
+                        help="Mean citation markers per sentence")
+    parser.add_argument("--references", type=int, default=20,
+                        help="Entries in each reference list")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths, _ = generate_corpus(
+        args.out_dir, args.papers, args.pages, args.citation_density, args.references, args.seed
+    )
+    print(f"Wrote {len(paths)} PDFs to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
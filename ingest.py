@@ -0,0 +1,240 @@
+"""
+Headless bulk ingestion of a directory of PDFs into the vector index.
+
+Usage:
+    python ingest.py path/to/pdfs [--workers 4] [--batch-size 128]
+                                  [--checkpoint-every 50] [--reset]
+                                  [--collection default] [--figures]
+
+Papers go into the same collection the app searches
+(data/indexes/shared/<collection>). With SCILIT_INDEX_SERVICE set they
+are added through the running index service, like uploads in the app.
+Otherwise the collection is opened here, and ingest.py refuses to run
+while another process (e.g. the app) has it open.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from models.corpus_citation_graph import CorpusCitationGraph
+from models.figure_extractor import FigureExtractor, index_figures
+from models.directory_lock import DirectoryLock, DirectoryLockedError
+from models.index_service import (
+    DEFAULT_ROOT, DEFAULT_USER, Collection, IndexService, index_directory, namespace_name, open_service
+)
+from models.ingestion_pipeline import IngestionPipeline, find_pdfs
+from models.recommender import Recommender
+from models.text_encoder import TextEncoder
+from models.vector_engine import VectorEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a directory of research papers")
+    parser.add_argument("pdf_dir", help="Directory searched recursively for PDFs")
+    parser.add_argument("--collection", default="default",
+                        help="Collection of the app to add the papers to")
+    parser.add_argument("--root", default=DEFAULT_ROOT,
+                        help="Directory holding the collections")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used for PDF parsing")
+    parser.add_argument("--batch-size", type=int, default=128,
+                        help="Chunks per encoder call (batches span papers)")
+    parser.add_argument("--queue-size", type=int, default=32,
+                        help="Capacity of the queues between stages")
+    parser.add_argument("--checkpoint-every", type=int, default=50,
+                        help="Save the index (and figure index) after this many papers")
+    parser.add_argument("--reset", action="store_true",
+                        help="Clear the existing index and checkpoint first")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore the checkpoint and reprocess every paper")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Keep near-duplicate chunks (e.g. of preprints and published versions)")
+    parser.add_argument("--no-citations", action="store_true",
+                        help="Don't add papers to the corpus citation graph")
+    parser.add_argument("--figures", action="store_true",
+                        help="Also extract figures into the figure index (data/figure_index)")
+    parser.add_argument("--figure-batch-size", type=int, default=32,
+                        help="Images per CNN forward pass")
+    args = parser.parse_args()
+
+    paths = find_pdfs(args.pdf_dir)
+    print(f"Found {len(paths)} PDFs in {args.pdf_dir}")
+
+    namespace = namespace_name(DEFAULT_USER, args.collection)
+    # The in-process service (no $SCILIT_INDEX_SERVICE) takes dedupe from here
+    service = open_service(root=args.root, dedupe=not args.no_dedupe)
+    vector_db = Collection(service, namespace)
+
+    try:
+        # Opens (and locks) everything before the slow model load
+        len(vector_db)
+
+        # The collection's citation graph and recommendations, as in the app
+        citation_graph = None
+        if not args.no_citations:
+            citation_graph = CorpusCitationGraph(index_directory(namespace, "data/citation_graph"), lock=True)
+        recommender = Recommender(store_dir=index_directory(namespace, "data/recommender"), lock=True)
+
+    except DirectoryLockedError as e:
+        sys.exit(f"{e}. Stop the app (or the other ingest.py) and try again.")
+
+    encoder = TextEncoder()
+
+    pipeline = IngestionPipeline(
+        encoder,
+        vector_db,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        checkpoint_every=args.checkpoint_every,
+        checkpoint_path=os.path.join(index_directory(namespace, args.root), "ingest_checkpoint.json"),
+        citation_graph=citation_graph
+    )
+
+    if args.reset:
+        vector_db.reset()
+        recommender.reset()
+        if citation_graph is not None:
+            citation_graph.reset()
+        pipeline.clear_checkpoint()
+
+    def progress(stats):
+        print(
+            f"\r{stats['papers']} papers, {stats['pages']} pages, "
+            f"{stats['chunks']} chunks",
+            end="",
+            flush=True
+        )
+
+    stats = pipeline.run(
+        paths,
+        source_name=lambda path: os.path.relpath(path, args.pdf_dir),
+        resume=not args.no_resume,
+        progress=progress
+    )
+    print()
+
+    # Paper embeddings are the chunk centroids kept by the index
+    for source in vector_db.sources():
+        recommender.add_paper(source, vector_db.get_paper_embedding(source))
+    recommender.save()
+
+    # Saves and unlocks the collection (a remote service stays as it is)
+    if isinstance(service, IndexService):
+        service.close()
+
+    print(f"Indexed papers:   {stats['papers']}")
+    print(f"Skipped (resume): {stats['skipped']}")
+    print(f"Duplicate files:  {stats['duplicates']}")
+    print(f"Failed:           {len(stats['failed'])}")
+    for path, error in stats["failed"]:
+        print(f"  {path}: {error}")
+
+    print(f"Pages/sec:        {stats['pages_per_sec']:.1f}")
+    print(f"Chunks/sec:       {stats['chunks_per_sec']:.1f}")
+    print(f"Wall time:        {stats['elapsed_seconds']:.2f}s")
+
+    if citation_graph is not None:
+        graph_stats = citation_graph.stats()
+        print(
+            f"Citation graph:   {graph_stats['num_papers']} papers, "
+            f"{graph_stats['num_nodes']} works, {graph_stats['num_edges']} citations"
+        )
+
+    print("Stage time (s):")
+    print(f"  extract (sum over workers): {stats['extract_seconds']:.2f}")
+    print(f"  encode:                     {stats['encode_seconds']:.2f}")
+    print(f"  index:                      {stats['index_seconds']:.2f}")
+    print(f"  checkpoint:                 {stats['checkpoint_seconds']:.2f}")
+
+    if args.figures:
+        ingest_figures(paths, args)
+
+
+FIGURE_INDEX_DIR = "data/figure_index"
+# Papers whose figures are saved, including those that have none
+FIGURE_CHECKPOINT = os.path.join(FIGURE_INDEX_DIR, "figure_checkpoint.json")
+
+
+def load_figure_checkpoint():
+    if not os.path.exists(FIGURE_CHECKPOINT):
+        return set()
+
+    with open(FIGURE_CHECKPOINT) as f:
+        return set(json.load(f)["done"])
+
+
+def write_figure_checkpoint(done):
+    tmp_path = FIGURE_CHECKPOINT + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_path, FIGURE_CHECKPOINT)
+
+
+def ingest_figures(paths, args):
+    # torchvision is only needed for figures, so it is imported here
+    from models.cnn_figure_encoder import CNNFigureEncoder
+
+    figure_encoder = CNNFigureEncoder(workers=args.workers)
+    try:
+        figure_lock = DirectoryLock(FIGURE_INDEX_DIR).acquire()
+    except DirectoryLockedError as e:
+        sys.exit(f"{e}. Is another ingest.py --figures running?")
+
+    figure_index = VectorEngine(dimension=512, index_dir=FIGURE_INDEX_DIR)
+    extractor = FigureExtractor(workers=args.workers)
+
+    if args.reset:
+        figure_index.reset()
+        if os.path.exists(FIGURE_CHECKPOINT):
+            os.remove(FIGURE_CHECKPOINT)
+
+    done = set() if args.no_resume else load_figure_checkpoint()
+
+    total = 0
+    since_checkpoint = 0
+    for number, path in enumerate(paths, start=1):
+        source = os.path.relpath(path, args.pdf_dir)
+
+        # Done by an earlier run
+        if source in done:
+            continue
+
+        # Figures saved after the last checkpoint would be added twice
+        figure_index.remove_document(source)
+
+        try:
+            total += index_figures(
+                path,
+                source,
+                figure_encoder,
+                figure_index,
+                extractor=extractor,
+                batch_size=args.figure_batch_size
+            )
+        except Exception as e:
+            print(f"\n  {path}: figure extraction failed: {e}")
+        else:
+            done.add(source)
+
+        # Papers saved so far are skipped when a crashed run is resumed
+        since_checkpoint += 1
+        if since_checkpoint >= args.checkpoint_every:
+            figure_index.save_index()
+            write_figure_checkpoint(done)
+            since_checkpoint = 0
+
+        print(f"\r{number}/{len(paths)} papers, {total} figures", end="", flush=True)
+
+    figure_index.save_index()
+    write_figure_checkpoint(done)
+    figure_index.wait_for_compaction()
+    figure_lock.release()
+    print()
+    print(f"Indexed figures:  {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Rebuild the saved vector index of a collection (by default the app's
+"default" collection) as an approximate nearest neighbour index.
+
+Usage:
+    python migrate_index.py hnsw [--hnsw-m 32]
+    python migrate_index.py ivf_flat [--nlist 1024]
+    python migrate_index.py ivf_pq [--nlist 1024] [--pq-m 64]
+    python migrate_index.py flat --storage int8 [--reduce-dim 384 --reduction pca]
+    python migrate_index.py hnsw --collection papers
+
+With SCILIT_INDEX_SERVICE set the collection is migrated by the running
+index service. Otherwise it is opened here, and migrate_index.py refuses
+to run while another process (e.g. the app) has it open.
+"""
+
+import argparse
+import sys
+
+from models.directory_lock import DirectoryLock, DirectoryLockedError
+from models.index_service import DEFAULT_ROOT, DEFAULT_USER, Collection, IndexService, namespace_name, open_service
+from models.vector_engine import INDEX_TYPES, REDUCTIONS, STORAGE_TYPES, VectorEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the vector index to another index type")
+    parser.add_argument("index_type", choices=INDEX_TYPES)
+    parser.add_argument("--collection", default="default")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Directory holding the collections")
+    parser.add_argument("--index-dir", help="Index directory (overrides --collection)")
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--pq-m", type=int)
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--storage", choices=STORAGE_TYPES)
+    parser.add_argument("--reduce-dim", type=int, help="0 keeps every dimension")
+    parser.add_argument("--reduction", choices=REDUCTIONS)
+    parser.add_argument("--rerank", type=int)
+    args = parser.parse_args()
+
+    options = {
+        name: value
+        for name, value in {
+            "nlist": args.nlist,
+            "pq_m": args.pq_m,
+            "hnsw_m": args.hnsw_m,
+            "nprobe": args.nprobe,
+            "ef_search": args.ef_search,
+            "storage": args.storage,
+            "reduce_dim": args.reduce_dim,
+            "reduction": args.reduction,
+            "rerank": args.rerank,
+        }.items()
+        if value is not None
+    }
+
+    try:
+        if args.index_dir is not None:
+            with DirectoryLock(args.index_dir):
+                migrate_directory(args.index_dir, args.index_type, options)
+        else:
+            migrate_collection(args, options)
+    except DirectoryLockedError as e:
+        sys.exit(f"{e}. Stop the app and try again, or run the index service and set SCILIT_INDEX_SERVICE.")
+
+
+def migrate_directory(index_dir, index_type, options):
+    vector_db = VectorEngine(index_dir=index_dir)
+    print(f"Loaded {vector_db.index.ntotal} vectors ({vector_db.index_type}, {vector_db.storage})")
+
+    vector_db.migrate(index_type, **options)
+    vector_db.save_index()
+    vector_db.wait_for_compaction()
+
+    print(f"Saved {vector_db.index.ntotal} vectors as {vector_db.index_type} ({vector_db._factory_string()})")
+
+
+def migrate_collection(args, options):
+    service = open_service(root=args.root)
+    collection = Collection(service, namespace_name(DEFAULT_USER, args.collection))
+
+    info = collection.describe()
+    print(f"Loaded {info['vectors']} vectors ({info['index_type']}, {info['storage']})")
+
+    collection.migrate(args.index_type, **options)
+
+    info = collection.describe()
+    print(f"Saved {info['vectors']} vectors as {info['index_type']} ({info['factory']})")
+
+    # Saves and unlocks the collection (a remote service stays as it is)
+    if isinstance(service, IndexService):
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
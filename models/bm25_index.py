@@ -0,0 +1,270 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over chunk ids.
+
+    Each term's posting list holds delta-encoded chunk ids (uint32) and
+    term frequencies (uint16). Postings loaded from disk stay as slices of
+    one contiguous array; postings added afterwards go to small per-term
+    tail arrays. Chunk ids must be added in increasing order, which is
+    how VectorEngine assigns them.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+        self._term_ids = {}
+        self._base_deltas = []
+        self._base_tfs = []
+        self._tail_deltas = []
+        self._tail_tfs = []
+        self._last_doc = []
+
+        self._doc_lengths = array("I")
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    # ---------- building ----------
+
+    def _term_id(self, term):
+        tid = self._term_ids.get(term)
+        if tid is None:
+            tid = len(self._term_ids)
+            self._term_ids[term] = tid
+            self._base_deltas.append(np.zeros(0, dtype="uint32"))
+            self._base_tfs.append(np.zeros(0, dtype="uint16"))
+            self._tail_deltas.append(array("I"))
+            self._tail_tfs.append(array("H"))
+            self._last_doc.append(0)
+        return tid
+
+    def add(self, doc_ids, texts):
+        for doc_id, text in zip(doc_ids, texts):
+            doc_id = int(doc_id)
+            if doc_id != len(self._doc_lengths):
+                raise ValueError(f"BM25Index expects doc id {len(self._doc_lengths)}, got {doc_id}")
+
+            tokens = tokenize(text)
+            self._doc_lengths.append(len(tokens))
+            self._total_length += len(tokens)
+
+            for term, tf in Counter(tokens).items():
+                tid = self._term_id(term)
+                self._tail_deltas[tid].append(doc_id - self._last_doc[tid])
+                self._tail_tfs[tid].append(min(tf, 65535))
+                self._last_doc[tid] = doc_id
+
+    def _postings(self, tid):
+        deltas = self._base_deltas[tid]
+        tfs = self._base_tfs[tid]
+
+        if self._tail_deltas[tid]:
+            deltas = np.concatenate([deltas, np.frombuffer(self._tail_deltas[tid], dtype="uint32")])
+            tfs = np.concatenate([tfs, np.frombuffer(self._tail_tfs[tid], dtype="uint16")])
+
+        return np.cumsum(deltas, dtype="int64"), tfs
+
+    # ---------- querying ----------
+
+    def search(self, query, k=10, exclude=None, include=None):
+        """
+        Returns (ids, scores) of the top-k chunks, best first.
+        exclude: optional array of chunk ids to leave out (deleted chunks)
+        include: optional boolean mask indexed by chunk id; only chunks
+            where it is True are ranked (metadata filters)
+        """
+        num_docs = len(self._doc_lengths)
+        if num_docs == 0:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype="uint32")
+        avg_length = self._total_length / num_docs or 1.0
+
+        all_ids = []
+        all_scores = []
+
+        for term in set(tokenize(query)):
+            tid = self._term_ids.get(term)
+            if tid is None:
+                continue
+
+            ids, tfs = self._postings(tid)
+            idf = math.log(1 + (num_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+
+            tfs = tfs.astype("float32")
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[ids] / avg_length)
+
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if not all_ids:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        # Sum per document without allocating an array over the whole corpus
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype("float32")
+
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(ids, exclude)
+            ids, scores = ids[keep], scores[keep]
+
+        if include is not None:
+            inside = ids < len(include)
+            ids, scores = ids[inside], scores[inside]
+            keep = include[ids]
+            ids, scores = ids[keep], scores[keep]
+
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
+
+    # ---------- persistence ----------
+
+    def snapshot(self):
+        """
+        Materialize every posting list into flat arrays for save().
+        """
+        terms = list(self._term_ids)
+        deltas = []
+        tfs = []
+        ends = np.zeros(len(terms), dtype="int64")
+        position = 0
+
+        for tid in range(len(terms)):
+            if self._tail_deltas[tid]:
+                term_deltas = np.concatenate([
+                    self._base_deltas[tid],
+                    np.frombuffer(self._tail_deltas[tid], dtype="uint32")
+                ])
+                term_tfs = np.concatenate([
+                    self._base_tfs[tid],
+                    np.frombuffer(self._tail_tfs[tid], dtype="uint16")
+                ])
+            else:
+                term_deltas = self._base_deltas[tid]
+                term_tfs = self._base_tfs[tid]
+
+            deltas.append(term_deltas)
+            tfs.append(term_tfs)
+            position += len(term_deltas)
+            ends[tid] = position
+
+        return {
+            "terms": terms,
+            "ends": ends,
+            "deltas": np.concatenate(deltas) if deltas else np.zeros(0, dtype="uint32"),
+            "tfs": np.concatenate(tfs) if tfs else np.zeros(0, dtype="uint16"),
+            "last_doc": np.array(self._last_doc, dtype="int64"),
+            "doc_lengths": np.frombuffer(self._doc_lengths, dtype="uint32").copy(),
+        }
+
+    @staticmethod
+    def save(snapshot, directory):
+        """
+        Write a snapshot() to directory/bm25.npz. The terms are stored in
+        the same file as their postings, so one replace swaps both.
+        """
+        tmp_path = os.path.join(directory, "bm25.tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=np.array(snapshot["terms"], dtype=str),
+            ends=snapshot["ends"],
+            deltas=snapshot["deltas"],
+            tfs=snapshot["tfs"],
+            last_doc=snapshot["last_doc"],
+            doc_lengths=snapshot["doc_lengths"],
+        )
+        os.replace(tmp_path, os.path.join(directory, "bm25.npz"))
+
+        # Written by older versions, and no longer read
+        legacy_terms = os.path.join(directory, "bm25_terms.json")
+        if os.path.exists(legacy_terms):
+            os.remove(legacy_terms)
+
+    @classmethod
+    def load(cls, directory, **options):
+        index = cls(**options)
+        path = os.path.join(directory, "bm25.npz")
+
+        if not os.path.exists(path):
+            return index
+
+        data = np.load(path)
+
+        if "terms" in data:
+            terms = data["terms"].tolist()
+        else:
+            # Saved by older versions, with the terms in a separate file
+            with open(os.path.join(directory, "bm25_terms.json")) as f:
+                terms = json.load(f)
+
+        deltas = data["deltas"]
+        tfs = data["tfs"]
+        ends = data["ends"]
+        starts = np.concatenate([[0], ends[:-1]]).astype("int64")
+
+        index._term_ids = {term: tid for tid, term in enumerate(terms)}
+        index._base_deltas = [deltas[s:e] for s, e in zip(starts, ends)]
+        index._base_tfs = [tfs[s:e] for s, e in zip(starts, ends)]
+        index._tail_deltas = [array("I") for _ in terms]
+        index._tail_tfs = [array("H") for _ in terms]
+        index._last_doc = data["last_doc"].tolist()
+
+        index._doc_lengths = array("I", data["doc_lengths"].tobytes())
+        index._total_length = int(data["doc_lengths"].sum())
+
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked id lists. Returns {id: fused score}.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (k + rank + 1)
+    return fused
+
+
+def weighted_fusion(dense, sparse, alpha=0.5):
+    """
+    alpha * dense + (1 - alpha) * sparse, each min-max normalized.
+    dense / sparse: {id: score}. Returns {id: fused score}.
+    """
+    def normalize(scores):
+        if not scores:
+            return {}
+        low, high = min(scores.values()), max(scores.values())
+        span = (high - low) or 1.0
+        return {idx: (score - low) / span for idx, score in scores.items()}
+
+    dense = normalize(dense)
+    sparse = normalize(sparse)
+
+    return {
+        idx: alpha * dense.get(idx, 0.0) + (1 - alpha) * sparse.get(idx, 0.0)
+        for idx in set(dense) | set(sparse)
+    }
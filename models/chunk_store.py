@@ -0,0 +1,490 @@
+import json
+import mmap
+import os
+
+import numpy as np
+
+from models.dedup import BANDS
+
+
+# Columns of metadata.bin; -1 = unknown
+METADATA_FIELDS = ("page_start", "page_end", "section", "year")
+
+
+class ChunkStore:
+    """
+    Append-only, columnar storage for chunks. A chunk's id is its
+    position in the store and never changes.
+
+    On disk (inside `directory`):
+        texts.bin         all chunk texts as one UTF-8 blob
+        offsets.bin       int64 end offset of each chunk in texts.bin
+        source_ids.bin    int32 source code of each chunk
+        vectors.bin       float32 (n, dimension) full-precision embeddings
+        signatures.bin    uint64 (n, BANDS) MinHash band keys (0 = none)
+        metadata.bin      int32 (n, 4) page_start, page_end, section code
+                          and year of each chunk (-1 = unknown)
+        sources.json      source names, indexed by source code
+        sections.json     section titles, indexed by section code
+        deleted.bin       int64 ids of deleted chunks (tombstones)
+
+    Persisted chunks are read lazily through mmap, so opening the store
+    costs O(number of sources + deletions), not O(number of chunks).
+    New chunks and deletions are kept in memory until flush() appends
+    them to the files. offsets.bin is written last and is the source of
+    truth for how many chunks were persisted, so a crash mid-flush loses
+    only that flush.
+    """
+
+    def __init__(self, directory=None, dimension=768):
+        self.directory = directory
+        self.dimension = dimension
+
+        self._source_names = []
+        self._source_codes = {}
+        self._section_names = []
+        self._section_codes = {}
+
+        self._pending_texts = []
+        self._pending_sources = []
+        self._pending_vectors = []
+        self._pending_signatures = []
+        self._pending_metadata = []
+
+        self._persisted = 0
+        self._texts = None
+        self._offsets = np.zeros(0, dtype="int64")
+        self._source_ids = np.zeros(0, dtype="int32")
+        self._vectors = np.zeros((0, dimension), dtype="float32")
+        self._signatures = np.zeros((0, BANDS), dtype="uint64")
+        self._metadata = np.zeros((0, len(METADATA_FIELDS)), dtype="int32")
+
+        self._deleted = set()
+        self._persisted_deletes = 0
+        self._pending_deletes = []
+
+        # Set by reset(): the files are truncated on the next flush
+        self._truncate = False
+
+        if directory and os.path.exists(self._path("offsets.bin")):
+            self._open()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _map_array(path, dtype, shape):
+        if shape[0] == 0 or not os.path.exists(path):
+            return np.zeros((0,) + shape[1:], dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    def _open(self):
+        with open(self._path("sources.json")) as f:
+            self._source_names = json.load(f)
+        self._source_codes = {name: code for code, name in enumerate(self._source_names)}
+
+        if os.path.exists(self._path("sections.json")):
+            with open(self._path("sections.json")) as f:
+                self._section_names = json.load(f)
+            self._section_codes = {name: code for code, name in enumerate(self._section_names)}
+
+        count = os.path.getsize(self._path("offsets.bin")) // 8
+        self._offsets = self._map_array(self._path("offsets.bin"), "int64", (count,))
+        self._source_ids = self._map_array(self._path("source_ids.bin"), "int32", (count,))
+        self._vectors = self._map_array(
+            self._path("vectors.bin"), "float32", (count, self.dimension)
+        )
+
+        # Stores written before signatures were kept have none
+        signatures_path = self._path("signatures.bin")
+        known = os.path.getsize(signatures_path) // (8 * BANDS) if os.path.exists(signatures_path) else 0
+        self._signatures = self._map_array(signatures_path, "uint64", (min(known, count), BANDS))
+
+        # Likewise for metadata
+        row_bytes = 4 * len(METADATA_FIELDS)
+        metadata_path = self._path("metadata.bin")
+        known = os.path.getsize(metadata_path) // row_bytes if os.path.exists(metadata_path) else 0
+        self._metadata = self._map_array(
+            metadata_path, "int32", (min(known, count), len(METADATA_FIELDS))
+        )
+
+        self._texts = None
+        if count and self._offsets[-1] > 0:
+            with open(self._path("texts.bin"), "rb") as f:
+                self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if os.path.exists(self._path("deleted.bin")):
+            deleted = np.fromfile(self._path("deleted.bin"), dtype="int64")
+            self._deleted = set(deleted.tolist()) | set(self._pending_deletes)
+            self._persisted_deletes = len(deleted)
+
+        self._persisted = count
+
+    # ---------- writing ----------
+
+    def _source_code(self, source):
+        code = self._source_codes.get(source)
+        if code is None:
+            code = len(self._source_names)
+            self._source_names.append(source)
+            self._source_codes[source] = code
+        return code
+
+    def _metadata_rows(self, metadata):
+        rows = np.full((len(metadata), len(METADATA_FIELDS)), -1, dtype="int32")
+
+        for row, item in enumerate(metadata):
+            for column, field in enumerate(METADATA_FIELDS):
+                value = item.get(field)
+                if value is None:
+                    continue
+
+                if field == "section":
+                    code = self._section_codes.get(value)
+                    if code is None:
+                        code = len(self._section_names)
+                        self._section_names.append(value)
+                        self._section_codes[value] = code
+                    value = code
+
+                rows[row, column] = value
+
+        return rows
+
+    def append(self, texts, source, vectors, signatures=None, metadata=None):
+        """
+        Add chunks (and their float32 vectors and, optionally, MinHash
+        signatures, see models.dedup) for one source.
+
+        Parameters:
+            metadata (list[dict]): per chunk, any of page_start,
+                page_end, section (title) and year
+
+        Returns the ids of the new chunks as an int64 array.
+        """
+        start = len(self)
+        code = self._source_code(source)
+
+        if signatures is None:
+            signatures = np.zeros((len(texts), BANDS), dtype="uint64")
+
+        self._pending_texts.extend(texts)
+        self._pending_sources.extend([code] * len(texts))
+        self._pending_vectors.append(np.asarray(vectors, dtype="float32").reshape(-1, self.dimension))
+        self._pending_signatures.append(np.asarray(signatures, dtype="uint64").reshape(-1, BANDS))
+        self._pending_metadata.append(self._metadata_rows(metadata or [{}] * len(texts)))
+
+        return np.arange(start, len(self), dtype="int64")
+
+    def delete(self, ids):
+        """
+        Tombstone chunks. Deleted chunks keep their id and stay readable.
+        """
+        new = [int(i) for i in ids if int(i) not in self._deleted]
+        self._deleted.update(new)
+        self._pending_deletes.extend(new)
+        return new
+
+    def flush(self):
+        """
+        Append pending chunks and deletions to the files on disk.
+        """
+        if not self.directory:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        truncated = self._truncate
+        if truncated:
+            for name in (
+                "texts.bin", "offsets.bin", "source_ids.bin", "vectors.bin", "signatures.bin", "metadata.bin",
+                "deleted.bin"
+            ):
+                open(self._path(name), "wb").close()
+            self._truncate = False
+
+        if self._pending_texts or truncated or not os.path.exists(self._path("sources.json")):
+            self._flush_chunks()
+
+        # Tombstones go after the chunks they refer to are committed
+        if self._pending_deletes:
+            with open(self._path("deleted.bin"), "ab") as f:
+                f.write(np.array(self._pending_deletes, dtype="int64").tobytes())
+            self._persisted_deletes += len(self._pending_deletes)
+            self._pending_deletes = []
+
+    def _flush_chunks(self):
+        encoded = [text.encode("utf-8") for text in self._pending_texts]
+        base = int(self._offsets[-1]) if self._persisted else 0
+        ends = base + np.cumsum([len(blob) for blob in encoded], dtype="int64")
+
+        # Write at the last committed offset, dropping bytes left by an
+        # interrupted flush
+        mode = "r+b" if os.path.exists(self._path("texts.bin")) else "wb"
+        with open(self._path("texts.bin"), mode) as f:
+            f.seek(base)
+            f.write(b"".join(encoded))
+            f.truncate()
+
+        self._append_array("source_ids.bin", np.array(self._pending_sources, dtype="int32"))
+        self._append_array("vectors.bin", self._pending_matrix())
+        self._append_array("signatures.bin", self._pending_signature_matrix())
+        self._fill_metadata()
+        self._append_array("metadata.bin", self._pending_metadata_matrix())
+
+        tmp_path = self._path("sources.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._source_names, f)
+        os.replace(tmp_path, self._path("sources.json"))
+
+        tmp_path = self._path("sections.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._section_names, f)
+        os.replace(tmp_path, self._path("sections.json"))
+
+        # Commit point
+        self._append_array("offsets.bin", ends)
+
+        self._pending_texts = []
+        self._pending_sources = []
+        self._pending_vectors = []
+        self._pending_signatures = []
+        self._pending_metadata = []
+        self._open()
+
+    def _append_array(self, name, values):
+        row_bytes = values.dtype.itemsize * (values.shape[1] if values.ndim == 2 else 1)
+        mode = "r+b" if os.path.exists(self._path(name)) else "wb"
+
+        with open(self._path(name), mode) as f:
+            f.seek(self._persisted * row_bytes)
+            f.write(values.tobytes())
+            f.truncate()
+
+    def _fill_metadata(self):
+        # Stores written before metadata was kept: mark the older chunks
+        # unknown, so new rows land at their ids
+        missing = self._persisted - len(self._metadata)
+        if missing <= 0:
+            return
+
+        row_bytes = 4 * len(METADATA_FIELDS)
+        mode = "r+b" if os.path.exists(self._path("metadata.bin")) else "wb"
+
+        with open(self._path("metadata.bin"), mode) as f:
+            f.seek(len(self._metadata) * row_bytes)
+            f.write(np.full((missing, len(METADATA_FIELDS)), -1, dtype="int32").tobytes())
+
+    def write_vectors(self, vectors):
+        """
+        Store vectors for already persisted chunks that have none
+        (stores written before vectors were kept).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+
+        with open(self._path("vectors.bin"), "wb") as f:
+            f.write(vectors[:self._persisted].tobytes())
+
+        self._open()
+
+    def reset(self):
+        self._source_names = []
+        self._source_codes = {}
+        self._section_names = []
+        self._section_codes = {}
+        self._pending_texts = []
+        self._pending_sources = []
+        self._pending_vectors = []
+        self._pending_signatures = []
+        self._pending_metadata = []
+
+        self._persisted = 0
+        self._texts = None
+        self._offsets = np.zeros(0, dtype="int64")
+        self._source_ids = np.zeros(0, dtype="int32")
+        self._vectors = np.zeros((0, self.dimension), dtype="float32")
+        self._signatures = np.zeros((0, BANDS), dtype="uint64")
+        self._metadata = np.zeros((0, len(METADATA_FIELDS)), dtype="int32")
+
+        self._deleted = set()
+        self._persisted_deletes = 0
+        self._pending_deletes = []
+        self._truncate = True
+
+    # ---------- reading ----------
+
+    def __len__(self):
+        return self._persisted + len(self._pending_texts)
+
+    def has_vectors(self):
+        return len(self._vectors) == self._persisted
+
+    def _pending_matrix(self):
+        if not self._pending_vectors:
+            return np.zeros((0, self.dimension), dtype="float32")
+
+        if len(self._pending_vectors) > 1:
+            self._pending_vectors = [np.vstack(self._pending_vectors)]
+
+        return self._pending_vectors[0]
+
+    def text(self, idx):
+        persisted = self._persisted
+
+        if idx < persisted:
+            start = int(self._offsets[idx - 1]) if idx else 0
+            end = int(self._offsets[idx])
+            return self._texts[start:end].decode("utf-8") if end > start else ""
+
+        return self._pending_texts[idx - persisted]
+
+    def source(self, idx):
+        persisted = self._persisted
+
+        if idx < persisted:
+            return self._source_names[self._source_ids[idx]]
+
+        return self._source_names[self._pending_sources[idx - persisted]]
+
+    def vectors(self, ids):
+        """
+        Full-precision vectors for the given ids, as an (n, dimension) array.
+        """
+        ids = np.asarray(ids, dtype="int64")
+        persisted = self._persisted
+        out = np.empty((len(ids), self.dimension), dtype="float32")
+
+        on_disk = ids < persisted
+        out[on_disk] = self._vectors[ids[on_disk]]
+        if not on_disk.all():
+            out[~on_disk] = self._pending_matrix()[ids[~on_disk] - persisted]
+
+        return out
+
+    def _pending_signature_matrix(self):
+        if not self._pending_signatures:
+            return np.zeros((0, BANDS), dtype="uint64")
+
+        if len(self._pending_signatures) > 1:
+            self._pending_signatures = [np.vstack(self._pending_signatures)]
+
+        return self._pending_signatures[0]
+
+    def signatures(self, ids):
+        """
+        MinHash signatures for the given ids (rows of zeros = none).
+        """
+        ids = np.asarray(ids, dtype="int64")
+        out = np.zeros((len(ids), BANDS), dtype="uint64")
+
+        known = ids < len(self._signatures)
+        out[known] = self._signatures[ids[known]]
+
+        pending = ids >= self._persisted
+        if pending.any():
+            out[pending] = self._pending_signature_matrix()[ids[pending] - self._persisted]
+
+        return out
+
+    def _pending_metadata_matrix(self):
+        if not self._pending_metadata:
+            return np.zeros((0, len(METADATA_FIELDS)), dtype="int32")
+
+        if len(self._pending_metadata) > 1:
+            self._pending_metadata = [np.vstack(self._pending_metadata)]
+
+        return self._pending_metadata[0]
+
+    def column(self, field):
+        """
+        One int32 value per chunk, indexed by id: "source" (source code)
+        or a METADATA_FIELDS entry ("section" as section code; -1 =
+        unknown).
+        """
+        if field == "source":
+            return np.concatenate([
+                self._source_ids,
+                np.array(self._pending_sources, dtype="int32"),
+            ])
+
+        position = METADATA_FIELDS.index(field)
+        out = np.full(len(self), -1, dtype="int32")
+        out[:len(self._metadata)] = self._metadata[:, position]
+        out[self._persisted:] = self._pending_metadata_matrix()[:, position]
+        return out
+
+    def metadata(self, idx):
+        """
+        Metadata of one chunk as a dict (None for unknown values).
+        """
+        if idx < self._persisted:
+            row = self._metadata[idx] if idx < len(self._metadata) else None
+        else:
+            row = self._pending_metadata_matrix()[idx - self._persisted]
+
+        if row is None:
+            return dict.fromkeys(METADATA_FIELDS)
+
+        values = {field: int(value) if value >= 0 else None for field, value in zip(METADATA_FIELDS, row)}
+        if values["section"] is not None:
+            values["section"] = self._section_names[values["section"]]
+        return values
+
+    def source_code(self, source):
+        """
+        Code of a source name in column("source"), or None.
+        """
+        return self._source_codes.get(source)
+
+    def section_code(self, section):
+        return self._section_codes.get(section)
+
+    def section_names(self):
+        return list(self._section_names)
+
+    def ids_for_source(self, source, include_deleted=False):
+        code = self._source_codes.get(source)
+        if code is None:
+            return np.zeros(0, dtype="int64")
+
+        ids = np.concatenate([
+            np.flatnonzero(self._source_ids == code),
+            self._persisted + np.flatnonzero(np.array(self._pending_sources, dtype="int32") == code),
+        ]).astype("int64")
+
+        if not include_deleted and self._deleted:
+            ids = ids[~np.isin(ids, self.deleted_ids())]
+
+        return ids
+
+    def live_ids(self):
+        ids = np.arange(len(self), dtype="int64")
+        if self._deleted:
+            ids = ids[~np.isin(ids, self.deleted_ids())]
+        return ids
+
+    def is_deleted(self, idx):
+        return idx in self._deleted
+
+    def deleted_ids(self):
+        return np.fromiter(self._deleted, dtype="int64", count=len(self._deleted))
+
+    def num_deleted(self):
+        """
+        Number of tombstones, including ones not yet flushed.
+        """
+        return self._persisted_deletes + len(self._pending_deletes)
+
+    def deletes_since(self, position):
+        """
+        Tombstones recorded after the first `position` ones, in order.
+        """
+        persisted = []
+        if position < self._persisted_deletes:
+            persisted = np.fromfile(
+                self._path("deleted.bin"), dtype="int64", offset=position * 8
+            ).tolist()
+        return persisted + self._pending_deletes[max(0, position - self._persisted_deletes):]
+
+    def source_names(self):
+        return list(self._source_names)
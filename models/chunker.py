@@ -0,0 +1,308 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+import numpy as np
+
+
+ABBREVIATIONS = ["Fig", "Figs", "Eq", "Eqs", "al", "e.g", "i.e", "vs", "No", "Ref", "Sec", "cf"]
+
+
+def _not_after(abbreviations):
+    # One lookbehind per abbreviation length (lookbehinds need a fixed width)
+    by_length = {}
+    for abbreviation in abbreviations:
+        by_length.setdefault(len(abbreviation), []).append(re.escape(abbreviation))
+
+    return "".join(
+        rf"(?<!\b(?:{'|'.join(words)})\.)" for _, words in sorted(by_length.items())
+    )
+
+
+# Sentence ends, unless the period ends a common abbreviation. The
+# lookbehinds come after the punctuation, so they are only tried there.
+SENTENCE_END = re.compile(r"[.!?]" + _not_after(ABBREVIATIONS) + r"\s+(?=[\"'(\[]?[A-Z0-9])")
+
+# "3.", "3.1" or "IV." in front of a heading
+HEADING_NUMBER = r"(?:\d+(?:\.\d+)*\.?|[IVX]+\.)"
+HEADING_WORDS = (
+    r"(?:Abstract|Introduction|Background|Related Work|Methods?|Methodology|Approach|"
+    r"Experiments?|Experimental Setup|Evaluation|Results|Discussion|Conclusions?|"
+    r"Future Work|Limitations|References|Bibliography|Acknowledge?ments?|Appendix)\b"
+)
+
+SECTION_HEADING = re.compile(rf"^(?:{HEADING_NUMBER}\s+)?{HEADING_WORDS}", re.IGNORECASE)
+NUMBERED_HEADING = re.compile(rf"^{HEADING_NUMBER}\s+[A-Z][\w ,:&/-]{{2,60}}$")
+
+# The lines that interrupt running text, found in one pass over a page:
+# "[Page N]" markers, bare page or line numbers (dropped) and lines that
+# start like a heading (confirmed by _is_heading). Every other line is
+# body text. Matching the newline before a line, rather than ^, lets
+# the scan jump from newline to newline.
+SPECIAL_LINE = re.compile(
+    r"\n[^\S\n]*(?:"
+    r"\[Page (\d+)\]"
+    r"|(\d{1,4})"
+    rf"|((?i:(?:{HEADING_NUMBER}[^\S\n]+)?{HEADING_WORDS})[^\n]*"
+    rf"|{HEADING_NUMBER}[^\S\n]+[A-Z][^\n]*)"
+    r")[^\S\n]*$",
+    re.MULTILINE
+)
+
+# Average characters per subword token of English scientific text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_token_lengths(texts):
+    """
+    Token counts estimated from the text length, for when no tokenizer
+    is at hand (e.g. in parsing worker processes).
+    """
+    return [-(-len(text) // CHARS_PER_TOKEN) for text in texts]
+
+
+def split_sentences(text):
+    # (end of one sentence, start of the next) at every break
+    breaks = [(match.start() + 1, match.end()) for match in SENTENCE_END.finditer(text)]
+    starts = [0] + [start for _, start in breaks]
+    ends = [end for end, _ in breaks] + [len(text)]
+
+    return [text[start:end] for start, end in zip(starts, ends) if start < end]
+
+
+def _is_heading(line):
+    # Headings are short and capitalized; wrapped body lines often
+    # start with a heading word too ("Results show that ...")
+    if len(line) > 80 or line.endswith(".") or not line[0].isupper() and not line[0].isdigit():
+        return False
+    if len(line.split()) > 6:
+        return False
+    return bool(SECTION_HEADING.match(line) or NUMBERED_HEADING.match(line))
+
+
+class TokenChunker:
+    """
+    Splits text into chunks of whole sentences that fit the encoder's
+    token window, with an overlap of trailing sentences between
+    consecutive chunks. Chunks never span two sections, and each one
+    records the pages and section it came from.
+
+    Text is read line by line: "[Page N]" lines (as written by
+    PaperCompressor) set the page, short heading-like lines start a new
+    section and every other line is kept, joined into sentences.
+    """
+
+    def __init__(self, token_lengths=None, max_tokens=256, overlap=32):
+        """
+        Parameters:
+            token_lengths (callable): list of texts -> list of token
+                counts (e.g. TextEncoder.token_lengths); defaults to
+                estimate_token_lengths
+            max_tokens (int): token budget of one chunk
+            overlap (int): at most this many tokens of whole sentences
+                are repeated at the start of the next chunk
+        """
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+
+        self.token_lengths = token_lengths or estimate_token_lengths
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    @classmethod
+    def for_encoder(cls, encoder, overlap=32):
+        """
+        Chunker sized by the encoder's own tokenizer and window.
+        """
+        return cls(
+            token_lengths=encoder.token_lengths,
+            max_tokens=encoder.max_tokens,
+            overlap=overlap
+        )
+
+    def _runs(self, segments):
+        """
+        Yields one list of (section, page, sentences) per segment: the
+        sentences of each stretch of body text, and each heading on its own.
+        """
+        page = None
+        section = None
+
+        for segment_page, text in segments:
+            if segment_page is not None:
+                page = segment_page
+
+            runs = []
+            # Body text since the last page marker or heading, without
+            # the bare-number lines cut out of it
+            parts = []
+            position = 0
+            text = "\n" + text
+
+            def flush_body():
+                lines = "".join(parts).split("\n")
+                body = " ".join(filter(None, map(str.strip, lines)))
+                if body:
+                    runs.append((section, page, split_sentences(body)))
+                parts.clear()
+
+            for match in SPECIAL_LINE.finditer(text):
+                marker, number, heading = match.groups()
+
+                if heading is not None:
+                    heading = heading.strip()
+                    if not _is_heading(heading):
+                        continue
+
+                parts.append(text[position:match.start()])
+                position = match.end()
+
+                if number is not None:
+                    continue
+
+                flush_body()
+                if marker is not None:
+                    page = int(marker)
+                else:
+                    section = heading
+                    # The heading leads the first chunk of its section
+                    runs.append((section, page, [heading]))
+
+            parts.append(text[position:])
+            flush_body()
+            yield runs
+
+    def _split_long(self, sentence, length):
+        """
+        Cuts a sentence longer than max_tokens at word boundaries.
+        Returns [(piece, tokens)].
+        """
+        words = sentence.split()
+        if len(words) < 2:
+            # One giant "word" (e.g. a URL or a table row without spaces)
+            return [(sentence, length)]
+
+        word_lengths = np.asarray(self.token_lengths(words))
+        pieces = []
+        start = 0
+        total = 0
+
+        for end, n in enumerate(word_lengths):
+            if total + n > self.max_tokens and end > start:
+                pieces.append((" ".join(words[start:end]), int(total)))
+                start, total = end, 0
+            total += n
+
+        pieces.append((" ".join(words[start:]), int(total)))
+        return pieces
+
+    def iter_chunks(self, segments):
+        """
+        Single pass over (page_number or None, text) segments, e.g. the
+        pages of a paper. Token lengths are computed one segment at a time.
+
+        Yields:
+            {"text", "page_start", "page_end", "section", "tokens"}
+        """
+        # Pieces (sentences or parts of long ones) of the current section
+        # not packed into a finished chunk yet. Those before `fresh` were
+        # already emitted and are only kept as overlap.
+        texts = []
+        lengths = []
+        pages = []
+        fresh = 0
+        section = None
+
+        def pack(final):
+            """
+            Emits the chunks that are complete (all of them when final),
+            packing with prefix sums so each chunk costs two binary
+            searches instead of a step per sentence.
+            """
+            nonlocal texts, lengths, pages, fresh
+
+            cumulative = list(accumulate(lengths, initial=0))
+            start = 0
+
+            while fresh < len(texts):
+                # Last piece that still fits, but at least one new piece
+                fits = bisect_right(cumulative, cumulative[start] + self.max_tokens) - 1
+                end = max(fresh + 1, fits)
+
+                if end == len(texts) and not final:
+                    # Later pieces may still fit into this chunk
+                    break
+
+                yield {
+                    "text": " ".join(texts[start:end]),
+                    "page_start": pages[start],
+                    "page_end": pages[end - 1],
+                    "section": section,
+                    "tokens": cumulative[end] - cumulative[start],
+                }
+                fresh = end
+
+                if end < len(texts):
+                    # Carry whole trailing pieces over as overlap, leaving
+                    # room for the piece that starts the next chunk
+                    room = min(self.overlap, self.max_tokens - lengths[end])
+                    kept = bisect_left(cumulative, cumulative[end] - room)
+                    start = min(max(start, kept), end)
+
+            texts, lengths, pages = texts[start:], lengths[start:], pages[start:]
+            fresh -= start
+
+        for runs in self._runs(segments):
+            sentences = [sentence for _, _, run in runs for sentence in run]
+            if not sentences:
+                continue
+
+            segment_lengths = list(self.token_lengths(sentences))
+            offset = 0
+
+            for run_section, page, run in runs:
+                run_lengths = segment_lengths[offset:offset + len(run)]
+                offset += len(run)
+
+                if run_section != section:
+                    # No chunk (and no overlap) crosses a section boundary
+                    yield from pack(final=True)
+                    texts, lengths, pages, fresh = [], [], [], 0
+                    section = run_section
+
+                if max(run_lengths) <= self.max_tokens:
+                    texts.extend(run)
+                    lengths.extend(run_lengths)
+                    pages.extend([page] * len(run))
+                    continue
+
+                for sentence, length in zip(run, run_lengths):
+                    pieces = (
+                        self._split_long(sentence, length)
+                        if length > self.max_tokens else [(sentence, length)]
+                    )
+                    for piece, n in pieces:
+                        texts.append(piece)
+                        lengths.append(n)
+                        pages.append(page)
+
+            yield from pack(final=False)
+
+        yield from pack(final=True)
+
+    def chunk_text(self, text):
+        """
+        Chunks of one document (as a list, see iter_chunks).
+        """
+        return list(self.iter_chunks([(None, text)]))
+
+
+def length_batches(chunks, batch_size):
+    """
+    Groups chunks of similar token length so each encoder batch pads
+    little. Yields lists of positions into `chunks`, shortest first.
+    """
+    order = np.argsort([chunk["tokens"] for chunk in chunks], kind="stable")
+
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size].tolist()
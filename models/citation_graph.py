@@ -1,14 +1,120 @@
-import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
+
+from models.lazy import lazy_import
+
+nx = lazy_import("networkx")
+sparse = lazy_import("scipy.sparse")
+
+
+def spectral_positions(adjacency, seed=42):
+    """
+    2-D positions from the two smallest non-trivial eigenvectors of the
+    normalized graph Laplacian (sparse eigensolver, scales to large graphs).
+    """
+    from scipy.sparse.linalg import eigsh
+
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+
+    if n < 4:
+        return rng.uniform(-1, 1, (n, 2))
+
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inv_sqrt = 1.0 / np.sqrt(np.maximum(degree, 1))
+    d = sparse.diags(inv_sqrt)
+    laplacian = sparse.identity(n) - d @ adjacency @ d
+
+    try:
+        _, vectors = eigsh(laplacian, k=3, which="SM", v0=rng.uniform(size=n), tol=1e-3)
+        positions = vectors[:, 1:3] * inv_sqrt[:, None]
+    except Exception:
+        # No convergence (e.g. many components): fall back to random
+        return rng.uniform(-1, 1, (n, 2))
+
+    # Nodes with identical eigenvector entries (e.g. star leaves) would
+    # coincide; jitter them so the force step can pull them apart
+    scale = np.abs(positions).max() or 1.0
+    return positions / scale + rng.normal(0, 0.05, (n, 2))
+
+
+def force_layout(adjacency, iterations=50, seed=42, positions=None):
+    """
+    Vectorized Fruchterman-Reingold layout. Each iteration computes all
+    pairwise repulsions as one (n, n) numpy operation, so it is meant for
+    the few hundred nodes that are actually drawn.
+
+    Returns:
+        (n, 2) array of positions in [-1, 1]
+    """
+    n = adjacency.shape[0]
+    if positions is None:
+        positions = spectral_positions(adjacency, seed)
+    positions = np.array(positions, dtype="float64")
+
+    if n < 2:
+        return np.zeros((n, 2))
+
+    coo = sparse.triu(adjacency, k=1).tocoo()
+    rows, cols = coo.row, coo.col
+
+    k = 1.0 / np.sqrt(n)
+    temperature = 0.1
+
+    for _ in range(iterations):
+        delta = positions[:, None, :] - positions[None, :, :]
+        distance = np.sqrt((delta ** 2).sum(axis=-1))
+        np.fill_diagonal(distance, 1.0)
+        distance = np.maximum(distance, 0.01)
+
+        displacement = ((k * k / distance ** 2)[:, :, None] * delta).sum(axis=1)
+
+        # Attraction along edges
+        edge_delta = positions[rows] - positions[cols]
+        edge_distance = np.maximum(np.sqrt((edge_delta ** 2).sum(axis=1)), 0.01)
+        pull = edge_delta * (edge_distance / k)[:, None]
+        np.subtract.at(displacement, rows, pull)
+        np.add.at(displacement, cols, pull)
+
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        positions += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+
+    positions -= positions.mean(axis=0)
+    scale = np.abs(positions).max() or 1.0
+    return positions / scale
 
 
 class CitationGraph:
+    # Above this many nodes only the strongest ones are drawn
+    MAX_NODES = 200
+    # Above this many drawn nodes labels are dropped (except the main paper)
+    MAX_LABELS = 60
+    # Graphs up to this size get force refinement, larger ones spectral only
+    FORCE_LIMIT = 2000
+
     def __init__(self):
         self.graph = nx.DiGraph()
 
+        # Bumped on every change; layouts and figures are cached per version
+        self.version = 0
+        self._layout_cache = {}
+        self._figure_cache = {}
+
+    def _changed(self):
+        self.version += 1
+        self._layout_cache.clear()
+
+        if self._figure_cache:
+            import matplotlib.pyplot as plt
+
+            for fig in self._figure_cache.values():
+                plt.close(fig)
+            self._figure_cache.clear()
+
     def clear(self):
         """Reset the graph."""
         self.graph.clear()
+        self._changed()
 
     def build_star_graph(self, main_paper_title, citations):
         """
@@ -34,6 +140,7 @@ class CitationGraph:
             )
             self.graph.add_edge(main_paper_title, label)
 
+        self._changed()
         return self.graph
 
     def add_citation(self, citing_paper, cited_paper):
@@ -42,6 +149,7 @@ class CitationGraph:
         citing_paper -> cited_paper
         """
         self.graph.add_edge(citing_paper, cited_paper)
+        self._changed()
 
     def compute_basic_stats(self):
         """
@@ -53,37 +161,156 @@ class CitationGraph:
             "density": nx.density(self.graph),
         }
 
-    def get_matplotlib_figure(self):
+    # ---------- level of detail ----------
+
+    def _reduced_graph(self, max_nodes):
+        """
+        The graph to draw: unchanged if small enough, otherwise the
+        max_nodes - 1 highest-degree nodes plus one node standing for
+        all pruned ones, linked to the kept nodes they were attached to.
+
+        Returns:
+            (nodes, attributes, edges as index pairs, number of pruned nodes)
+        """
+        nodes = list(self.graph.nodes)
+        pruned = 0
+
+        if max_nodes and len(nodes) > max_nodes:
+            degree = dict(self.graph.degree)
+            # Stable: ties keep insertion order (e.g. Ref [1], Ref [2], ...)
+            ranked = sorted(range(len(nodes)), key=lambda i: -degree[nodes[i]])
+            keep = set(nodes[i] for i in ranked[:max_nodes - 1])
+            pruned = len(nodes) - len(keep)
+            nodes = [node for node in nodes if node in keep]
+
+        index = {node: i for i, node in enumerate(nodes)}
+        attributes = [dict(self.graph.nodes[node]) for node in nodes]
+
+        edges = set()
+        summary_links = set()
+
+        for u, v in self.graph.edges:
+            if u in index and v in index:
+                edges.add((index[u], index[v]))
+            elif u in index:
+                summary_links.add(index[u])
+            elif v in index:
+                summary_links.add(index[v])
+
+        if pruned:
+            summary = len(nodes)
+            nodes.append(f"+{pruned} more")
+            attributes.append({"color": "lightgray", "size": min(3000, 400 + 20 * pruned)})
+            edges.update((i, summary) for i in summary_links)
+
+        return nodes, attributes, sorted(edges), pruned
+
+    # ---------- layout ----------
+
+    def layout(self, max_nodes=None):
+        """
+        Positions of the drawn graph, computed once per graph version.
+
+        Returns:
+            (nodes, attributes, edges, pruned, (n, 2) positions)
+        """
+        max_nodes = self.MAX_NODES if max_nodes is None else max_nodes
+        key = (self.version, max_nodes)
+
+        if key not in self._layout_cache:
+            nodes, attributes, edges, pruned = self._reduced_graph(max_nodes)
+            n = len(nodes)
+
+            adjacency = sparse.csr_matrix(
+                (np.ones(len(edges)), ([u for u, _ in edges], [v for _, v in edges])),
+                shape=(n, n)
+            )
+            # Layout treats citations as undirected
+            adjacency = ((adjacency + adjacency.T) > 0).astype("float64")
+
+            if n <= self.FORCE_LIMIT:
+                positions = force_layout(adjacency)
+            else:
+                positions = spectral_positions(adjacency)
+
+            self._layout_cache[key] = (nodes, attributes, edges, pruned, positions)
+
+        return self._layout_cache[key]
+
+    # ---------- rendering ----------
+
+    def to_serializable(self, max_nodes=None):
+        """
+        Lightweight JSON-ready form of the drawn graph, for rendering
+        in the browser instead of as a matplotlib image.
+        """
+        nodes, attributes, edges, pruned, positions = self.layout(max_nodes)
+
+        return {
+            "version": self.version,
+            "nodes": [
+                {
+                    "id": i,
+                    "label": str(node),
+                    "x": float(positions[i, 0]),
+                    "y": float(positions[i, 1]),
+                    "color": attributes[i].get("color", "skyblue"),
+                    "size": attributes[i].get("size", 1000),
+                }
+                for i, node in enumerate(nodes)
+            ],
+            "edges": [[int(u), int(v)] for u, v in edges],
+            "pruned": pruned,
+        }
+
+    def get_matplotlib_figure(self, max_nodes=None):
         """
         Returns a matplotlib figure (for Streamlit rendering).
+        The figure is cached until the graph changes.
         """
         if self.graph.number_of_nodes() == 0:
             return None
 
+        max_nodes = self.MAX_NODES if max_nodes is None else max_nodes
+        key = (self.version, max_nodes)
+        if key in self._figure_cache:
+            return self._figure_cache[key]
+
+        # matplotlib is only imported once a figure is actually drawn
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        nodes, attributes, edges, pruned, positions = self.layout(max_nodes)
+
         fig, ax = plt.subplots(figsize=(9, 7))
-        pos = nx.spring_layout(self.graph, seed=42)
-
-        # Extract node attributes safely
-        colors = [
-            self.graph.nodes[n].get("color", "skyblue")
-            for n in self.graph.nodes
-        ]
-
-        sizes = [
-            self.graph.nodes[n].get("size", 1000)
-            for n in self.graph.nodes
-        ]
-
-        nx.draw(
-            self.graph,
-            pos,
-            ax=ax,
-            with_labels=True,
-            node_color=colors,
-            node_size=sizes,
-            font_size=9,
-            arrows=True
+
+        # One collection for all edges instead of one artist per edge
+        if edges:
+            segments = np.stack([positions[[u for u, _ in edges]], positions[[v for _, v in edges]]], axis=1)
+            ax.add_collection(LineCollection(segments, colors="gray", linewidths=0.8, alpha=0.6, zorder=1))
+
+        # Node sizes are networkx-style areas; shrink them on crowded plots
+        scale = min(1.0, 30 / max(len(nodes), 1)) ** 0.5
+        ax.scatter(
+            positions[:, 0],
+            positions[:, 1],
+            s=[attributes[i].get("size", 1000) * scale for i in range(len(nodes))],
+            c=[attributes[i].get("color", "skyblue") for i in range(len(nodes))],
+            zorder=2
         )
 
-        ax.set_title("Citation Network")
+        for i, node in enumerate(nodes):
+            is_summary = pruned and i == len(nodes) - 1
+            if len(nodes) <= self.MAX_LABELS or attributes[i].get("color") == "red" or is_summary:
+                ax.annotate(str(node), positions[i], fontsize=9, ha="center", va="center", zorder=3)
+
+        ax.set_axis_off()
+        ax.margins(0.1)
+
+        title = "Citation Network"
+        if pruned:
+            title += f" ({pruned} nodes aggregated)"
+        ax.set_title(title)
+
+        self._figure_cache[key] = fig
         return fig
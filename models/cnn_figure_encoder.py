@@ -3,10 +3,33 @@ import torchvision.models as models
 import torchvision.transforms as transforms
 from PIL import Image
 import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 
 class CNNFigureEncoder:
-    def __init__(self, device=None):
+    def __init__(
+        self,
+        device=None,
+        workers=4,
+        num_threads=None,
+        channels_last=True,
+        torchscript=False
+    ):
+        """
+        ResNet18 feature extractor for figures (512-d embeddings).
+
+        Parameters:
+            workers (int): threads decoding and preprocessing images
+                (PIL releases the GIL while decoding)
+            num_threads (int): torch intra-op threads for CPU inference
+                (None = torch default)
+            channels_last (bool): NHWC memory format, faster convolutions
+                on recent CPUs
+            torchscript (bool): trace and freeze the model with TorchScript
+        """
         print("Loading ResNet18 for Visual Analysis...")
 
         # Device handling (CPU / GPU)
@@ -14,6 +37,12 @@ class CNNFigureEncoder:
             "cuda" if torch.cuda.is_available() else "cpu"
         )
 
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.workers = workers
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
         # Load pretrained ResNet18 (new style)
         weights = models.ResNet18_Weights.DEFAULT
         self.model = models.resnet18(weights=weights)
@@ -22,7 +51,14 @@ class CNNFigureEncoder:
         self.model = torch.nn.Sequential(*list(self.model.children())[:-1])
 
         self.model.eval()
-        self.model.to(self.device)
+        self.model.to(self.device, memory_format=self.memory_format)
+
+        if torchscript:
+            example = torch.zeros(1, 3, 224, 224, device=self.device)
+            example = example.to(memory_format=self.memory_format)
+
+            with torch.inference_mode():
+                self.model = torch.jit.freeze(torch.jit.trace(self.model, example))
 
         # Standard ImageNet preprocessing
         self.preprocess = transforms.Compose([
@@ -35,28 +71,96 @@ class CNNFigureEncoder:
             ),
         ])
 
-    def analyze_image_stream(self, image_bytes):
+    def _load(self, image_bytes):
         """
-        Extracts feature embedding from an image.
-        Returns:
-            (success_flag, embedding_vector or error_message)
+        Decode + preprocess one image (runs in the worker threads).
+        Returns (success_flag, tensor or error_message).
         """
         try:
-            # Load image
             input_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            return True, self.preprocess(input_image)
+        except Exception as e:
+            return False, str(e)
+
+    def _infer(self, tensors):
+        batch = torch.stack(tensors).to(self.device, memory_format=self.memory_format)
 
-            # Preprocess
-            input_tensor = self.preprocess(input_image)
-            input_batch = input_tensor.unsqueeze(0).to(self.device)
+        with torch.inference_mode():
+            features = self.model(batch)
 
-            # Inference
-            with torch.no_grad():
-                features = self.model(input_batch)
+        # Flatten (n, 512, 1, 1) → (n, 512)
+        return features.flatten(1).float().cpu().numpy()
 
-            # Flatten (1, 512, 1, 1) → (512,)
-            embedding = features.squeeze().cpu().numpy()
+    def encode_batch(self, images, batch_size=32, normalize=False):
+        """
+        Embed many images. Decoding and preprocessing of the next batches
+        runs in a thread pool while the current batch is on the model.
 
-            return True, embedding
+        Parameters:
+            images (list[bytes]): encoded images
+            batch_size (int): images per forward pass
+            normalize (bool): L2 normalize embeddings (for cosine search)
 
-        except Exception as e:
-            return False, str(e)
+        Returns:
+            list of (success_flag, embedding_vector or error_message),
+            one per image, in order
+        """
+        results = [None] * len(images)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # At most two batches of decoded tensors are held at once
+            remaining = iter(enumerate(images))
+            pending = deque()
+
+            def fill():
+                while len(pending) < 2 * batch_size:
+                    item = next(remaining, None)
+                    if item is None:
+                        return
+                    position, image_bytes = item
+                    pending.append((position, pool.submit(self._load, image_bytes)))
+
+            fill()
+
+            while pending:
+                positions = []
+                tensors = []
+
+                while pending and len(tensors) < batch_size:
+                    position, future = pending.popleft()
+                    success, value = future.result()
+
+                    if success:
+                        positions.append(position)
+                        tensors.append(value)
+                    else:
+                        results[position] = (False, value)
+
+                fill()
+
+                if not tensors:
+                    continue
+
+                try:
+                    embeddings = self._infer(tensors)
+                except Exception as e:
+                    for position in positions:
+                        results[position] = (False, str(e))
+                    continue
+
+                if normalize:
+                    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                    embeddings = embeddings / (norms + 1e-10)
+
+                for position, embedding in zip(positions, embeddings):
+                    results[position] = (True, embedding)
+
+        return results
+
+    def analyze_image_stream(self, image_bytes):
+        """
+        Extracts feature embedding from an image.
+        Returns:
+            (success_flag, embedding_vector or error_message)
+        """
+        return self.encode_batch([image_bytes], batch_size=1)[0]
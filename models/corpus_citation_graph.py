@@ -0,0 +1,539 @@
+import json
+import os
+import re
+import threading
+from array import array
+
+import numpy as np
+
+from models.directory_lock import DirectoryLock
+from models.lazy import lazy_import
+
+sparse = lazy_import("scipy.sparse")
+
+
+REFERENCES_HEADING = re.compile(
+    r"^\s*(?:\d+\.?\s*)?(?:references|bibliography|works cited|literature cited)\s*:?\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+BRACKET_ENTRY = re.compile(r"^\s*\[(\d{1,4})\]\s*", re.MULTILINE)
+NUMBERED_ENTRY = re.compile(r"^\s*(\d{1,4})\.\s+(?=\S)", re.MULTILINE)
+# Author-year styles: a new entry starts a line with "Surname, "
+AUTHOR_ENTRY = re.compile(r"(?<=\.)\n(?=[A-Z][A-Za-z'\-]+,\s)")
+
+DOI_PATTERN = re.compile(r"\b10\.\d{4,9}/[^\s\"<>,;]+", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+QUOTED_TITLE = re.compile(r"[\"“]([^\"“”]{10,300}?)[,.]?[\"”]")
+APA_TITLE = re.compile(r"\((?:19|20)\d{2}[a-z]?\)\.\s*([^.?!]{10,300})")
+# End of a sentence, but not of an author initial like "A."
+SENTENCE_BREAK = re.compile(r"(?:(?<=[a-z]{2})|(?<=\)))\.\s+")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def find_doi(text):
+    """
+    First DOI in text (e.g. on a paper's first page), lowercased, or None.
+    """
+    match = DOI_PATTERN.search(text or "")
+    return match.group(0).rstrip(".").lower() if match else None
+
+
+def normalize_title(title):
+    return NON_ALNUM.sub(" ", title.lower()).strip()[:200]
+
+
+def _guess_title(entry):
+    match = QUOTED_TITLE.search(entry) or APA_TITLE.search(entry)
+    if match:
+        title = match.group(1)
+    else:
+        # "Authors. Title. Venue, year." -> the second sentence
+        parts = [part for part in SENTENCE_BREAK.split(entry) if part.strip()]
+        title = parts[1] if len(parts) > 1 else parts[0] if parts else ""
+
+    title = title.strip(" .,")
+    return title if len(title.split()) >= 3 else None
+
+
+def _split_entries(section):
+    for pattern in (BRACKET_ENTRY, NUMBERED_ENTRY):
+        matches = list(pattern.finditer(section))
+        if len(matches) >= 2:
+            ends = [m.start() for m in matches[1:]] + [len(section)]
+            return [
+                (int(m.group(1)), section[m.end():end])
+                for m, end in zip(matches, ends)
+            ]
+
+    return [(None, entry) for entry in AUTHOR_ENTRY.split(section)]
+
+
+def parse_references(full_text):
+    """
+    Parse the reference list at the end of a paper.
+
+    Returns:
+        list of dicts with "marker" (the [n] number if the list is
+        numbered), "text", "doi", "title" and "year" (None when not found)
+    """
+    headings = list(REFERENCES_HEADING.finditer(full_text or ""))
+    if not headings:
+        return []
+
+    references = []
+
+    for marker, entry in _split_entries(full_text[headings[-1].end():]):
+        entry = " ".join(entry.split())
+        if len(entry) < 20:
+            continue
+
+        year = YEAR_PATTERN.search(entry)
+        references.append({
+            "marker": marker,
+            "text": entry,
+            "doi": find_doi(entry),
+            "title": _guess_title(entry),
+            "year": int(year.group(0)) if year else None,
+        })
+
+    return references
+
+
+def reference_keys(reference):
+    """
+    Identity keys of a cited work, strongest first.
+    """
+    keys = []
+    if reference.get("doi"):
+        keys.append("doi:" + reference["doi"].lower())
+    if reference.get("title"):
+        keys.append("title:" + normalize_title(reference["title"]))
+    return keys
+
+
+class CorpusCitationGraph:
+    """
+    Citation graph over every ingested paper and the works they cite.
+
+    Cited works are resolved to stable node ids by DOI or, failing
+    that, by normalized title, so two papers citing the same work share
+    a node and an ingested paper takes over the node of a work others
+    already cite. Edges (citing -> cited) are kept as two int32 arrays;
+    analytics run on a scipy CSR adjacency matrix built from them:
+
+    - PageRank by power iteration, warm-started from the last result
+    - co-citation (A^T A) and bibliographic coupling (A A^T), computed
+      for one paper at a time with sparse matrix-vector products
+    - weakly connected components, maintained incrementally with a
+      union-find as edges are added
+
+    On disk (inside `directory`):
+        nodes.json      node labels, flags and the key -> node id map
+        edges.bin       int32 (citing, cited) pairs, append-only
+    """
+
+    def __init__(self, directory="data/citation_graph", lock=False):
+        """
+        Parameters:
+            lock (bool): hold a DirectoryLock on directory while open, so
+                no other process writes the graph at the same time
+        """
+        self.directory = directory
+        # edges.bin is appended at an offset kept in memory
+        self._dir_lock = DirectoryLock(directory).acquire() if lock and directory else None
+
+        self.labels = []
+        self.ingested = []
+        self._keys = {}
+
+        self._src = array("i")
+        self._dst = array("i")
+        self._persisted_edges = 0
+
+        self._parent = array("i")
+        self._num_components = 0
+
+        self._matrices = None
+        self._pagerank = None
+
+        # Papers are added by ingestion jobs while sessions read. The
+        # analytics read the edge arrays through numpy views, and an
+        # array('i') cannot grow while a view exists, so mutations and
+        # reads hold the lock
+        self._lock = threading.RLock()
+
+        if directory and os.path.exists(os.path.join(directory, "nodes.json")):
+            self.load()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def num_edges(self):
+        return len(self._src)
+
+    # ---------- building ----------
+
+    def _add_node(self, label, ingested=False):
+        node = len(self.labels)
+        self.labels.append(label)
+        self.ingested.append(ingested)
+        self._parent.append(node)
+        self._num_components += 1
+        return node
+
+    def _resolve(self, keys, label):
+        """
+        Node id for a work with these keys, created if none matches.
+        """
+        node = next((self._keys[key] for key in keys if key in self._keys), None)
+        if node is None:
+            node = self._add_node(label)
+
+        for key in keys:
+            self._keys.setdefault(key, node)
+
+        return node
+
+    def add_paper(self, source, references, doi=None, title=None):
+        """
+        Add an ingested paper and its citations. Adding the same source
+        again is a no-op; call remove_paper() first to replace it.
+
+        Parameters:
+            source (str): paper name as stored in the VectorEngine
+            references (list[dict]): output of parse_references()
+            doi / title (str): the paper's own identifiers, used to match
+                citations of it from other papers
+
+        Returns:
+            the paper's node id
+        """
+        with self._lock:
+            node = self._keys.get("source:" + source)
+            if node is not None and self.ingested[node]:
+                return node
+
+            own = {"doi": doi, "title": title}
+            keys = ["source:" + source] + reference_keys(own)
+            node = self._resolve(keys, source)
+
+            self.labels[node] = source
+            self.ingested[node] = True
+
+            cited = set()
+            for reference in references:
+                keys = reference_keys(reference)
+                if not keys:
+                    continue
+
+                label = reference["title"] or reference["text"][:80]
+                target = self._resolve(keys, label)
+
+                if target != node:
+                    cited.add(target)
+
+            for target in sorted(cited):
+                self._src.append(node)
+                self._dst.append(target)
+                self._union(node, target)
+
+            self._matrices = None
+            return node
+
+    def remove_paper(self, source):
+        """
+        Remove an ingested paper's citations, e.g. before it is indexed
+        again. Its node stays, as a cited work, so citations of it from
+        other papers are kept.
+
+        Returns:
+            True if the paper was in the graph
+        """
+        with self._lock:
+            node = self._keys.get("source:" + source)
+            if node is None or not self.ingested[node]:
+                return False
+
+            self.ingested[node] = False
+
+            src = np.frombuffer(self._src, dtype="int32")
+            keep = src != node
+            if not keep.all():
+                dst = np.frombuffer(self._dst, dtype="int32")
+                self._src = array("i", src[keep].tobytes())
+                self._dst = array("i", dst[keep].tobytes())
+                # edges.bin is no longer a prefix; save() rewrites it
+                self._persisted_edges = 0
+                self._matrices = None
+                # Union-find can't split components; recompute them
+                self._rebuild_components()
+
+            return True
+
+    def node(self, paper):
+        """
+        Node id of a paper given its source name, a "doi:..." /
+        "title:..." key or the id itself. None if unknown.
+        """
+        if isinstance(paper, (int, np.integer)):
+            return int(paper) if 0 <= paper < len(self.labels) else None
+
+        return self._keys.get("source:" + paper, self._keys.get(paper))
+
+    # ---------- connected components ----------
+
+    def _find(self, node):
+        parent = self._parent
+        while parent[node] != node:
+            # Path halving
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            self._parent[max(a, b)] = min(a, b)
+            self._num_components -= 1
+
+    def num_components(self):
+        return self._num_components
+
+    def component_labels(self):
+        """
+        Component id of every node (the smallest node id in it).
+        """
+        with self._lock:
+            # Pointer jumping over the whole parent array at once
+            roots = np.frombuffer(self._parent, dtype="int32").astype("int64")
+            while True:
+                jumped = roots[roots]
+                if np.array_equal(jumped, roots):
+                    return roots
+                roots = jumped
+
+    def component_sizes(self):
+        """
+        Sizes of the weakly connected components, largest first.
+        """
+        if not self.labels:
+            return []
+
+        sizes = np.bincount(self.component_labels())
+        return sorted(sizes[sizes > 0].tolist(), reverse=True)
+
+    # ---------- sparse analytics ----------
+
+    def adjacency(self):
+        """
+        (n, n) CSR matrix with A[i, j] = 1 when node i cites node j.
+        """
+        with self._lock:
+            return self._csr()[0]
+
+    def _csr(self):
+        if self._matrices is None:
+            n = len(self.labels)
+            src = np.frombuffer(self._src, dtype="int32")
+            dst = np.frombuffer(self._dst, dtype="int32")
+
+            a = sparse.csr_matrix(
+                (np.ones(len(src), dtype="float32"), (src, dst)),
+                shape=(n, n)
+            )
+            # Duplicate edges are summed by scipy; count each citation once
+            a.data[:] = 1.0
+
+            self._matrices = (a, a.T.tocsr())
+
+        return self._matrices
+
+    def pagerank(self, damping=0.85, tol=1e-6, max_iter=100):
+        """
+        PageRank of every node, as an array indexed by node id. Starts
+        from the previous result, so after a few new papers it converges
+        in a handful of iterations.
+        """
+        with self._lock:
+            n = len(self.labels)
+            if n == 0:
+                return np.zeros(0)
+
+            a, a_t = self._csr()
+            out_degree = np.asarray(a.sum(axis=1)).ravel()
+            dangling = out_degree == 0
+            inverse_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+
+            x = np.full(n, 1.0 / n)
+            if self._pagerank is not None:
+                # Warm start: old scores plus uniform mass for new nodes
+                x[:len(self._pagerank)] = self._pagerank
+                x /= x.sum()
+
+            for _ in range(max_iter):
+                spread = a_t @ (x * inverse_degree)
+                x_new = damping * spread + (damping * x[dangling].sum() + 1 - damping) / n
+
+                if np.abs(x_new - x).sum() < tol:
+                    x = x_new
+                    break
+                x = x_new
+
+            self._pagerank = x
+            return x
+
+    def _top(self, scores, k, exclude=None):
+        if exclude is not None:
+            scores[exclude] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                "id": int(node),
+                "label": self.labels[node],
+                "score": float(scores[node]),
+                "ingested": self.ingested[node]
+            }
+            for node in order
+        ]
+
+    def top_papers(self, k=10, ingested_only=False):
+        """
+        Most central works by PageRank.
+        """
+        with self._lock:
+            scores = self.pagerank().copy()
+            if ingested_only:
+                scores[~np.array(self.ingested, dtype=bool)] = 0
+            return self._top(scores, k)
+
+    def co_citation(self, paper, k=10):
+        """
+        Works most often cited together with `paper`: row of A^T A.
+        """
+        with self._lock:
+            node = self.node(paper)
+            if node is None:
+                return []
+
+            a, a_t = self._csr()
+            citers = a_t[node].toarray().ravel()
+            return self._top(a_t @ citers, k, exclude=node)
+
+    def bibliographic_coupling(self, paper, k=10):
+        """
+        Papers sharing the most references with `paper`: row of A A^T.
+        """
+        with self._lock:
+            node = self.node(paper)
+            if node is None:
+                return []
+
+            a, a_t = self._csr()
+            references = a[node].toarray().ravel()
+            return self._top(a @ references, k, exclude=node)
+
+    def stats(self):
+        with self._lock:
+            sizes = self.component_sizes()
+            return {
+                "num_nodes": len(self.labels),
+                "num_papers": sum(self.ingested),
+                "num_edges": self.num_edges(),
+                "num_components": self._num_components,
+                "largest_component": sizes[0] if sizes else 0,
+            }
+
+    # ---------- persistence ----------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def save(self):
+        """
+        Append new edges and rewrite the node table.
+        """
+        with self._lock:
+            if not self.directory:
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+
+            edges = np.empty((self.num_edges() - self._persisted_edges, 2), dtype="int32")
+            edges[:, 0] = self._src[self._persisted_edges:]
+            edges[:, 1] = self._dst[self._persisted_edges:]
+
+            # Edges first: nodes.json records how many of them are committed
+            mode = "r+b" if os.path.exists(self._path("edges.bin")) else "wb"
+            with open(self._path("edges.bin"), mode) as f:
+                f.seek(self._persisted_edges * 8)
+                f.write(edges.tobytes())
+                f.truncate()
+
+            tmp_path = self._path("nodes.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "labels": self.labels,
+                    "ingested": self.ingested,
+                    "keys": self._keys,
+                    "num_edges": self.num_edges(),
+                }, f)
+            os.replace(tmp_path, self._path("nodes.json"))
+
+            self._persisted_edges = self.num_edges()
+
+    def reset(self):
+        """
+        Remove every node and edge, also from disk.
+        """
+        with self._lock:
+            self.labels = []
+            self.ingested = []
+            self._keys = {}
+            self._src = array("i")
+            self._dst = array("i")
+            self._persisted_edges = 0
+            self._parent = array("i")
+            self._num_components = 0
+            self._matrices = None
+            self._pagerank = None
+
+            if self.directory:
+                for name in ("nodes.json", "edges.bin"):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
+
+    def load(self):
+        with self._lock:
+            with open(self._path("nodes.json")) as f:
+                data = json.load(f)
+
+            self.labels = data["labels"]
+            self.ingested = data["ingested"]
+            self._keys = data["keys"]
+
+            edges = np.fromfile(self._path("edges.bin"), dtype="int32", count=2 * data["num_edges"])
+            edges = edges.reshape(-1, 2)
+            self._src = array("i", edges[:, 0].tobytes())
+            self._dst = array("i", edges[:, 1].tobytes())
+            self._persisted_edges = len(edges)
+
+            self._matrices = None
+            self._pagerank = None
+
+            self._rebuild_components()
+
+    def _rebuild_components(self):
+        from scipy.sparse.csgraph import connected_components
+
+        # Seed the union-find from one vectorized pass over the edges
+        self._num_components, components = connected_components(
+            self.adjacency(), directed=True, connection="weak"
+        )
+        _, first = np.unique(components, return_index=True)
+        self._parent = array("i", first[components].astype("int32").tobytes())
@@ -0,0 +1,181 @@
+import hashlib
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+
+WORD = re.compile(r"\w+")
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+# MinHash signature: BANDS bands of ROWS hash values each. Every band is
+# stored as one 64-bit key, so a chunk costs BANDS * 8 bytes.
+BANDS = 16
+ROWS = 4
+
+_rng = np.random.default_rng(0x5C11)
+_SEEDS = _rng.integers(0, 2**63, BANDS * ROWS, dtype="int64").astype("uint64")
+_ROW_MULTIPLIERS = _rng.integers(1, 2**63, ROWS, dtype="int64").astype("uint64") | np.uint64(1)
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 2**63, SHINGLE_SIZE, dtype="int64").astype("uint64") | np.uint64(1)
+
+
+def file_hash(source, block_size=1 << 20):
+    """
+    sha256 hex digest of a file's content.
+
+    Parameters:
+        source: bytes, a path, or a binary file object
+    """
+    digest = hashlib.sha256()
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return file_hash(f, block_size)
+
+    for block in iter(lambda: source.read(block_size), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _mix(values):
+    # splitmix64 finalizer: spreads the bits of each uint64
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _shingles(text):
+    words = WORD.findall(text.lower())
+    if not words:
+        return None
+
+    word_hashes = np.array([zlib.crc32(word.encode("utf-8")) for word in words], dtype="uint64")
+    size = min(SHINGLE_SIZE, len(word_hashes))
+    count = len(word_hashes) - size + 1
+
+    shingles = np.zeros(count, dtype="uint64")
+    for offset in range(size):
+        shingles += word_hashes[offset:offset + count] * _SHINGLE_MULTIPLIERS[offset]
+
+    return np.unique(shingles)
+
+
+def minhash_bands(text):
+    """
+    MinHash signature of the word 3-shingles of a text, folded into
+    BANDS 64-bit band keys. Two texts share a band with probability
+    J ** ROWS, where J is the Jaccard similarity of their shingle sets.
+    All zeros for texts without words.
+    """
+    shingles = _shingles(text)
+    if shingles is None:
+        return np.zeros(BANDS, dtype="uint64")
+
+    # One hash function per seed; the minimum over the shingles of each
+    hashed = _mix(shingles[:, None] ^ _SEEDS[None, :])
+    minimums = hashed.min(axis=0).reshape(BANDS, ROWS)
+
+    bands = _mix((minimums * _ROW_MULTIPLIERS).sum(axis=1))
+    # 0 marks "no signature"
+    bands[bands == 0] = 1
+
+    return bands
+
+
+def minhash_signatures(texts):
+    """
+    (len(texts), BANDS) uint64 band keys, see minhash_bands().
+    """
+    signatures = np.zeros((len(texts), BANDS), dtype="uint64")
+    for row, text in enumerate(texts):
+        signatures[row] = minhash_bands(text)
+    return signatures
+
+
+class NearDuplicateIndex:
+    """
+    LSH index over MinHash band keys.
+
+    A stored text is a near duplicate of a query when at least
+    min_matches of their BANDS band keys are equal. With 16 bands of 4
+    rows and min_matches=4 that catches texts with a shingle Jaccard
+    similarity of 0.9 almost always, of 0.8 about 9 times in 10, and
+    rarely anything below 0.6.
+    """
+
+    def __init__(self, min_matches=4):
+        self.min_matches = min_matches
+
+        self._signatures = {}
+        self._bands = [{} for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, ids, signatures):
+        for idx, signature in zip(ids, signatures):
+            # All zeros = no signature (no words, or stored without one)
+            if not signature.any():
+                continue
+
+            idx = int(idx)
+            keys = signature.tolist()
+            self._signatures[idx] = keys
+
+            for table, key in zip(self._bands, keys):
+                table.setdefault(key, []).append(idx)
+
+    def remove(self, ids):
+        for idx in ids:
+            keys = self._signatures.pop(int(idx), None)
+            if keys is None:
+                continue
+
+            for table, key in zip(self._bands, keys):
+                bucket = table[key]
+                bucket.remove(int(idx))
+                if not bucket:
+                    del table[key]
+
+    def find(self, signature):
+        """
+        Id of a stored near duplicate, or None.
+        """
+        if not signature.any():
+            return None
+
+        matches = Counter()
+        for table, key in zip(self._bands, signature.tolist()):
+            matches.update(table.get(key, ()))
+
+        if matches:
+            idx, count = matches.most_common(1)[0]
+            if count >= self.min_matches:
+                return idx
+
+        return None
+
+    def unique(self, signatures):
+        """
+        Boolean mask of the signatures that are neither near a stored one
+        nor near an earlier signature of the same batch.
+        """
+        batch = NearDuplicateIndex(self.min_matches)
+        keep = np.ones(len(signatures), dtype=bool)
+
+        for position, signature in enumerate(signatures):
+            if self.find(signature) is not None or batch.find(signature) is not None:
+                keep[position] = False
+            else:
+                batch.add([position], [signature])
+
+        return keep
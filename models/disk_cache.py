@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    Persistent key -> bytes cache backed by SQLite, with an in-memory
+    LRU in front of it.
+
+    Both layers have a size cap. The memory layer evicts the least
+    recently used entry, the disk layer evicts the entries with the
+    oldest access time once max_entries is exceeded.
+    """
+
+    def __init__(self, path, max_entries=200_000, memory_entries=10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+        )
+        self._conn.commit()
+
+        # Upper bound on the number of rows; only recounted when it
+        # crosses max_entries so puts don't scan the table every time.
+        self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once.
+        Returns:
+            dict of key -> bytes for the keys that were found
+        """
+        found = {}
+        disk_keys = []
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    disk_keys.append(key)
+
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(disk_keys), 500):
+                batch = disk_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+
+                for key, value in rows:
+                    found[key] = value
+                    self._remember(key, value)
+
+                if rows:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE cache SET accessed = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+
+            if disk_keys:
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items):
+        """
+        Store several (key, bytes) pairs and evict old entries if the
+        disk layer grew past max_entries.
+        """
+        items = list(items)
+        if not items:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items]
+            )
+
+            self._count += len(items)
+            if self._count > self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE key IN ("
+                        "SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+                    count = self.max_entries
+                self._count = count
+
+            self._conn.commit()
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,164 @@
+from itertools import islice
+
+import numpy as np
+
+from models.chunker import length_batches
+
+
+def _normalized(vector):
+    return vector / (np.linalg.norm(vector) + 1e-10)
+
+
+def chunk_metadata(chunk, year=None):
+    """
+    The filterable metadata of a chunk dict (see VectorEngine.filter_mask).
+    """
+    return {
+        "page_start": chunk.get("page_start"),
+        "page_end": chunk.get("page_end"),
+        "section": chunk.get("section") or None,
+        "year": year,
+    }
+
+
+def index_document(
+    encoder,
+    index,
+    chunks,
+    source,
+    batch_size=64,
+    window=4,
+    sections=True,
+    progress=None,
+    cancel_event=None,
+    year=None
+):
+    """
+    Encode and index one document of any length in bounded memory.
+
+    Chunks are read `window` batches at a time, encoded in batches of
+    similar length and written straight into the index, so only one
+    window of chunks and vectors is held at once. On cancellation or
+    an error the source is removed from the index again.
+
+    Parameters:
+        encoder: TextEncoder
+        index: anything with add_documents / remove_document (and
+            add_sections when sections=True), e.g. a VectorEngine or a
+            Collection of the index service
+        chunks: iterable of chunk dicts (from TokenChunker or
+            PaperCompressor.stream_chunks) or plain strings
+        sections (bool): also add one summary vector per section (the
+            normalized mean of its chunk vectors) for hierarchical_search
+        progress (callable): called as progress(done, total); total is
+            None when chunks is a generator
+        cancel_event (threading.Event): stops the indexing when set
+        year (int): publication year, stored with every chunk for
+            metadata filters
+
+    Returns:
+        {"chunks": int, "sections": int, "cancelled": bool,
+         "embedding": normalized mean of all chunk vectors (or None)}
+    """
+    total = len(chunks) if hasattr(chunks, "__len__") else None
+    chunks = iter(chunks)
+
+    done = 0
+    total_sum = None
+
+    # Running sum of the current section, which is written once it ends
+    section_title = None
+    section_sum = None
+    section_ids = []
+    section_vectors, section_titles, section_members = [], [], []
+
+    def close_section():
+        if section_ids and section_title:
+            members = np.concatenate(section_ids)
+            if len(members):
+                section_vectors.append(_normalized(section_sum))
+                section_titles.append(section_title)
+                section_members.append(members)
+
+    if progress:
+        progress(0, total)
+
+    cancelled = False
+
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+
+            block = [
+                chunk if isinstance(chunk, dict) else {"text": chunk, "tokens": len(chunk)}
+                for chunk in islice(chunks, batch_size * window)
+            ]
+            if not block:
+                break
+
+            vectors = np.empty((len(block), 0), dtype="float32")
+            for positions in length_batches(block, batch_size):
+                encoded = encoder.encode([block[i]["text"] for i in positions])
+                if vectors.shape[1] == 0:
+                    vectors = np.empty((len(block), encoded.shape[1]), dtype="float32")
+                vectors[positions] = encoded
+
+            # Written in document order, so chunk ids follow the text
+            ids = index.add_documents(
+                vectors,
+                [chunk["text"] for chunk in block],
+                source,
+                [chunk_metadata(chunk, year) for chunk in block]
+            )
+            ids = np.asarray(ids, dtype="int64")
+
+            block_sum = vectors.sum(axis=0)
+            total_sum = block_sum if total_sum is None else total_sum + block_sum
+
+            if sections:
+                start = 0
+                for end in range(1, len(block) + 1):
+                    # Split the block into runs of one section
+                    if end < len(block) and block[end].get("section") == block[start].get("section"):
+                        continue
+
+                    title = block[start].get("section")
+                    run_sum = vectors[start:end].sum(axis=0)
+
+                    if title != section_title or section_sum is None:
+                        close_section()
+                        section_title, section_sum, section_ids = title, run_sum, []
+                    else:
+                        section_sum = section_sum + run_sum
+
+                    # Skipped near-duplicate chunks have id -1
+                    run_ids = ids[start:end]
+                    section_ids.append(run_ids[run_ids >= 0])
+                    start = end
+
+            done += len(block)
+            if progress:
+                progress(done, total)
+
+        if sections and not cancelled:
+            close_section()
+            if section_vectors:
+                index.add_sections(np.vstack(section_vectors), section_titles, source, section_members)
+
+    except BaseException:
+        # Leave no half-indexed document behind
+        index.remove_document(source)
+        raise
+
+    if cancelled:
+        index.remove_document(source)
+        return {"chunks": 0, "sections": 0, "cancelled": True, "embedding": None}
+
+    return {
+        "chunks": done,
+        "sections": len(section_vectors),
+        "cancelled": False,
+        "embedding": _normalized(total_sum) if done else None,
+    }
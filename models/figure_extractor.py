@@ -0,0 +1,125 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from models.page_pool import map_page_ranges, open_pdf, pdf_source
+
+
+def _image_size(data):
+    """
+    (width, height) from the image header, without decoding pixels.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return 0, 0
+
+
+def _extract_page_images(pdf_source, start, end, min_width, min_height):
+    """
+    Worker for parallel extraction: returns the embedded images of pages
+    [start, end) that are at least min_width x min_height.
+    Kept at module level so it can be pickled.
+    """
+    reader = open_pdf(pdf_source)
+    figures = []
+
+    for i in range(start, end):
+        try:
+            images = reader.pages[i].images
+        except Exception:
+            # Unsupported image filters shouldn't cost the whole paper
+            continue
+
+        for image in images:
+            width, height = _image_size(image.data)
+
+            # Skips logos, icons and decorations
+            if width < min_width or height < min_height:
+                continue
+
+            figures.append({
+                "page": i + 1,
+                "name": image.name,
+                "width": width,
+                "height": height,
+                "data": image.data,
+            })
+
+    return figures
+
+
+class FigureExtractor:
+    def __init__(self, workers=None, pages_per_task=8, min_width=100, min_height=100):
+        """
+        Pulls embedded images (figures) out of PDFs.
+
+        Parameters:
+            workers (int): > 1 extracts page ranges in a process pool
+            pages_per_task (int): pages per pool task
+            min_width / min_height (int): smaller images are skipped
+        """
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.min_width = min_width
+        self.min_height = min_height
+
+    def iter_figures(self, pdf_file):
+        """
+        Yields one dict per figure, in page order:
+        {"page", "name", "width", "height", "data" (encoded image bytes)}
+        """
+        sizes = (self.min_width, self.min_height)
+
+        if not self.workers or self.workers <= 1:
+            source = pdf_source(pdf_file)
+            num_pages = len(open_pdf(source).pages)
+            yield from _extract_page_images(source, 0, num_pages, *sizes)
+            return
+
+        pages = map_page_ranges(
+            _extract_page_images, pdf_file, self.workers, self.pages_per_task, *sizes
+        )
+        for _, figures in pages:
+            yield from figures
+
+    def extract_figures(self, pdf_file):
+        try:
+            return list(self.iter_figures(pdf_file))
+        except Exception as e:
+            return {"error": f"Figure extraction failed: {str(e)}"}
+
+
+def index_figures(pdf_file, source, figure_encoder, figure_index, extractor=None, batch_size=32):
+    """
+    Extract the figures of one paper, embed them and add them to a
+    figure index (a VectorEngine with dimension=512).
+
+    Returns:
+        number of figures indexed
+    """
+    extractor = extractor or FigureExtractor()
+    figures = list(extractor.iter_figures(pdf_file))
+    if not figures:
+        return 0
+
+    results = figure_encoder.encode_batch(
+        [figure["data"] for figure in figures],
+        batch_size=batch_size,
+        normalize=True
+    )
+
+    vectors = []
+    labels = []
+    for figure, (success, embedding) in zip(figures, results):
+        if success:
+            vectors.append(embedding)
+            # The stored "text" of a figure says where to find it
+            labels.append(f"Figure on page {figure['page']} ({figure['name']})")
+
+    if vectors:
+        figure_index.add_documents(np.vstack(vectors), labels, source)
+
+    return len(vectors)
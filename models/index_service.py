@@ -0,0 +1,622 @@
+"""
+Shared vector index service with per-user / per-collection namespaces.
+
+One IndexService holds the indexes of every namespace in a process, so
+many Streamlit sessions (or other clients) share one copy of each index.
+It is used in-process, or served to other processes over a local RPC:
+
+    python -m models.index_service --port 6001
+
+and connected to with connect("127.0.0.1:6001"). open_service() picks
+one or the other from $SCILIT_INDEX_SERVICE.
+
+The RPC is pickle-based, so a client can run code in the server: it
+only accepts clients with the secret key from $SCILIT_INDEX_AUTHKEY.
+Without one, serve() generates a random key and writes it to a file
+only the current user can read (AUTHKEY_FILE), where connect() on the
+same machine finds it.
+"""
+
+import argparse
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+
+from models.directory_lock import DirectoryLock
+from models.vector_engine import VectorEngine
+
+
+DEFAULT_PORT = 6001
+DEFAULT_ROOT = "data/indexes"
+
+# Generated RPC key when $SCILIT_INDEX_AUTHKEY is not set
+AUTHKEY_FILE = "data/index_service.key"
+
+# Namespaces are "user/collection"; each part becomes a directory name
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Owner of the collections shared by the app and the command-line tools
+DEFAULT_USER = "shared"
+
+# Where the single index lived before namespaces
+LEGACY_INDEX_DIR = "data/faiss_index"
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Writers are preferred: once a writer
+    waits, new readers queue behind it, so a stream of searches cannot
+    starve an upload.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class Namespace:
+    """
+    One collection's VectorEngine and the locks guarding it: lock
+    between threads, dir_lock (held while open) against other processes.
+    """
+
+    def __init__(self, name, engine, dir_lock=None):
+        self.name = name
+        self.engine = engine
+        self.lock = ReadWriteLock()
+        self.dir_lock = dir_lock
+        # Live chunks, refreshed after every write, so size() is free
+        self.size = engine.num_chunks()
+        self.last_used = time.monotonic()
+        # Set once evicted; callers holding a stale reference look it up again
+        self.closed = False
+
+
+def namespace_name(user, collection="default"):
+    """
+    Returns the namespace "user/collection", or raises ValueError if
+    either part is not a valid name (letters, digits, "_", "-", ".").
+    """
+    for part in (user, collection):
+        if not NAME_PATTERN.match(part) or part in (".", ".."):
+            raise ValueError(f"Invalid namespace part {part!r}")
+
+    return f"{user}/{collection}"
+
+
+def index_directory(name, root=DEFAULT_ROOT):
+    """
+    Directory of a namespace's VectorEngine (or, with another root, of
+    its recommender or citation graph) under root.
+    """
+    user, collection = name.split("/")
+    namespace_name(user, collection)
+    return os.path.join(root, user, collection)
+
+
+def adopt_legacy_index(root=DEFAULT_ROOT, legacy_dir=LEGACY_INDEX_DIR):
+    """
+    Move an index saved before namespaces existed into the default
+    collection, unless that collection already exists.
+    """
+    target = index_directory(namespace_name(DEFAULT_USER), root)
+
+    if os.path.isdir(legacy_dir) and not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(legacy_dir, target)
+
+
+class IndexService:
+    """
+    Vector indexes of many namespaces behind one thread-safe API.
+
+    Searches in a namespace run concurrently with each other; writes
+    (add, remove, reset) are exclusive and become visible to searches
+    all at once, when the write and its save have finished. Namespaces
+    are opened on first use and the least recently used ones are saved
+    and closed when more than max_open are open.
+
+    On disk: root/<user>/<collection>/ holds one VectorEngine index.
+    An open namespace holds a DirectoryLock on it, so another process
+    (e.g. ingest.py run without the service) cannot write it meanwhile;
+    opening a namespace locked elsewhere raises DirectoryLockedError.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, dimension=768, max_open=64, dedupe=True, **engine_options):
+        """
+        Parameters:
+            root (str): directory holding the namespaces (None = memory only)
+            dimension (int): embedding dimension of every namespace
+            max_open (int): namespaces kept in memory at once
+            dedupe (bool): skip near-duplicate chunks (see VectorEngine)
+            engine_options: passed to VectorEngine (index_type, storage, ...)
+        """
+        self.root = root
+        self.dimension = dimension
+        self.max_open = max_open
+        self.engine_options = {"dedupe": dedupe, **engine_options}
+
+        # Replaced, never mutated, so lookups need no lock
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, name):
+        if not self.root:
+            return None
+        return index_directory(name, self.root)
+
+    def _namespace(self, name):
+        namespace = self._open.get(name)
+        if namespace is not None:
+            namespace.last_used = time.monotonic()
+            return namespace
+
+        user, collection = name.split("/")
+        namespace_name(user, collection)
+
+        with self._lock:
+            namespace = self._open.get(name)
+            if namespace is not None:
+                return namespace
+
+            directory = self._directory(name)
+            dir_lock = DirectoryLock(directory).acquire() if directory else None
+
+            try:
+                engine = VectorEngine(
+                    dimension=self.dimension,
+                    index_dir=directory,
+                    **self.engine_options
+                )
+            except BaseException:
+                if dir_lock is not None:
+                    dir_lock.release()
+                raise
+
+            namespace = Namespace(name, engine, dir_lock)
+
+            opened = dict(self._open)
+            opened[name] = namespace
+            evicted = []
+            while len(opened) > self.max_open:
+                oldest = min(opened.values(), key=lambda item: item.last_used)
+                evicted.append(opened.pop(oldest.name))
+
+            self._open = opened
+
+        for old in evicted:
+            self._close(old)
+
+        return namespace
+
+    def _close(self, namespace):
+        with namespace.lock.write():
+            namespace.closed = True
+            namespace.engine.save_index()
+            namespace.engine.wait_for_compaction()
+            if namespace.dir_lock is not None:
+                namespace.dir_lock.release()
+
+    @contextmanager
+    def _reading(self, name):
+        while True:
+            namespace = self._namespace(name)
+            with namespace.lock.read():
+                if not namespace.closed:
+                    yield namespace.engine
+                    return
+
+    @contextmanager
+    def _writing(self, name):
+        while True:
+            namespace = self._namespace(name)
+            with namespace.lock.write():
+                if not namespace.closed:
+                    try:
+                        yield namespace.engine
+                    finally:
+                        namespace.size = namespace.engine.num_chunks()
+                    namespace.engine.save_index()
+                    return
+
+    # ---------- writes ----------
+
+    def add_documents(self, name, vectors, texts, source, metadata=None):
+        """
+        Add one document's chunks (and their metadata, see
+        VectorEngine.add_documents) to a namespace.
+        Returns the ids assigned to the new chunks (-1 for skipped
+        near duplicates).
+        """
+        with self._writing(name) as engine:
+            return engine.add_documents(vectors, texts, source, metadata)
+
+    def remove_document(self, name, source):
+        with self._writing(name) as engine:
+            return engine.remove_document(source)
+
+    def add_sections(self, name, vectors, titles, source, members):
+        """
+        Add section summary vectors (see VectorEngine.add_sections).
+        """
+        with self._writing(name) as engine:
+            return engine.add_sections(vectors, titles, source, members)
+
+    def register_file(self, name, digest, source):
+        """
+        Record a file's content hash once it is indexed (see
+        VectorEngine.register_file).
+        """
+        with self._writing(name) as engine:
+            engine.register_file(digest, source)
+
+    def reset(self, name):
+        """
+        Remove every chunk of a namespace.
+        """
+        with self._writing(name) as engine:
+            engine.reset()
+
+    def migrate(self, name, index_type, **options):
+        """
+        Rebuild a namespace's index as another index type (see
+        VectorEngine.migrate). Searches wait until it is done.
+        """
+        with self._writing(name) as engine:
+            engine.migrate(index_type, **options)
+
+    def save(self, name):
+        """
+        Save a namespace now (writes are saved anyway when they finish).
+        """
+        with self._writing(name):
+            pass
+
+    def drop(self, name):
+        """
+        Close a namespace and delete it from disk.
+        """
+        namespace = self._namespace(name)
+
+        with self._lock:
+            opened = dict(self._open)
+            opened.pop(name, None)
+            self._open = opened
+
+        with namespace.lock.write():
+            namespace.closed = True
+            namespace.engine.wait_for_compaction()
+            directory = self._directory(name)
+            if directory and os.path.isdir(directory):
+                shutil.rmtree(directory)
+            if namespace.dir_lock is not None:
+                namespace.dir_lock.release()
+
+    # ---------- reads ----------
+
+    def search(self, name, query_vector, k=3, **options):
+        with self._reading(name) as engine:
+            return engine.search(query_vector, k, **options)
+
+    def search_batch(self, name, queries, k=3, **options):
+        with self._reading(name) as engine:
+            return engine.search_batch(queries, k, **options)
+
+    def hybrid_search(self, name, query_vector, query_text, k=3, **options):
+        with self._reading(name) as engine:
+            return engine.hybrid_search(query_vector, query_text, k, **options)
+
+    def hierarchical_search(self, name, query_vector, k=3, sections=5, filter=None):
+        with self._reading(name) as engine:
+            return engine.hierarchical_search(query_vector, k, sections, filter)
+
+    def reconstruct_all(self, name):
+        with self._reading(name) as engine:
+            return engine.reconstruct_all()
+
+    def indexed_file(self, name, digest):
+        """
+        Source a file with this content hash was indexed as, or None.
+        """
+        with self._reading(name) as engine:
+            return engine.indexed_file(digest)
+
+    def paper_embedding(self, name, source, normalize=True):
+        """
+        Mean chunk vector of one source (see VectorEngine.get_paper_embedding).
+        """
+        with self._reading(name) as engine:
+            return engine.get_paper_embedding(source, normalize)
+
+    def sources(self, name):
+        """
+        Sorted names of the documents in a namespace (for filters).
+        """
+        with self._reading(name) as engine:
+            return engine.sources()
+
+    def version(self, name):
+        """
+        Content version of a namespace; changes on every write.
+        """
+        return self._namespace(name).engine.version
+
+    def size(self, name):
+        """
+        Number of live chunks in a namespace (kept up to date by the
+        writes, so it takes no lock and lists nothing).
+        """
+        return self._namespace(name).size
+
+    def describe(self, name):
+        """
+        Index type, storage and size of a namespace, e.g. for tools.
+        """
+        with self._reading(name) as engine:
+            return {
+                "index_type": engine.index_type,
+                "storage": engine.storage,
+                "factory": engine._factory_string(),
+                "vectors": engine.index.ntotal,
+            }
+
+    def namespaces(self):
+        """
+        Names of all namespaces, open or on disk.
+        """
+        names = set(self._open)
+
+        if self.root and os.path.isdir(self.root):
+            for user in os.listdir(self.root):
+                user_dir = os.path.join(self.root, user)
+                if os.path.isdir(user_dir):
+                    names.update(f"{user}/{collection}" for collection in os.listdir(user_dir))
+
+        return sorted(names)
+
+    def stats(self):
+        return {
+            "open": list(self._open),
+            "max_open": self.max_open,
+            "namespaces": len(self.namespaces()),
+        }
+
+    def close(self):
+        """
+        Save and close every open namespace.
+        """
+        with self._lock:
+            opened = self._open
+            self._open = {}
+
+        for namespace in opened.values():
+            self._close(namespace)
+
+
+class Collection:
+    """
+    One namespace of a service (local or a proxy) with the VectorEngine
+    method signatures, e.g. for index_document().
+    """
+
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+
+    def add_documents(self, vectors, texts, source, metadata=None):
+        return self.service.add_documents(self.name, vectors, texts, source, metadata)
+
+    def add_sections(self, vectors, titles, source, members):
+        return self.service.add_sections(self.name, vectors, titles, source, members)
+
+    def remove_document(self, source):
+        return self.service.remove_document(self.name, source)
+
+    def register_file(self, digest, source):
+        self.service.register_file(self.name, digest, source)
+
+    def indexed_file(self, digest):
+        return self.service.indexed_file(self.name, digest)
+
+    def reset(self):
+        self.service.reset(self.name)
+
+    def migrate(self, index_type, **options):
+        self.service.migrate(self.name, index_type, **options)
+
+    def save_index(self):
+        self.service.save(self.name)
+
+    def describe(self):
+        return self.service.describe(self.name)
+
+    def search(self, query_vector, k=3, **options):
+        return self.service.search(self.name, query_vector, k, **options)
+
+    def hybrid_search(self, query_vector, query_text, k=3, **options):
+        return self.service.hybrid_search(self.name, query_vector, query_text, k, **options)
+
+    def hierarchical_search(self, query_vector, k=3, sections=5, filter=None):
+        return self.service.hierarchical_search(self.name, query_vector, k, sections, filter)
+
+    def reconstruct_all(self):
+        return self.service.reconstruct_all(self.name)
+
+    def get_paper_embedding(self, source, normalize=True):
+        return self.service.paper_embedding(self.name, source, normalize)
+
+    def sources(self):
+        return self.service.sources(self.name)
+
+    @property
+    def version(self):
+        return self.service.version(self.name)
+
+    def __len__(self):
+        return self.service.size(self.name)
+
+
+# ---------- local RPC ----------
+
+class IndexManager(BaseManager):
+    pass
+
+
+def _authkey(authkey, authkey_file=AUTHKEY_FILE):
+    """
+    The given key, else $SCILIT_INDEX_AUTHKEY, else the key in
+    authkey_file. None if there is none.
+    """
+    if authkey is None:
+        authkey = os.environ.get("SCILIT_INDEX_AUTHKEY")
+
+    if authkey is None and os.path.exists(authkey_file):
+        with open(authkey_file) as f:
+            authkey = f.read().strip()
+
+    return authkey.encode("utf-8") if isinstance(authkey, str) else authkey
+
+
+def _generate_authkey(authkey_file=AUTHKEY_FILE):
+    authkey = secrets.token_hex(32)
+
+    os.makedirs(os.path.dirname(authkey_file) or ".", exist_ok=True)
+    if os.path.exists(authkey_file):
+        os.remove(authkey_file)
+
+    # Created readable by the owner only
+    fd = os.open(authkey_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(authkey)
+
+    return authkey.encode("utf-8")
+
+
+def _address(address):
+    if isinstance(address, str):
+        host, _, port = address.rpartition(":")
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def serve(address=("127.0.0.1", DEFAULT_PORT), authkey=None, authkey_file=AUTHKEY_FILE, **options):
+    """
+    Serve one IndexService to other processes until interrupted.
+    Each client connection is handled in its own thread.
+
+    Parameters:
+        authkey (str): secret clients must present; defaults to
+            $SCILIT_INDEX_AUTHKEY, else a new random key is written to
+            authkey_file (mode 0600)
+    """
+    if authkey is None:
+        authkey = os.environ.get("SCILIT_INDEX_AUTHKEY")
+
+    if authkey:
+        authkey = _authkey(authkey)
+    else:
+        authkey = _generate_authkey(authkey_file)
+        print(f"Generated an access key in {authkey_file}")
+
+    service = IndexService(**options)
+    IndexManager.register("index_service", callable=lambda: service)
+
+    manager = IndexManager(address=_address(address), authkey=authkey)
+    server = manager.get_server()
+
+    print(f"Index service listening on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    finally:
+        service.close()
+
+
+def connect(address=("127.0.0.1", DEFAULT_PORT), authkey=None, authkey_file=AUTHKEY_FILE):
+    """
+    Returns a proxy of a served IndexService; it has the same methods.
+    The key defaults to $SCILIT_INDEX_AUTHKEY, else the one serve()
+    wrote to authkey_file.
+    """
+    authkey = _authkey(authkey, authkey_file)
+    if not authkey:
+        raise ValueError(
+            f"No access key for the index service: set SCILIT_INDEX_AUTHKEY or create {authkey_file}"
+        )
+
+    IndexManager.register("index_service")
+
+    manager = IndexManager(address=_address(address), authkey=authkey)
+    manager.connect()
+
+    return manager.index_service()
+
+
+def open_service(**options):
+    """
+    The service at $SCILIT_INDEX_SERVICE ("host:port") if it is set,
+    otherwise an in-process IndexService.
+    """
+    address = os.environ.get("SCILIT_INDEX_SERVICE")
+    if address:
+        return connect(address)
+
+    service = IndexService(**options)
+    if service.root:
+        adopt_legacy_index(service.root)
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the shared vector index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--root", default=DEFAULT_ROOT,
+                        help="Directory holding the namespaces")
+    parser.add_argument("--max-open", type=int, default=64,
+                        help="Namespaces kept in memory at once")
+    args = parser.parse_args()
+
+    adopt_legacy_index(args.root)
+    serve((args.host, args.port), root=args.root, max_open=args.max_open)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from models.corpus_citation_graph import find_doi, parse_references
+from models.dedup import file_hash
+from models.document_indexer import chunk_metadata
+from models.paper_compressor import PaperCompressor
+
+
+_DONE = object()
+
+
+def _extract_paper(path):
+    """
+    Worker for the parsing pool: extracts one PDF and its reference list.
+    Returns (path, extract_content result, seconds spent).
+    """
+    start = time.perf_counter()
+    data = PaperCompressor().extract_content(path)
+
+    if "error" not in data:
+        data["references"] = parse_references(data["full_text"])
+        # A DOI printed on the paper itself is usually near the top
+        data["doi"] = find_doi(data["full_text"][:5000])
+        # Only the chunks are needed from here on
+        del data["full_text"]
+
+    return path, data, time.perf_counter() - start
+
+
+class IngestionPipeline:
+    """
+    Headless extract -> chunk -> encode -> index pipeline for many PDFs.
+
+    Stages run concurrently and talk through bounded queues:
+    - a process pool parses PDFs (one paper per task)
+    - an encoder thread packs chunks from several papers into batches
+    - the calling thread adds finished papers to the VectorEngine (and
+      the optional CorpusCitationGraph) and checkpoints the index every
+      `checkpoint_every` papers
+
+    A paper is only added once all its chunks are encoded, so a saved
+    index never contains half a paper and a crashed run can resume from
+    the checkpoint file. Files whose content is already in the index
+    (registered by content hash), or repeated within the run, are
+    skipped before parsing.
+    """
+
+    def __init__(
+        self,
+        encoder,
+        vector_db,
+        workers=4,
+        batch_size=128,
+        queue_size=32,
+        checkpoint_every=50,
+        checkpoint_path=None,
+        citation_graph=None
+    ):
+        """
+        Parameters:
+            checkpoint_path (str): papers done so far; defaults to
+                ingest_checkpoint.json inside the index directory
+        """
+        if checkpoint_path is None:
+            # A Collection of an index service has no directory of its own
+            index_dir = getattr(vector_db, "index_dir", None)
+            checkpoint_path = os.path.join(index_dir or "data", "ingest_checkpoint.json")
+
+        self.encoder = encoder
+        self.vector_db = vector_db
+        self.citation_graph = citation_graph
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_path = checkpoint_path
+
+        self._error = None
+        self._stop = threading.Event()
+
+    # ---------- checkpointing ----------
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+
+        with open(self.checkpoint_path) as f:
+            return set(json.load(f)["done"])
+
+    def _write_checkpoint(self, done):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(done)}, f)
+
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    # ---------- stages ----------
+
+    def _parse_stage(self, paths, paper_queue, stats):
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                remaining = iter(paths)
+                in_flight = set()
+                # content hash of each file submitted, and all seen
+                digests = {}
+                seen = set()
+
+                while not self._stop.is_set():
+                    # Keep the pool busy without submitting every path up front
+                    while len(in_flight) < self.workers * 2:
+                        path = next(remaining, None)
+                        if path is None:
+                            break
+
+                        digest = file_hash(path)
+                        if digest in seen or self.vector_db.indexed_file(digest):
+                            stats["duplicates"] += 1
+                            continue
+
+                        seen.add(digest)
+                        digests[path] = digest
+                        in_flight.add(pool.submit(_extract_paper, path))
+
+                    if not in_flight:
+                        break
+
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                    for future in finished:
+                        path, data, seconds = future.result()
+                        stats["extract_seconds"] += seconds
+                        data["digest"] = digests.pop(path)
+
+                        if "error" in data or not data["chunks"]:
+                            stats["failed"].append((path, data.get("error", "No chunks")))
+                            continue
+
+                        stats["pages"] += data["num_pages"]
+                        paper_queue.put((path, data["chunks"], data))
+
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+
+        finally:
+            paper_queue.put(_DONE)
+
+    def _encode_stage(self, paper_queue, index_queue, stats):
+        # Chunks waiting for the next encoder batch: (path, position, text)
+        batch = []
+        # path -> [chunks, vectors-so-far, extracted data]
+        papers = {}
+
+        def flush():
+            start = time.perf_counter()
+            vectors = self.encoder.encode([text for _, _, text in batch])
+            stats["encode_seconds"] += time.perf_counter() - start
+            stats["chunks"] += len(batch)
+
+            for (path, position, _), vector in zip(batch, vectors):
+                chunks, paper_vectors, data = papers[path]
+                paper_vectors[position] = vector
+
+                if position == len(chunks) - 1:
+                    index_queue.put((path, chunks, paper_vectors, data))
+                    del papers[path]
+
+            batch.clear()
+
+        try:
+            while True:
+                try:
+                    item = paper_queue.get(timeout=0.05)
+                except queue.Empty:
+                    # Parsing is the bottleneck right now, don't sit on a partial batch
+                    if batch:
+                        flush()
+                    continue
+
+                if item is _DONE:
+                    break
+
+                if self._stop.is_set():
+                    continue
+
+                path, chunks, data = item
+                papers[path] = [chunks, [None] * len(chunks), data]
+
+                for position, text in enumerate(chunks):
+                    batch.append((path, position, text))
+                    if len(batch) >= self.batch_size:
+                        flush()
+
+            if batch:
+                flush()
+
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+
+            # Unblock the parse stage
+            while paper_queue.get() is not _DONE:
+                pass
+
+        finally:
+            index_queue.put(_DONE)
+
+    # ---------- driver ----------
+
+    def run(self, paths, source_name=os.path.basename, resume=True, progress=None):
+        """
+        Ingest every PDF in paths.
+
+        Parameters:
+            paths (list[str]): PDF files
+            source_name (callable): maps a path to the stored source name
+            resume (bool): skip papers recorded in the checkpoint file
+            progress (callable): called with the stats dict after each paper
+
+        Returns:
+            dict of counts, per-stage seconds and throughput
+        """
+        done = self.load_checkpoint() if resume else set()
+        todo = [p for p in paths if os.path.abspath(p) not in done]
+
+        stats = {
+            "papers": 0,
+            "skipped": len(paths) - len(todo),
+            "duplicates": 0,
+            "failed": [],
+            "pages": 0,
+            "chunks": 0,
+            "extract_seconds": 0.0,
+            "encode_seconds": 0.0,
+            "index_seconds": 0.0,
+            "checkpoint_seconds": 0.0,
+        }
+
+        self._error = None
+        self._stop.clear()
+        paper_queue = queue.Queue(maxsize=self.queue_size)
+        index_queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(
+                target=self._parse_stage,
+                args=(todo, paper_queue, stats),
+                daemon=True
+            ),
+            threading.Thread(
+                target=self._encode_stage,
+                args=(paper_queue, index_queue, stats),
+                daemon=True
+            ),
+        ]
+
+        started = time.perf_counter()
+        for stage in stages:
+            stage.start()
+
+        since_checkpoint = 0
+
+        try:
+            while True:
+                item = index_queue.get()
+                if item is _DONE:
+                    break
+
+                path, chunks, vectors, data = item
+
+                start = time.perf_counter()
+                metadata = [chunk_metadata(chunk, data["year"]) for chunk in data["chunk_metadata"]]
+                self.vector_db.add_documents(vectors, chunks, source_name(path), metadata)
+                self.vector_db.register_file(data["digest"], source_name(path))
+
+                if self.citation_graph is not None:
+                    self.citation_graph.add_paper(source_name(path), data["references"], doi=data["doi"])
+
+                stats["index_seconds"] += time.perf_counter() - start
+
+                done.add(os.path.abspath(path))
+                stats["papers"] += 1
+                since_checkpoint += 1
+
+                if since_checkpoint >= self.checkpoint_every:
+                    self._checkpoint(done, stats)
+                    since_checkpoint = 0
+
+                if progress:
+                    progress(stats)
+
+        except BaseException:
+            # Stop the other stages and let them drain before re-raising;
+            # papers indexed since the last checkpoint are redone on resume
+            self._stop.set()
+            while index_queue.get() is not _DONE:
+                pass
+            raise
+
+        for stage in stages:
+            stage.join()
+
+        if since_checkpoint:
+            self._checkpoint(done, stats)
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = elapsed
+        stats["pages_per_sec"] = stats["pages"] / elapsed if elapsed else 0.0
+        stats["chunks_per_sec"] = stats["chunks"] / elapsed if elapsed else 0.0
+
+        return stats
+
+    def _checkpoint(self, done, stats):
+        start = time.perf_counter()
+        self.vector_db.save_index()
+        if self.citation_graph is not None:
+            self.citation_graph.save()
+        self._write_checkpoint(done)
+        stats["checkpoint_seconds"] += time.perf_counter() - start
+
+
+def find_pdfs(root):
+    """
+    Returns every .pdf under root (recursively), sorted.
+    """
+    found = []
+
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.join(dirpath, name))
+
+    return sorted(found)
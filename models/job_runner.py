@@ -0,0 +1,238 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+def job_key(data, *parts):
+    """
+    Job id for processing `data` (bytes, e.g. an uploaded file): a
+    sha256 of the content and of everything else the result depends on
+    (namespace, options), so the same upload maps to the same job.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8") + b"\0")
+    digest.update(data)
+    return digest.hexdigest()[:24]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    One background task. The task function receives the job and
+    reports through update() and message(); it should call
+    check_cancelled() between steps (or pass cancel_event on to
+    long-running calls such as index_document).
+    """
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+
+        self.status = QUEUED
+        self.stage = "Queued"
+        self.done = 0
+        self.total = None
+
+        self.result = None
+        self.error = None
+        # (level, text) notes for the UI, e.g. ("warning", "...")
+        self.messages = []
+
+        self.cancel_event = threading.Event()
+        # Set once the task has returned (or never started)
+        self._exited = threading.Event()
+
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def fraction(self):
+        if not self.total:
+            return 0.0
+        return min(1.0, self.done / self.total)
+
+    def update(self, stage=None, done=None, total=None):
+        if stage is not None:
+            self.stage = stage
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+
+    def message(self, level, text):
+        self.messages.append((level, text))
+
+    def wait(self, timeout=None):
+        """
+        Block until the task has returned, including its cleanup after a
+        cancellation. Returns False on timeout.
+        """
+        return self._exited.wait(timeout)
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "messages": list(self.messages),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobRunner:
+    """
+    In-process background job queue.
+
+    Jobs run on a small thread pool, in submission order, so they share
+    the process-wide encoder and indexes instead of loading their own.
+    Submitting an id that is queued, running or done returns the
+    existing job, which makes submission idempotent (e.g. on every
+    Streamlit rerun); failed and cancelled jobs are started again.
+    """
+
+    def __init__(self, workers=1, keep_finished=256):
+        """
+        Parameters:
+            workers (int): jobs run at the same time
+            keep_finished (int): finished jobs remembered for status
+                queries; the oldest are forgotten first
+        """
+        self.keep_finished = keep_finished
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, job_id, function, *args, name=None, **kwargs):
+        """
+        Queue function(job, *args, **kwargs). Its return value becomes
+        job.result.
+
+        Returns:
+            Job
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status not in (FAILED, CANCELLED):
+                return job
+
+            job = Job(job_id, name or job_id)
+            self._jobs[job_id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        if job.cancelled:
+            job.finished = time.time()
+            job.status = CANCELLED
+            job._exited.set()
+            return
+
+        job.status = RUNNING
+        job.started = time.time()
+
+        status = FAILED
+        try:
+            job.result = function(job, *args, **kwargs)
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            # finished is set before the status is published: a job that
+            # looks finished (e.g. to _prune) always has its time
+            job.finished = time.time()
+            job.status = status
+            job._exited.set()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.status in FINISHED]
+        excess = len(finished) - self.keep_finished
+
+        if excess > 0:
+            for job in sorted(finished, key=lambda job: job.finished)[:excess]:
+                del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        """
+        All known jobs, oldest first.
+        """
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created)
+
+    def cancel(self, job_id):
+        """
+        Ask a job to stop. Queued jobs never start; running jobs stop at
+        their next cancellation check. Returns False for unknown or
+        finished jobs.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+
+        job.cancel_event.set()
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """
+        Block until a job's task has returned (see Job.wait). Returns
+        False on timeout, True otherwise (also for unknown jobs).
+        """
+        job = self._jobs.get(job_id)
+        return job is None or job.wait(timeout)
+
+    def forget(self, job_id):
+        """
+        Drop a finished job, so its id can be submitted again (e.g. after
+        the index it wrote to was cleared).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in FINISHED:
+                del self._jobs[job_id]
+                return True
+        return False
+
+    def active(self):
+        return [job for job in self.jobs() if job.status not in FINISHED]
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.active():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=True)
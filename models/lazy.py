@@ -0,0 +1,35 @@
+import importlib.util
+import sys
+import threading
+
+
+_lock = threading.Lock()
+
+
+def lazy_import(name, optional=False):
+    """
+    Returns module `name` without executing it: the real import runs on
+    first attribute access. Keeps heavy dependencies (faiss, networkx,
+    scipy, ...) out of the app's startup path.
+
+    Parameters:
+        optional (bool): return None instead of raising ImportError when
+            the module is not installed
+    """
+    with _lock:
+        if name in sys.modules:
+            return sys.modules[name]
+
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            if optional:
+                return None
+            raise ImportError(f"No module named {name!r}")
+
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+
+        return module
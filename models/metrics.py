@@ -0,0 +1,313 @@
+"""
+Lightweight timers and counters for the pipeline stages.
+
+Disabled by default; set SCILIT_METRICS=1 (or call metrics.enable()) to
+record. While disabled a timed call costs one attribute check, so the
+decorators stay on the hot paths permanently.
+
+    from models.metrics import metrics, timed
+
+    @timed("index.search")
+    def search(...): ...
+
+    with metrics.timer("pdf.extract"):
+        ...
+    metrics.count("pdf.pages", 12)
+
+Recorded values are exported as Prometheus text (to_prometheus(), or
+over HTTP with serve() / SCILIT_METRICS_PORT) or as JSON (snapshot(),
+write_json()). Sampled calls can also be run under cProfile, see
+enable_profiling().
+"""
+
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+_DISABLED = nullcontext()
+
+
+class Timer:
+    """
+    Count, total, max and histogram of one stage's durations.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+        # callback(name, seconds) after every timed span
+        self._hooks = []
+
+        # Sampling profiler: fraction of timed calls run under cProfile
+        self.profile_rate = 0.0
+        self._profiles = {}
+        self._profiling = threading.local()
+
+        self._server = None
+
+    # ---------- switches ----------
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+            self._profiles.clear()
+
+    def add_hook(self, callback):
+        """
+        Call callback(name, seconds) after every timed span, e.g. to log
+        slow calls or forward them to a tracing system.
+        """
+        self._hooks.append(callback)
+
+    def remove_hook(self, callback):
+        self._hooks.remove(callback)
+
+    def enable_profiling(self, sample_rate=0.01):
+        """
+        Run this fraction of the calls of @timed functions under
+        cProfile; profile_report(name) shows the aggregated result.
+        Calls nested in a profiled call are not profiled separately.
+        """
+        self.profile_rate = sample_rate
+
+    # ---------- recording ----------
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.observe(seconds)
+
+        for hook in self._hooks:
+            hook(name, seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def _timing(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timer(self, name):
+        """
+        Context manager timing its body as stage `name`.
+        """
+        if not self.enabled:
+            return _DISABLED
+
+        return self._timing(name)
+
+    def _call(self, name, function, args, kwargs):
+        if (
+            self.profile_rate
+            and not getattr(self._profiling, "active", False)
+            and random.random() < self.profile_rate
+        ):
+            return self._profiled_call(name, function, args, kwargs)
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def _profiled_call(self, name, function, args, kwargs):
+        profiler = cProfile.Profile()
+        self._profiling.active = True
+
+        start = time.perf_counter()
+        try:
+            # Another profiler may already be running (e.g. under a debugger)
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler = None
+
+            return function(*args, **kwargs)
+
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self._profiling.active = False
+            self.observe(name, time.perf_counter() - start)
+
+            if profiler is not None:
+                with self._lock:
+                    if name in self._profiles:
+                        self._profiles[name].add(profiler)
+                    else:
+                        self._profiles[name] = pstats.Stats(profiler)
+
+    # ---------- export ----------
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "timers": {name: timer.to_dict() for name, timer in self.timers.items()},
+                "counters": dict(self.counters),
+                "profiled": sorted(self._profiles),
+            }
+
+    def write_json(self, path):
+        """
+        Append the current snapshot as one JSON line to path.
+        """
+        record = {"time": time.time(), **self.snapshot()}
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def to_prometheus(self):
+        """
+        Timers as a histogram `scilit_stage_seconds{stage=...}`, counters
+        as `scilit_events_total{event=...}`.
+        """
+        lines = [
+            "# HELP scilit_stage_seconds Duration of pipeline stages.",
+            "# TYPE scilit_stage_seconds histogram",
+        ]
+
+        with self._lock:
+            for name, timer in sorted(self.timers.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, timer.buckets):
+                    cumulative += count
+                    lines.append(f'scilit_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'scilit_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {timer.count}')
+                lines.append(f'scilit_stage_seconds_sum{{stage="{name}"}} {timer.total}')
+                lines.append(f'scilit_stage_seconds_count{{stage="{name}"}} {timer.count}')
+
+            lines.append("# HELP scilit_events_total Pipeline event counters.")
+            lines.append("# TYPE scilit_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'scilit_events_total{{event="{name}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def profile_report(self, name, limit=20, sort="cumulative"):
+        """
+        Top functions of the sampled profiles of stage `name`, as text
+        (None if no call of it was profiled).
+        """
+        with self._lock:
+            stats = self._profiles.get(name)
+            if stats is None:
+                return None
+
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(limit)
+
+        return out.getvalue()
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json from a daemon
+        thread. Returns the server; calling again returns the running one.
+        """
+        if self._server is not None:
+            return self._server
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return self._server
+
+
+def timed(name):
+    """
+    Decorator recording every call of the function as stage `name`.
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            return metrics._call(name, function, args, kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+metrics = Metrics(enabled=os.environ.get("SCILIT_METRICS", "") not in ("", "0"))
+
+if metrics.enabled and os.environ.get("SCILIT_METRICS_PORT"):
+    metrics.serve(int(os.environ["SCILIT_METRICS_PORT"]))
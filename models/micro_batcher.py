@@ -0,0 +1,72 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls.
+
+    Items submitted from any thread are collected by one worker thread for
+    at most `max_wait` seconds (or until `max_batch_size` items arrived)
+    and passed to `batch_fn` as one list. batch_fn must return one result
+    per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=64, max_wait=0.005):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """
+        Returns a Future resolved with the item's result.
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        # Block for the first item, then wait briefly for company
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        try:
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
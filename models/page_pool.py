@@ -0,0 +1,67 @@
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from PyPDF2 import PdfReader
+
+
+def pdf_source(pdf_file):
+    """
+    A path or the bytes of pdf_file. Pool workers re-open the PDF
+    themselves, so they can't be given an open file.
+    """
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file)
+
+    if hasattr(pdf_file, "seek"):
+        pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def open_pdf(source):
+    """
+    PdfReader for a path or bytes (as returned by pdf_source).
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return PdfReader(source)
+
+
+def map_page_ranges(worker, pdf_file, workers, pages_per_task, *args):
+    """
+    Runs worker(source, start, end, *args) on consecutive page ranges
+    of a PDF in a process pool. The worker must be a module-level
+    function (it is pickled) and re-open the PDF with open_pdf.
+
+    Yields (start, worker result) in page order. Only workers * 2
+    ranges are in flight at a time, so results are consumed as they
+    arrive instead of being held for the whole document.
+    """
+    source = pdf_source(pdf_file)
+    num_pages = len(open_pdf(source).pages)
+
+    ranges = [
+        (start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(ranges)
+        pending = deque(
+            (start, pool.submit(worker, source, start, end, *args))
+            for start, end in islice(remaining, workers * 2)
+        )
+
+        while pending:
+            start, future = pending.popleft()
+
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append((
+                    next_range[0],
+                    pool.submit(worker, source, *next_range, *args)
+                ))
+
+            yield start, future.result()
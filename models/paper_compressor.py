@@ -1,67 +1,171 @@
+import datetime
 import re
 from PyPDF2 import PdfReader
 
+from models.chunker import TokenChunker
+from models.metrics import metrics, timed
+from models.page_pool import map_page_ranges, open_pdf
+
+
+HYPHEN_BREAK = re.compile(r"-\n")
+NEWLINES = re.compile(r"\n+")
+SPACES = re.compile(r"[ \t]+")
+CITATION_MARKER = re.compile(r"\[(\d+)\]")
+YEAR = re.compile(r"(?<!\d)(19\d\d|20\d\d)(?!\d)")
+
+
+def clean_text(text):
+    text = HYPHEN_BREAK.sub("", text)
+    text = NEWLINES.sub("\n", text)
+    return SPACES.sub(" ", text)
+
+
+def guess_year(text, head=3000):
+    """
+    Publication year of a paper, guessed as the latest plausible year in
+    its first `head` characters (title page, dates, copyright line).
+    Earlier years there are mostly cited works. None if there is none.
+    """
+    latest = datetime.date.today().year + 1
+    years = [int(year) for year in YEAR.findall(text[:head]) if int(year) <= latest]
+    return max(years) if years else None
+
+
+def _extract_page_range(pdf_source, start, end):
+    """
+    Worker for parallel extraction: returns the raw text of pages
+    [start, end). Kept at module level so it can be pickled.
+    """
+    reader = open_pdf(pdf_source)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
 class PaperCompressor:
-    def __init__(self):
-        self.chunk_size = 1000
+    def __init__(self, workers=None, pages_per_task=16, chunker=None):
+        # Token-budgeted, sentence-aware chunking (see TokenChunker)
+        self.chunker = chunker or TokenChunker()
+
+        # workers > 1 extracts page ranges in a process pool
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+
+    def iter_pages(self, pdf_file):
+        """
+        Yields (page_number, raw_text) in page order.
+        """
+        if self.workers and self.workers > 1:
+            yield from self._iter_pages_parallel(pdf_file)
+            return
+
+        reader = PdfReader(pdf_file)
+        for i, page in enumerate(reader.pages):
+            yield i + 1, page.extract_text()
+
+    def _iter_pages_parallel(self, pdf_file):
+        pages = map_page_ranges(_extract_page_range, pdf_file, self.workers, self.pages_per_task)
+
+        for start, texts in pages:
+            for offset, page_text in enumerate(texts):
+                yield start + offset + 1, page_text
+
+    def _iter_clean_pages(self, pdf_file):
+        """
+        Yields (page_number, cleaned_text) for every page with text.
+        Cleaning page by page gives the same lines as cleaning the whole
+        document at once.
+        """
+        pending = None
+
+        for page_number, page_text in self.iter_pages(pdf_file):
+            if not page_text:
+                continue
+
+            segment = f"\n\n[Page {page_number}]\n\n" + page_text
 
+            if pending is not None:
+                previous_page, previous = pending
+
+                # In the whole-document pass a trailing hyphen is joined
+                # with the newline that starts the next page marker
+                if previous.endswith("-"):
+                    previous = previous[:-1]
+
+                yield previous_page, clean_text(previous)
+
+            pending = (page_number, segment)
+
+        if pending is not None:
+            yield pending[0], clean_text(pending[1])
+
+    @timed("pdf.extract")
     def extract_content(self, pdf_file):
-        text_content = ""
+        segments = []
+        num_pages = 0
 
         try:
-            reader = PdfReader(pdf_file)
-
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
+            for page_number, page_text in self.iter_pages(pdf_file):
+                num_pages = page_number
 
                 if page_text:
-                    text_content += f"\n\n[Page {i+1}]\n\n"
-                    text_content += page_text
+                    segments.append(f"\n\n[Page {page_number}]\n\n")
+                    segments.append(page_text)
 
         except Exception as e:
             return {"error": f"PDF extraction failed: {str(e)}"}
 
+        metrics.count("pdf.pages", num_pages)
+        text_content = "".join(segments)
+
         if not text_content.strip():
             return {"error": "No readable text found in PDF."}
 
         # Clean text
-        text_content = re.sub(r"-\n", "", text_content)
-        text_content = re.sub(r"\n+", "\n", text_content)
-        text_content = re.sub(r"[ \t]+", " ", text_content)
-
-        clean_text = text_content.strip()
+        clean = clean_text(text_content).strip()
 
         # Extract citations
-        citations = re.findall(r"\[(\d+)\]", clean_text)
+        citations = CITATION_MARKER.findall(clean)
         citations = list(set(citations))
 
         # Create chunks
-        chunks = self.split_into_chunks(clean_text)
+        chunks = self.chunk_text(clean)
 
         return {
-            "chunks": chunks[:150],  # limit for speed
+            "chunks": [chunk["text"] for chunk in chunks],
+            # page_start, page_end, section and tokens of each chunk
+            "chunk_metadata": [
+                {key: value for key, value in chunk.items() if key != "text"}
+                for chunk in chunks
+            ],
             "citations": citations,
-            "full_text": clean_text
+            "full_text": clean,
+            "num_pages": num_pages,
+            "year": guess_year(clean)
         }
 
-    def split_into_chunks(self, text):
-        paragraphs = text.split("\n")
+    def stream_chunks(self, pdf_file, citations=None):
+        """
+        Yields chunks as pages are extracted:
+        {"text", "page_start", "page_end", "section", "tokens"}
 
-        chunks = []
-        current_chunk = ""
+        The chunks are the same, in the same order, as chunk_text() on
+        the full extracted text.
+        If a set is passed as citations, citation markers are added to it.
+        """
+        def pages():
+            for page_number, text in self._iter_clean_pages(pdf_file):
+                if citations is not None:
+                    citations.update(CITATION_MARKER.findall(text))
 
-        for para in paragraphs:
-            para = para.strip()
-            if len(para) < 40:
-                continue
+                yield page_number, text
 
-            if len(current_chunk) + len(para) < self.chunk_size:
-                current_chunk += " " + para
-            else:
-                chunks.append(current_chunk.strip())
-                current_chunk = para
+        yield from self.chunker.iter_chunks(pages())
 
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+    @timed("pdf.chunk")
+    def chunk_text(self, text):
+        """
+        Chunks of an extracted text, with page / section provenance.
+        """
+        return self.chunker.chunk_text(text)
 
-        return chunks
+    def split_into_chunks(self, text):
+        return [chunk["text"] for chunk in self.chunk_text(text)]
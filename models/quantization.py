@@ -0,0 +1,61 @@
+import numpy as np
+
+
+# Supported values for TextEncoder.encode(precision=...) and
+# VectorEngine(storage=...)
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+
+def truncate(vectors, dimension, normalize=True):
+    """
+    Matryoshka-style dimension reduction: keep the first `dimension`
+    components and (optionally) re-normalize them.
+    """
+    vectors = np.asarray(vectors, dtype="float32")[..., :dimension]
+
+    if normalize:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        vectors = vectors / (norms + 1e-10)
+
+    return np.ascontiguousarray(vectors, dtype="float32")
+
+
+def quantize(vectors, precision):
+    """
+    Convert float32 embeddings to `precision`.
+
+    int8 codes are scaled per vector so the largest component maps to
+    127. The scale itself is dropped: only the direction matters for
+    cosine similarity, and to_float32() re-normalizes.
+    """
+    check_precision(precision)
+    vectors = np.asarray(vectors, dtype="float32")
+
+    if precision == "float16":
+        return vectors.astype("float16")
+
+    if precision == "int8":
+        scale = np.abs(vectors).max(axis=-1, keepdims=True)
+        codes = np.rint(vectors * (127.0 / (scale + 1e-10)))
+        return np.clip(codes, -127, 127).astype("int8")
+
+    return vectors
+
+
+def to_float32(vectors):
+    """
+    Inverse of quantize(): float32 vectors from any supported precision.
+    """
+    vectors = np.asarray(vectors)
+
+    if vectors.dtype == np.int8:
+        vectors = vectors.astype("float32")
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / (norms + 1e-10)
+
+    return vectors.astype("float32")
@@ -1,51 +1,281 @@
+import json
+import os
+import threading
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from models.directory_lock import DirectoryLock
+from models.lazy import lazy_import
+from models.metrics import timed
+
+# FAISS is optional here, numpy handles small catalogs
+faiss = lazy_import("faiss", optional=True)
 
 
 class Recommender:
-    def __init__(self):
+    def __init__(
+        self,
+        store_dir="data/recommender",
+        faiss_threshold=50_000,
+        initial_capacity=1024,
+        lock=False
+    ):
         """
-        Simple in-memory paper store.
-        Each item:
-        {
-            "title": str,
-            "embedding": np.array
-        }
+        Paper-level embedding store for recommendations.
+
+        Embeddings live in one preallocated float32 matrix (grown by
+        doubling) with L2-normalized rows, so cosine similarity is a single
+        matrix-vector product. Catalogs with at least faiss_threshold
+        papers are searched through a FAISS inner-product index instead.
+
+        Parameters:
+            store_dir (str): where the catalog is persisted (None = memory only)
+            faiss_threshold (int): catalog size from which FAISS is used
+            initial_capacity (int): rows allocated up front
+            lock (bool): hold a DirectoryLock on store_dir while open, so
+                no other process saves over the catalog at the same time
         """
-        self.paper_store = []
+        self.store_dir = store_dir
+        self._dir_lock = DirectoryLock(store_dir).acquire() if lock and store_dir else None
+        self.faiss_threshold = faiss_threshold
+        self.initial_capacity = initial_capacity
+
+        self.titles = []
+        self._rows = {}
+        self._matrix = None
+        self._count = 0
+
+        self._faiss_index = None
+
+        # Papers are added by ingestion jobs while sessions read; mutations
+        # and queries hold the lock
+        self._lock = threading.RLock()
+
+        if store_dir and os.path.exists(os.path.join(store_dir, "titles.json")):
+            self.load()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, title):
+        return title in self._rows
+
+    @property
+    def embeddings(self):
+        """
+        Normalized embeddings of all papers, (n, dimension). A view, not a copy.
+        """
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype="float32")
+        return self._matrix[:self._count]
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / (norms + 1e-10)
+
+    def _ensure_capacity(self, dimension, needed):
+        if self._matrix is None:
+            capacity = max(self.initial_capacity, needed)
+            self._matrix = np.zeros((capacity, dimension), dtype="float32")
+            return
+
+        if needed <= len(self._matrix):
+            return
+
+        capacity = max(needed, 2 * len(self._matrix))
+        grown = np.zeros((capacity, self._matrix.shape[1]), dtype="float32")
+        grown[:self._count] = self._matrix[:self._count]
+        self._matrix = grown
 
     def add_paper(self, title, embedding):
         """
         Store paper embedding for recommendation.
+        Adding a title that is already stored replaces its embedding.
+        """
+        with self._lock:
+            vector = self._normalize(embedding).reshape(-1)
+
+            row = self._rows.get(title)
+            if row is not None:
+                self._matrix[row] = vector
+                # FAISS flat indexes can't update in place; rebuild on next query
+                self._faiss_index = None
+                return
+
+            self._ensure_capacity(len(vector), self._count + 1)
+            self._matrix[self._count] = vector
+            self._rows[title] = self._count
+            self.titles.append(title)
+            self._count += 1
+
+            if self._faiss_index is not None:
+                self._faiss_index.add(vector[None, :])
+
+    def remove_paper(self, title):
+        """
+        Remove a paper, e.g. before it is indexed again. Later papers move
+        up one row. Returns False if the title is not stored.
+        """
+        with self._lock:
+            row = self._rows.pop(title, None)
+            if row is None:
+                return False
+
+            self._matrix[row:self._count - 1] = self._matrix[row + 1:self._count]
+            del self.titles[row]
+            self._count -= 1
+
+            for moved in self.titles[row:]:
+                self._rows[moved] -= 1
+
+            # A flat index can't drop rows; rebuild on next query
+            self._faiss_index = None
+            return True
+
+    def _use_faiss(self):
+        return faiss is not None and self._count >= self.faiss_threshold
+
+    def _faiss(self):
+        if self._faiss_index is None:
+            self._faiss_index = faiss.IndexFlatIP(self._matrix.shape[1])
+            self._faiss_index.add(self.embeddings)
+        return self._faiss_index
+
+    def _top_k(self, queries, top_k):
+        """
+        Returns (rows, scores), each (n_queries, top_k), best first.
         """
-        self.paper_store.append({
-            "title": title,
-            "embedding": embedding
-        })
+        top_k = min(top_k, self._count)
+
+        if self._use_faiss():
+            scores, rows = self._faiss().search(queries, top_k)
+            return rows, scores
+
+        similarities = queries @ self.embeddings.T
 
+        if top_k < self._count:
+            rows = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        else:
+            rows = np.tile(np.arange(self._count), (len(queries), 1))
+
+        scores = np.take_along_axis(similarities, rows, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    @timed("recommender.recommend")
     def get_recommendations(self, query_embedding, top_k=3):
         """
         Returns top_k similar papers based on cosine similarity.
         """
-        if not self.paper_store:
-            return []
+        return self.get_recommendations_batch([query_embedding], top_k)[0]
+
+    def get_recommendations_batch(self, query_embeddings, top_k=3, block_size=1024):
+        """
+        Recommendations for many query embeddings at once.
+        Queries are processed in blocks so the similarity matrix stays
+        at most block_size x catalog size.
+
+        Returns:
+            list with one recommendation list per query
+        """
+        with self._lock:
+            if not self._count or top_k <= 0:
+                return [[] for _ in query_embeddings]
+
+            queries = self._normalize(query_embeddings).reshape(-1, self._matrix.shape[1])
+            all_recommendations = []
+
+            for start in range(0, len(queries), block_size):
+                rows, scores = self._top_k(queries[start:start + block_size], top_k)
+
+                for row_ids, row_scores in zip(rows, scores):
+                    all_recommendations.append([
+                        {
+                            "title": self.titles[idx],
+                            "score": float(score)
+                        }
+                        for idx, score in zip(row_ids, row_scores)
+                        if idx >= 0
+                    ])
+
+            return all_recommendations
+
+    def recommend_for_papers(self, titles, top_k=3):
+        """
+        Recommendations for stored papers, leaving each paper itself out.
+
+        Returns:
+            dict of title -> recommendation list
+        """
+        with self._lock:
+            known = [title for title in titles if title in self._rows]
+            if not known:
+                return {}
+
+            queries = self.embeddings[[self._rows[title] for title in known]]
+            batches = self.get_recommendations_batch(queries, top_k + 1)
+
+            return {
+                title: [rec for rec in recs if rec["title"] != title][:top_k]
+                for title, recs in zip(known, batches)
+            }
+
+    def save(self):
+        with self._lock:
+            if not self.store_dir:
+                return
+
+            os.makedirs(self.store_dir, exist_ok=True)
+
+            np.save(os.path.join(self.store_dir, "embeddings.tmp.npy"), self.embeddings)
+            with open(os.path.join(self.store_dir, "titles.json.tmp"), "w") as f:
+                json.dump(self.titles, f)
+
+            os.replace(
+                os.path.join(self.store_dir, "embeddings.tmp.npy"),
+                os.path.join(self.store_dir, "embeddings.npy")
+            )
+            os.replace(
+                os.path.join(self.store_dir, "titles.json.tmp"),
+                os.path.join(self.store_dir, "titles.json")
+            )
+
+    def reset(self):
+        """
+        Remove every paper, also from disk.
+        """
+        with self._lock:
+            self.titles = []
+            self._rows = {}
+            self._matrix = None
+            self._count = 0
+            self._faiss_index = None
+
+            if self.store_dir:
+                for name in ("titles.json", "embeddings.npy"):
+                    path = os.path.join(self.store_dir, name)
+                    if os.path.exists(path):
+                        os.remove(path)
 
-        embeddings = np.array([p["embedding"] for p in self.paper_store])
-        titles = [p["title"] for p in self.paper_store]
+    def load(self):
+        with self._lock:
+            with open(os.path.join(self.store_dir, "titles.json")) as f:
+                titles = json.load(f)
 
-        # Compute similarity
-        similarities = cosine_similarity(
-            [query_embedding], embeddings
-        )[0]
+            embeddings = np.load(os.path.join(self.store_dir, "embeddings.npy"))
 
-        # Sort by similarity
-        ranked_indices = np.argsort(similarities)[::-1]
+            # Both files are replaced separately; trust the shorter one
+            count = min(len(titles), len(embeddings))
 
-        recommendations = []
-        for idx in ranked_indices[:top_k]:
-            recommendations.append({
-                "title": titles[idx],
-                "score": float(similarities[idx])
-            })
+            self.titles = titles[:count]
+            self._rows = {title: row for row, title in enumerate(self.titles)}
+            self._matrix = None
+            self._count = 0
+            self._faiss_index = None
 
-        return recommendations
+            if count:
+                self._ensure_capacity(embeddings.shape[1], count)
+                self._matrix[:count] = embeddings[:count]
+                self._count = count
@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+class SharedResources:
+    """
+    Process-wide registry of expensive objects (models, indexes).
+
+    Each resource is built by its factory on first get(), once per
+    process, and then shared by every caller (e.g. all Streamlit
+    sessions). warm_up() builds resources in a background thread so
+    the first request doesn't pay for them; a get() that arrives
+    during the warm-up waits for it instead of building twice.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+        # name -> seconds spent building it
+        self.timings = {}
+        self.errors = {}
+
+        self._warming = set()
+
+    def register(self, name, factory):
+        """
+        Register a factory. Re-registering a name keeps the first one,
+        so this can run on every Streamlit rerun.
+        """
+        with self._lock:
+            if name not in self._factories:
+                self._factories[name] = factory
+                self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        value = self._values.get(name)
+        if value is not None:
+            return value
+
+        with self._locks[name]:
+            if name not in self._values:
+                start = time.perf_counter()
+                self._values[name] = self._factories[name]()
+                self.timings[name] = time.perf_counter() - start
+
+        return self._values[name]
+
+    def is_ready(self, name):
+        return name in self._values
+
+    def warm_up(self, *names):
+        """
+        Build the named resources (all registered ones by default) in a
+        daemon thread. Resources already built or warming up are
+        skipped. Returns the thread, or None if there was nothing to do.
+        """
+        with self._lock:
+            names = [
+                name for name in names or self._factories
+                if name not in self._values and name not in self._warming
+            ]
+            self._warming.update(names)
+
+        if not names:
+            return None
+
+        def build():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    # Surfaced again by the get() that actually needs it
+                    self.errors[name] = str(e)
+
+        thread = threading.Thread(target=build, daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """
+        Build time of every registered resource (None = not built yet).
+        """
+        return {name: self.timings.get(name) for name in self._factories}
+
+
+class KeyedResources:
+    """
+    One object per key (e.g. per index namespace), built by factory(key)
+    on first use and shared by every caller afterwards.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self._values.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self._factory(key)
+
+        return self._values[key]
+
+
+# Shared by everything imported into one process
+resources = SharedResources()
@@ -1,44 +1,245 @@
-import requests
-import json
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.disk_cache import DiskCache
+from models.lazy import lazy_import
+from models.metrics import metrics, timed
+
+requests = lazy_import("requests")
+
+
+DEFAULT_BASE_URL = "https://api.scaledown.xyz/compress/raw/"
+
+CONTEXT = "You are a scientific summarization engine. Return only the compressed version of the input text."
+
+# Responses worth retrying; other HTTP errors are raised immediately
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a token is free.
+    Tokens refill at `rate` per second up to `capacity` (the burst size).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
 
 class ScaleDownClient:
-    def __init__(self, api_key):
+    def __init__(
+        self,
+        api_key,
+        base_url=None,
+        max_concurrency=8,
+        requests_per_second=10,
+        max_retries=5,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        timeout=(5, 60),
+        cache_path="data/scaledown_cache/responses.db"
+    ):
+        """
+        Client for the ScaleDown compression API.
+
+        Requests go through one pooled HTTP session, are rate limited by a
+        token bucket shared by all threads and retried with exponential
+        backoff on 429 / 5xx / connection errors. Successful compressions
+        are cached on disk by a hash of the endpoint and the chunk, so
+        recompressing a paper makes no requests.
+
+        Parameters:
+            base_url (str): API endpoint; defaults to $SCALEDOWN_BASE_URL
+                or the public API (point it at a local stub for testing)
+            max_concurrency (int): parallel requests in compress_many
+            requests_per_second (float): rate limit (None = unlimited)
+            max_retries (int): retries per chunk before giving up
+            backoff_base / backoff_max (float): retry delays in seconds
+            timeout: requests timeout, (connect, read)
+            cache_path (str): response cache file (None disables it)
+        """
         self.api_key = api_key.strip()
-        self.base_url = "https://api.scaledown.xyz/compress/raw/"
+        self.base_url = base_url or os.environ.get("SCALEDOWN_BASE_URL", DEFAULT_BASE_URL)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
 
-    def compress_paper(self, text):
-    
-        headers = {
-            "x-api-key": self.api_key.strip(),
+        self.session = requests.Session()
+        self.session.headers.update({
+            "x-api-key": self.api_key,
             "Content-Type": "application/json"
-        }
-    
-        payload = {
-            "context": "You are a scientific summarization engine. Return only the compressed version of the input text.",
-            "prompt": text,
-            "scaledown": {
-                "rate": "auto"
-            }
-        }
-    
-        response = requests.post(
-            self.base_url,
-            headers=headers,
-            json=payload,   # better than data=json.dumps()
-            timeout=60
-        )
-    
-        response.raise_for_status()
-    
-        result = response.json()
-    
+        })
+
+        # One connection per worker thread, kept alive between chunks
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+
+        self.cache = DiskCache(cache_path) if cache_path else None
+
+        self.requests_sent = 0
+        self.retries = 0
+
+    def _cache_key(self, text):
+        # Different endpoints (e.g. a local stub) may compress differently
+        payload = f"{self.base_url}\x00{CONTEXT}\x00auto\x00{text}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _backoff(self, attempt, response=None):
+        # Honour Retry-After (in seconds) when the server sends one
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    @timed("scaledown.request")
+    def _post(self, payload):
+        """
+        POST with rate limiting and retries.
+        Returns the parsed JSON, or None once the retries are used up.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            response = None
+            try:
+                self.requests_sent += 1
+                response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
+
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                metrics.count("scaledown.retries")
+                time.sleep(self._backoff(attempt, response))
+
+        return None
+
+    def _parse(self, result):
         # Proper parsing based on actual API structure
-        if result.get("successful"):
+        if result and result.get("successful"):
             results_block = result.get("results", {})
             if results_block.get("success"):
                 compressed_text = results_block.get("compressed_prompt")
 
-                if compressed_text and compressed_text.strip() != payload["context"]:
+                if compressed_text and compressed_text.strip() != CONTEXT:
                     return compressed_text
-    
+
         return None
+
+    def _compress_uncached(self, text):
+        payload = {
+            "context": CONTEXT,
+            "prompt": text,
+            "scaledown": {
+                "rate": "auto"
+            }
+        }
+
+        result = self._post(payload)
+        compressed = self._parse(result)
+
+        # Only successful compressions are cached; failures are retried
+        # the next time the chunk is compressed
+        if compressed is not None and self.cache is not None:
+            self.cache.put(self._cache_key(text), compressed.encode("utf-8"))
+
+        return compressed
+
+    def compress_paper(self, text):
+        """
+        Compress one chunk of text.
+
+        Returns:
+            compressed text, or None if the API gave no usable result
+        """
+        return self.compress_many([text])[0]
+
+    @timed("scaledown.compress")
+    def compress_many(self, texts, progress=None):
+        """
+        Compress chunks concurrently (at most max_concurrency requests in
+        flight). Cached and duplicate chunks are not sent again.
+
+        Parameters:
+            progress (callable): called as progress(done, total)
+
+        Returns:
+            list with the compressed text (or None) of each chunk, in order
+        """
+        results = {}
+        keys = [self._cache_key(text) for text in texts]
+
+        if self.cache is not None:
+            for key, value in self.cache.get_many(keys).items():
+                # Empty entries are failures cached by older versions
+                if value:
+                    results[key] = value.decode("utf-8")
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in missing:
+                missing[key] = text
+
+        total = len(missing)
+        if progress:
+            progress(0, total)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                futures = {key: pool.submit(self._compress_uncached, text) for key, text in missing.items()}
+
+                try:
+                    for done, (key, future) in enumerate(futures.items(), start=1):
+                        results[key] = future.result()
+                        if progress:
+                            progress(done, total)
+                except Exception:
+                    # e.g. an invalid API key: don't send the remaining chunks
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+
+        return [results[key] for key in keys]
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU map with hit/miss counters.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+
+            if value is _MISSING:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class SearchCache:
+    """
+    Caches for the search tab, shared by all sessions:
+
+    - query embeddings, so a repeated query skips the transformer
+    - search results, keyed by the query, the search options and the
+      index version. Every add / remove / reset changes the version
+      (VectorEngine.version), so results of an older index are never
+      returned; they simply age out of the LRU.
+
+    Cached values are shared, callers must not modify them.
+    """
+
+    def __init__(self, encoder, query_entries=4096, result_entries=4096):
+        """
+        Parameters:
+            encoder: TextEncoder (anything with encode_query)
+            query_entries / result_entries (int): LRU sizes
+        """
+        self.encoder = encoder
+        self.embeddings = LRUCache(query_entries)
+        self.results = LRUCache(result_entries)
+
+    def embed(self, query, normalize=True):
+        """
+        encode_query(), memoized.
+        """
+        key = (query, normalize)
+        vector = self.embeddings.get(key)
+
+        if vector is None:
+            vector = self.encoder.encode_query(query, normalize=normalize)
+            vector.setflags(write=False)
+            self.embeddings.put(key, vector)
+
+        return vector
+
+    def search(self, key, version, run):
+        """
+        Returns run() for this key and index version, computing it only
+        on a miss.
+
+        Parameters:
+            key (tuple): everything the results depend on besides the
+                index, e.g. (namespace, mode, query, k)
+            version: the index version (VectorEngine.version)
+            run (callable): performs the search
+        """
+        full_key = (key, version)
+        results = self.results.get(full_key)
+
+        if results is None:
+            results = run()
+            self.results.put(full_key, results)
+
+        return results
+
+    def invalidate(self):
+        """
+        Drop all cached results (embeddings stay valid).
+        """
+        self.results.clear()
+
+    def stats(self):
+        return {
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
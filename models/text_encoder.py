@@ -1,48 +1,199 @@
-from sentence_transformers import SentenceTransformer
+import hashlib
+import os
+import threading
 import numpy as np
-import torch
+
+from models.disk_cache import DiskCache
+from models.metrics import timed
+from models.micro_batcher import MicroBatcher
+from models.quantization import check_precision, quantize, truncate
 
 
 class TextEncoder:
     _instance = None
     _model = None
+    _model_name = None
+    _cache = None
+    _query_batchers = {}
+    _batcher_lock = threading.Lock()
+    # Held while the model loads, so concurrent first calls (e.g. a
+    # background warm-up and a request) load it once
+    _init_lock = threading.Lock()
+
+    def __new__(
+        cls,
+        model_name="all-mpnet-base-v2",
+        cache_dir="data/embedding_cache",
+        cache_size=500_000
+    ):
+        if cls._instance is not None:
+            return cls._instance
+
+        with cls._init_lock:
+            if cls._instance is None:
+                # Imported here: torch alone takes seconds to import
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                instance = super(TextEncoder, cls).__new__(cls)
 
-    def __new__(cls, model_name="all-mpnet-base-v2"):
-        if cls._instance is None:
-            cls._instance = super(TextEncoder, cls).__new__(cls)
+                print("Loading Embedding Model (MiniLM)...")
 
-            print("Loading Embedding Model (MiniLM)...")
+                device = "cuda" if torch.cuda.is_available() else "cpu"
 
-            device = "cuda" if torch.cuda.is_available() else "cpu"
+                cls._model = SentenceTransformer(model_name, device=device)
+                cls._model_name = model_name
 
-            cls._model = SentenceTransformer(model_name, device=device)
+                # Content-addressed embedding cache (None disables it)
+                if cache_dir:
+                    cls._cache = DiskCache(
+                        os.path.join(cache_dir, "embeddings.db"),
+                        max_entries=cache_size
+                    )
+
+                cls._instance = instance
 
         return cls._instance
 
-    def encode(self, texts, normalize=True):
+    def _cache_key(self, text, normalize):
+        payload = f"{self._model_name}\x00{int(normalize)}\x00{text}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _encode_uncached(self, texts, normalize):
+        embeddings = self._model.encode(
+            texts,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / (norms + 1e-10)
+
+        return embeddings.astype("float32")
+
+    @timed("encoder.encode")
+    def encode(
+        self,
+        texts,
+        normalize=True,
+        use_cache=True,
+        precision="float32",
+        truncate_dim=None
+    ):
         """
         Convert text(s) to embeddings.
-        
+
         Parameters:
             texts (str or list[str])
             normalize (bool): L2 normalize embeddings (recommended for cosine similarity)
+            use_cache (bool): look chunks up in the embedding cache and
+                only run the model on misses
+            precision (str): "float32", "float16" or "int8" (see
+                models.quantization.quantize)
+            truncate_dim (int): keep only the first truncate_dim components
+                (Matryoshka-style), re-normalized if normalize is set
 
         Returns:
             np.ndarray
         """
+        check_precision(precision)
+
+        embeddings = self._encode_float32(texts, normalize, use_cache)
+
+        if truncate_dim:
+            embeddings = truncate(embeddings, truncate_dim, normalize)
+
+        return quantize(embeddings, precision)
+
+    def _encode_float32(self, texts, normalize, use_cache):
+        # The cache always holds full float32 vectors, shared by all precisions
 
         # Allow single string input
         if isinstance(texts, str):
             texts = [texts]
 
-        embeddings = self._model.encode(
-            texts,
-            show_progress_bar=False,
-            convert_to_numpy=True
+        if not texts:
+            dim = self._model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype="float32")
+
+        if not use_cache or self._cache is None:
+            return self._encode_uncached(texts, normalize)
+
+        keys = [self._cache_key(text, normalize) for text in texts]
+        cached = self._cache.get_many(keys)
+
+        # Encode each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            fresh = self._encode_uncached(list(missing.values()), normalize)
+            new_items = []
+
+            for key, vector in zip(missing.keys(), fresh):
+                cached[key] = vector.tobytes()
+                new_items.append((key, cached[key]))
+
+            self._cache.put_many(new_items)
+
+        return np.vstack([
+            np.frombuffer(cached[key], dtype="float32") for key in keys
+        ])
+
+    @property
+    def max_tokens(self):
+        """
+        Tokens of text the model reads per input (its window minus the
+        special tokens); longer inputs are truncated.
+        """
+        return self._model.max_seq_length - 2
+
+    def token_lengths(self, texts):
+        """
+        Number of model tokens in each text, from one batched call of
+        the (fast) tokenizer.
+        """
+        encoded = self._model.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            verbose=False
         )
+        return [len(ids) for ids in encoded["input_ids"]]
 
-        if normalize:
-            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-            embeddings = embeddings / (norms + 1e-10)
+    def encode_query(self, text, normalize=True):
+        """
+        Encode a single query. Concurrent calls (e.g. from several
+        Streamlit sessions) are coalesced into one batched model call.
+
+        Returns:
+            np.ndarray of shape (dimension,)
+        """
+        with self._batcher_lock:
+            batcher = self._query_batchers.get(normalize)
+
+            if batcher is None:
+                # Queries are rarely repeated chunk texts, so skip the disk cache
+                batcher = MicroBatcher(
+                    lambda texts: self._encode_uncached(texts, normalize),
+                    max_batch_size=64,
+                    max_wait=0.005
+                )
+                self._query_batchers[normalize] = batcher
+
+        return batcher(text)
+
+    def cache_stats(self):
+        """
+        Returns hit/miss counters of the embedding cache.
+        """
+        if self._cache is None:
+            return {"hits": 0, "misses": 0, "entries": 0}
 
-        return embeddings
+        return {
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "entries": len(self._cache),
+        }
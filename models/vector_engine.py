@@ -1,61 +1,1311 @@
-import faiss
+import itertools
+import json
 import numpy as np
 import os
 import pickle
+import threading
+
+from models.bm25_index import BM25Index, reciprocal_rank_fusion, weighted_fusion
+from models.chunk_store import ChunkStore
+from models.dedup import NearDuplicateIndex, minhash_signatures
+from models.lazy import lazy_import
+from models.metrics import metrics, timed
+from models.quantization import PRECISIONS, to_float32
+
+faiss = lazy_import("faiss")
+
+
+# Supported values for VectorEngine(index_type=...)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Supported values for VectorEngine(storage=...) and (reduction=...)
+STORAGE_TYPES = PRECISIONS
+REDUCTIONS = ("pca", "truncate")
+
+# FAISS codec of the stored vectors for each storage type
+STORAGE_CODECS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# Source of VectorEngine.version values, unique within the process
+_versions = itertools.count(1)
+
+# Keys of a search filter (see VectorEngine.filter_mask)
+FILTER_KEYS = ("source", "section", "page", "year")
+
+# On IVF / HNSW indexes, filters matching at most this many chunks are
+# scored exactly on the stored vectors instead of scanning the index
+EXACT_FILTER_LIMIT = 2048
 
 
 class VectorEngine:
-    def __init__(self, dimension=768):
+    """
+    FAISS index over chunk embeddings, with chunk texts, sources and
+    full-precision vectors kept in a ChunkStore. Vector ids in the index
+    are chunk ids in the store, so they stay stable across deletes.
+
+    Persistence is incremental: save_index() only appends new chunks and
+    tombstones to the store, which acts as a write-ahead log. The FAISS
+    index file is a snapshot covering the first `indexed` chunks; on load
+    the tail of the log is replayed into it. compact() writes a fresh
+    snapshot, in the background once the tail grows large.
+
+    The index itself can hold compressed vectors (float16 / int8 scalar
+    quantization, PCA or truncation to fewer dimensions) while the chunk
+    store keeps the full-precision ones on disk. Searches on a compressed
+    index fetch `rerank` times more candidates and re-score them exactly
+    against the stored vectors.
+
+    Long documents can also get one summary vector per section
+    (add_sections); hierarchical_search then finds the best sections
+    first and only scores the chunks inside them.
+
+    Every chunk can carry metadata (pages, section, year, see
+    ChunkStore). Searches accept a filter on it (see filter_mask), which
+    is turned into a bitmap ID selector that FAISS checks during the
+    scan, so filtered queries still return k results and cost about as
+    much as unfiltered ones.
+
+    With dedupe=True, add_documents skips chunks that are near duplicates
+    (by MinHash LSH over word shingles) of a stored chunk, e.g. of a
+    preprint and its published version. Whole files can be registered by content hash
+    (register_file / indexed_file) so they are not processed twice.
+
+    On disk (inside index_dir):
+        manifest.json       index settings and what the snapshot covers
+        index.<n>.bin       the current FAISS snapshot
+        bm25.npz            BM25 keyword index snapshot (see BM25Index)
+        centroids.npz       per-source vector sums and chunk counts
+        files.json          content hash -> source of registered files
+        chunk store files   see ChunkStore
+        sections/           section vectors (a VectorEngine) and members.json
+    """
+
+    def __init__(
+        self,
+        dimension=768,
+        index_type="flat",
+        nlist=1024,
+        pq_m=64,
+        hnsw_m=32,
+        nprobe=16,
+        ef_search=64,
+        storage="float32",
+        reduce_dim=None,
+        reduction="pca",
+        rerank=4,
+        index_dir="data/faiss_index",
+        compact_min=10_000,
+        compact_ratio=0.25,
+        dedupe=False,
+        dedupe_bands=4
+    ):
+        """
+        Parameters:
+            index_type (str): "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw"
+            nlist (int): number of IVF cells
+            pq_m (int): PQ sub-quantizers (must divide dimension)
+            hnsw_m (int): HNSW graph degree
+            nprobe / ef_search (int): default search-time accuracy knobs
+            storage (str): precision of the vectors held in the index,
+                "float32", "float16" or "int8" (not for ivf_pq, which
+                has its own compression)
+            reduce_dim (int): store only this many dimensions in the index
+            reduction (str): how reduce_dim is reached, "pca" (trained
+                projection) or "truncate" (first components, for
+                Matryoshka-style models)
+            rerank (int): on compressed indexes, re-score rerank * k
+                candidates with the full-precision vectors (0 = off)
+            index_dir (str): where the index is persisted (None = memory only)
+            compact_min / compact_ratio: save_index() starts a background
+                compaction once the unsnapshotted tail has more than
+                compact_min changes and more than compact_ratio * snapshot size
+            dedupe (bool): skip near-duplicate chunks in add_documents
+            dedupe_bands (int): MinHash bands (of 16) two chunks must
+                share to count as near duplicates
+        """
+        self._check_options(index_type, storage, reduction)
+
         self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)
-        self.texts = []
-        self.sources = []
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.storage = storage
+        self.reduce_dim = reduce_dim
+        self.reduction = reduction
+        self.rerank = rerank
+        self.index_dir = index_dir
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.dedupe = dedupe
+        self.dedupe_bands = dedupe_bands
+
+        self._lock = threading.RLock()
+
+        # Changes whenever the searchable content changes; a cache key
+        # for search results (see SearchCache). Never reused in a process.
+        self.version = next(_versions)
+        self._compact_lock = threading.Lock()
+
+        # What the snapshot on disk covers (None = no valid snapshot)
+        self._manifest = None
+        # Bumped whenever the index is replaced wholesale (reset, rebuild),
+        # so a compaction of the old one does not publish its snapshot
+        self._epoch = 0
+        # Snapshot file names are never reused, even after reset()
+        self._generation = 0
+        self._snapshot_file = None
+
+        self.index = self._build_index()
+        # True while self.index is the exact stand-in that holds the
+        # vectors until there are enough to train the real one
+        self._buffered = False
+
+        # Chunk texts, sources and vectors, looked up lazily by vector id
+        self.store = ChunkStore(index_dir, dimension)
+
+        # Keyword index over the same chunk ids
+        self.bm25 = BM25Index()
+
+        # Section summary vectors for hierarchical_search, opened on first use
+        self._sections = None
+        # section id -> ids of its chunks
+        self._members = {}
+
+        # source -> sum and number of its chunk vectors (paper centroids)
+        self._centroid_sums = {}
+        self._centroid_counts = {}
+
+        # MinHash signatures of the live chunks, built on first use
+        self._duplicate_index = None
+
+        # sha256 of a registered file -> its source name
+        self._files = {}
+        self._files_changed = False
+
+        # field -> (version, store column), for filter_mask
+        self._columns = {}
 
         # Load existing index if available
-        if os.path.exists("data/faiss_index/index.bin"):
+        if index_dir and (
+            os.path.exists(self._path("manifest.json"))
+            or os.path.exists(self._path("index.bin"))
+        ):
             self.load_index()
 
-    def add_documents(self, vectors, texts, source):
-        vectors = np.array(vectors).astype("float32")
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
 
-        self.index.add(vectors)
+    @staticmethod
+    def _check_options(index_type, storage, reduction):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type {index_type!r}, expected one of {INDEX_TYPES}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage {storage!r}, expected one of {STORAGE_TYPES}")
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction {reduction!r}, expected one of {REDUCTIONS}")
+        if index_type == "ivf_pq" and storage != "float32":
+            raise ValueError("ivf_pq already compresses vectors; use storage='float32'")
 
-        for text in texts:
-            self.texts.append(text)
-            self.sources.append(source)
+    def _factory_string(self):
+        codec = STORAGE_CODECS[self.storage]
 
-    def search(self, query_vector, k=3):
-        query_vector = np.array([query_vector]).astype("float32")
+        if self.index_type == "ivf_flat":
+            factory = f"IVF{self.nlist},{codec}"
+        elif self.index_type == "ivf_pq":
+            factory = f"IVF{self.nlist},PQ{self.pq_m}"
+        elif self.index_type == "hnsw":
+            factory = f"HNSW{self.hnsw_m}" if codec == "Flat" else f"HNSW{self.hnsw_m},{codec}"
+        else:
+            factory = codec
 
-        distances, indices = self.index.search(query_vector, k)
+        if self.reduce_dim and self.reduction == "pca":
+            factory = f"PCA{self.reduce_dim},{factory}"
 
-        results = []
+        return factory
 
-        for score, idx in zip(distances[0], indices[0]):
-            if idx < len(self.texts):
-                results.append({
-                    "text": self.texts[idx],
-                    "score": float(score),
-                    "source": self.sources[idx]
-                })
+    def _build_index(self):
+        truncating = self.reduce_dim and self.reduction == "truncate"
+
+        index = faiss.index_factory(
+            self.reduce_dim if truncating else self.dimension,
+            self._factory_string(),
+            faiss.METRIC_INNER_PRODUCT
+        )
+
+        if truncating:
+            # Keep the first reduce_dim components, then re-normalize
+            index = faiss.IndexPreTransform(index)
+            index.prepend_transform(faiss.NormalizationTransform(self.reduce_dim, 2.0))
+            index.prepend_transform(
+                faiss.RemapDimensionsTransform(self.dimension, self.reduce_dim, False)
+            )
+
+        if self._stores_ids():
+            return index
+
+        return faiss.IndexIDMap(index)
+
+    def _stores_ids(self):
+        # IVF lists keep the ids they were given. An IndexIDMap on top
+        # would renumber its entries after remove_ids, which IVF does not do
+        return self.index_type in ("ivf_flat", "ivf_pq")
+
+    def _build_buffer(self):
+        return faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+
+    def is_compressed(self):
+        """
+        True when the index holds lossy vectors and results are re-ranked.
+        """
+        return (
+            self.storage != "float32"
+            or bool(self.reduce_dim)
+            or self.index_type == "ivf_pq"
+        )
+
+    def supports_remove(self):
+        # HNSW graphs cannot drop nodes; deleted ids are filtered at search time
+        return self.index_type != "hnsw"
+
+    def min_training_size(self):
+        """
+        Number of vectors needed before an untrained index can be trained.
+        """
+        needed = 0
+        if self.index_type == "ivf_flat":
+            needed = self.nlist
+        elif self.index_type == "ivf_pq":
+            # Each PQ codebook has 256 centroids
+            needed = max(self.nlist, 256)
+
+        if self.storage == "int8":
+            # Per-dimension value ranges are estimated from the sample
+            needed = max(needed, 256)
+        if self.reduce_dim and self.reduction == "pca":
+            needed = max(needed, self.reduce_dim)
+
+        return needed
+
+    def train(self, vectors, sample_size=100_000, seed=0):
+        """
+        Train IVF / PQ / SQ8 quantizers and the PCA projection on (a
+        random sample of) vectors. Other indexes need no training.
+        """
+        if self._buffered:
+            # Swap the flat stand-in for the real index and move its vectors
+            with self._lock:
+                ids = self.store.live_ids()
+                self.index = self._build_index()
+                self._buffered = False
+                self.train(vectors, sample_size, seed)
+                if len(ids):
+                    self.index.add_with_ids(self.store.vectors(ids), ids)
+                self._invalidate_snapshot()
+            return
+
+        if self.index.is_trained:
+            return
+
+        vectors = to_float32(vectors)
+
+        if len(vectors) < self.min_training_size():
+            raise ValueError(
+                f"index_type {self.index_type!r} needs at least "
+                f"{self.min_training_size()} training vectors, got {len(vectors)}"
+            )
+
+        if len(vectors) > sample_size:
+            rng = np.random.default_rng(seed)
+            vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        self.index.train(vectors)
+
+    @timed("index.add")
+    def add_documents(self, vectors, texts, source, metadata=None):
+        """
+        Parameters:
+            metadata (list[dict]): optional, per chunk, any of
+                page_start, page_end, section and year (for filters)
+
+        Returns the ids assigned to the new chunks. With dedupe=True,
+        near-duplicate chunks are skipped and get id -1.
+        """
+        vectors = to_float32(vectors)
+        signatures = minhash_signatures(texts) if self.dedupe else None
+
+        with self._lock:
+            keep = None
+            if signatures is not None:
+                keep = self._near_duplicates().unique(signatures)
+
+                if not keep.all():
+                    metrics.count("index.duplicates_skipped", int((~keep).sum()))
+                    vectors = vectors[keep]
+                    texts = [text for text, kept in zip(texts, keep) if kept]
+                    signatures = signatures[keep]
+                    if metadata is not None:
+                        metadata = [item for item, kept in zip(metadata, keep) if kept]
+
+            ids = np.zeros(0, dtype="int64")
+
+            if len(texts):
+                ids = self.store.append(texts, source, vectors, signatures, metadata)
+
+                if not self.index.is_trained or (
+                    self._buffered and self.num_chunks() >= self.min_training_size()
+                ):
+                    # Trains the quantizers once there are enough vectors;
+                    # until then they are held in an exact flat index
+                    self._rebuild()
+                else:
+                    self.index.add_with_ids(vectors, ids)
+                self.bm25.add(ids, texts)
+                self._update_centroid(source, vectors.sum(axis=0), len(vectors))
+                self.version = next(_versions)
+
+                if signatures is not None:
+                    self._duplicate_index.add(ids, signatures)
+
+        metrics.count("index.chunks_added", len(ids))
+
+        if keep is not None and not keep.all():
+            all_ids = np.full(len(keep), -1, dtype="int64")
+            all_ids[keep] = ids
+            return all_ids
+
+        return ids
+
+    def remove_document(self, source):
+        """
+        Delete every chunk of one source. Costs O(chunks of that source)
+        in the index; the deletion is persisted by the next save_index().
+        Returns the number of chunks removed.
+        """
+        with self._lock:
+            # A file whose chunks were all duplicates has no chunks left
+            self._forget_files(source)
+
+            ids = self.store.ids_for_source(source)
+            if not len(ids):
+                return 0
+
+            if self.supports_remove():
+                self.index.remove_ids(faiss.IDSelectorBatch(ids))
+
+            self.store.delete(ids)
+            self._centroid_sums.pop(source, None)
+            self._centroid_counts.pop(source, None)
+            self.version = next(_versions)
+
+            if self._duplicate_index is not None:
+                self._duplicate_index.remove(ids)
+
+            if self._has_sections():
+                sections = self._section_index()
+                for section_id in sections.store.ids_for_source(source).tolist():
+                    self._members.pop(section_id, None)
+                sections.remove_document(source)
+
+        return len(ids)
+
+    # ---------- duplicates ----------
+
+    def _near_duplicates(self):
+        if self._duplicate_index is None:
+            index = NearDuplicateIndex(self.dedupe_bands)
+            ids = self.store.live_ids()
+            index.add(ids, self.store.signatures(ids))
+            self._duplicate_index = index
+
+        return self._duplicate_index
+
+    def register_file(self, digest, source):
+        """
+        Record that the file with this content hash (see
+        models.dedup.file_hash) was indexed as source. Forgotten when
+        the source is removed. Persisted by save_index().
+        """
+        with self._lock:
+            self._files[digest] = source
+            self._files_changed = True
+
+    def indexed_file(self, digest):
+        """
+        Source under which a file with this content hash was indexed,
+        or None.
+        """
+        return self._files.get(digest)
+
+    def _forget_files(self, source):
+        digests = [digest for digest, name in self._files.items() if name == source]
+        for digest in digests:
+            del self._files[digest]
+        self._files_changed = self._files_changed or bool(digests)
+
+    def _save_files(self):
+        tmp_path = self._path("files.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._files, f)
+        os.replace(tmp_path, self._path("files.json"))
+        self._files_changed = False
+
+    # ---------- metadata filters ----------
+
+    def _column(self, field):
+        cached = self._columns.get(field)
+        if cached is None or cached[0] != self.version:
+            cached = (self.version, self.store.column(field))
+            self._columns[field] = cached
+        return cached[1]
+
+    def filter_mask(self, filter):
+        """
+        Boolean mask over chunk ids of the live chunks matching a filter.
+
+        Parameters:
+            filter (dict): any of
+                "source": a source name or a list of them
+                "section": a section title or a list of them
+                "page": a page or an inclusive (first, last) range; chunks
+                    overlapping it match
+                "year": a year, a list of years or an inclusive
+                    (first, last) range; None leaves a range end open
+                All given keys must match. Chunks without the value
+                (e.g. no year found) never match that key.
+
+        Returns:
+            numpy bool array of length len(store)
+        """
+        unknown = set(filter) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys {sorted(unknown)}, expected some of {FILTER_KEYS}")
+
+        mask = np.ones(len(self.store), dtype=bool)
+
+        for field, lookup in (("source", self.store.source_code), ("section", self.store.section_code)):
+            if filter.get(field) is None:
+                continue
+
+            names = filter[field]
+            if isinstance(names, str):
+                names = [names]
+
+            codes = [code for code in map(lookup, names) if code is not None]
+            mask &= np.isin(self._column(field), codes)
+
+        if filter.get("page") is not None:
+            first, last = self._bounds(filter["page"])
+            page_start = self._column("page_start")
+            page_end = self._column("page_end")
+
+            mask &= page_start >= 0
+            if last is not None:
+                mask &= page_start <= last
+            if first is not None:
+                mask &= page_end >= first
+
+        if filter.get("year") is not None:
+            years = self._column("year")
+            value = filter["year"]
+
+            if isinstance(value, list):
+                mask &= np.isin(years, value)
+            else:
+                first, last = self._bounds(value)
+                mask &= years >= 0
+                if first is not None:
+                    mask &= years >= first
+                if last is not None:
+                    mask &= years <= last
+
+        if self.store.num_deleted():
+            mask[self.store.deleted_ids()] = False
+
+        return mask
+
+    @staticmethod
+    def _bounds(value):
+        if isinstance(value, tuple):
+            first, last = value
+            return first, last
+        return value, value
+
+    def sources(self):
+        """
+        Names of the sources that have live chunks, sorted.
+        """
+        return sorted(self._centroid_counts)
+
+    # ---------- paper centroids ----------
+
+    def _update_centroid(self, source, vector_sum, count):
+        if source in self._centroid_counts:
+            self._centroid_sums[source] = self._centroid_sums[source] + vector_sum
+            self._centroid_counts[source] += count
+        else:
+            self._centroid_sums[source] = np.asarray(vector_sum, dtype="float32")
+            self._centroid_counts[source] = count
+
+        if self._centroid_counts[source] <= 0:
+            del self._centroid_sums[source]
+            del self._centroid_counts[source]
+
+    def _accumulate_centroids(self, ids, sign=1, batch_size=65_536):
+        """
+        Add (sign=1) or subtract (sign=-1) stored chunks to / from their
+        sources' centroids. Used when replaying the log on load.
+        """
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            vectors = self.store.vectors(batch)
+
+            positions = {}
+            for position, idx in enumerate(batch.tolist()):
+                positions.setdefault(self.store.source(idx), []).append(position)
+
+            for source, rows in positions.items():
+                self._update_centroid(source, sign * vectors[rows].sum(axis=0), sign * len(rows))
+
+    def get_paper_embedding(self, source, normalize=True):
+        """
+        Mean vector of one source's chunks, kept up to date on every add
+        and remove, so this is O(1). Returns None for unknown sources.
+        """
+        vector_sum = self._centroid_sums.get(source)
+        if vector_sum is None:
+            return None
+
+        centroid = vector_sum / self._centroid_counts[source]
+
+        if normalize:
+            centroid = centroid / (np.linalg.norm(centroid) + 1e-10)
+
+        return centroid.astype("float32")
+
+    def chunk_count(self, source):
+        return self._centroid_counts.get(source, 0)
+
+    # ---------- sections ----------
+
+    def _has_sections(self):
+        return self._sections is not None or (
+            self.index_dir is not None and os.path.isdir(self._path("sections"))
+        )
+
+    def _section_index(self):
+        with self._lock:
+            if self._sections is None:
+                directory = self._path("sections") if self.index_dir else None
+                self._sections = VectorEngine(dimension=self.dimension, index_dir=directory)
+
+                if directory and os.path.exists(os.path.join(directory, "members.json")):
+                    with open(os.path.join(directory, "members.json")) as f:
+                        self._members = {
+                            int(section_id): np.array(ids, dtype="int64")
+                            for section_id, ids in json.load(f).items()
+                        }
+
+            return self._sections
+
+    def add_sections(self, vectors, titles, source, members):
+        """
+        Add summary vectors for the sections of one document.
+
+        Parameters:
+            vectors: (n, dimension) section vectors, e.g. the normalized
+                mean of each section's chunk vectors
+            titles (list[str]): section titles
+            members (list): chunk ids of each section
+        """
+        with self._lock:
+            ids = self._section_index().add_documents(vectors, titles, source)
+            self.version = next(_versions)
+
+            for section_id, chunk_ids in zip(ids.tolist(), members):
+                self._members[section_id] = np.asarray(chunk_ids, dtype="int64")
+
+        return ids
+
+    def search_within(self, query_vector, ids, k=3, filter=None):
+        """
+        Exact search restricted to the given chunk ids, scored on the
+        full-precision stored vectors.
+        """
+        query = to_float32(query_vector).reshape(-1)
+        ids = np.asarray(ids, dtype="int64")
+
+        if filter:
+            ids = ids[self.filter_mask(filter)[ids]]
+        elif self.store.num_deleted():
+            ids = ids[~np.isin(ids, self.store.deleted_ids())]
+
+        scores = self.store.vectors(ids) @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+
+        return [
+            {
+                "id": int(ids[i]),
+                "text": self.store.text(ids[i]),
+                "score": float(scores[i]),
+                "source": self.store.source(ids[i])
+            }
+            for i in top
+        ]
+
+    def hierarchical_search(self, query_vector, k=3, sections=5, filter=None):
+        """
+        Two-level search: the `sections` most similar section vectors,
+        then the best k chunks inside them. Falls back to search() when
+        no sections were added, or when no chunk of the best sections
+        matches the filter.
+
+        Returns:
+            list of results like search(), plus the chunk's "section"
+        """
+        if not self._has_sections():
+            return self.search(query_vector, k, filter=filter)
+
+        # Section vectors carry their document's source, nothing else
+        section_filter = None
+        if filter and filter.get("source") is not None:
+            section_filter = {"source": filter["source"]}
+
+        top = self._section_index().search(query_vector, sections, filter=section_filter)
+        top = [section for section in top if section["id"] in self._members]
+
+        titles = {}
+        for section in top:
+            for chunk_id in self._members[section["id"]].tolist():
+                titles[chunk_id] = section["text"]
+
+        results = self.search_within(query_vector, list(titles), k, filter) if titles else []
+        if not results:
+            return self.search(query_vector, k, filter=filter)
+
+        for result in results:
+            result["section"] = titles[result["id"]]
 
         return results
 
+    def _search_params(self, nprobe=None, ef_search=None, mask=None):
+        selector = None
+
+        if mask is not None:
+            # One bit per chunk id; FAISS skips ids whose bit is unset
+            # while scanning (mask already leaves out deleted chunks)
+            bits = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+            selector._bits = bits
+        elif not self.supports_remove() and self.store.num_deleted():
+            # Deleted chunks still in an HNSW graph are skipped during the scan
+            selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(self.store.deleted_ids()))
+
+        if self._buffered:
+            # The stand-in is flat; only the selector applies
+            if selector is None:
+                return None
+            params = faiss.SearchParameters()
+        elif self.index_type in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        elif self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+
+        if selector is not None:
+            params.sel = selector
+            # Keep the selector alive as long as the params
+            params._selector = selector
+
+        return params
+
+    def _dense_search(self, queries, k, nprobe=None, ef_search=None, rerank=None, mask=None):
+        """
+        FAISS search, re-ranked on full-precision vectors when the index
+        is compressed. Returns (scores, ids) like index.search.
+        mask: optional boolean mask over chunk ids (see filter_mask)
+        """
+        if mask is not None and self.index_type != "flat":
+            ids = np.flatnonzero(mask)
+            if len(ids) <= EXACT_FILTER_LIMIT:
+                return self._exact_search(queries, ids, k)
+
+        # Nothing to search yet (an untrained index cannot be searched)
+        if self.index.ntotal == 0 or not self.index.is_trained:
+            return self._exact_search(queries, np.zeros(0, dtype="int64"), k)
+
+        rerank = self.rerank if rerank is None else rerank
+        fetch = k * rerank if rerank and self.is_compressed() else k
+
+        distances, indices = self.index.search(
+            queries,
+            fetch,
+            params=self._search_params(nprobe, ef_search, mask)
+        )
+
+        if fetch == k:
+            return distances, indices
+
+        return self._rerank(queries, indices, k)
+
+    def _exact_search(self, queries, ids, k):
+        """
+        Brute-force search over a few chunk ids on the stored vectors.
+        Used for small filters on approximate indexes, where the probed
+        IVF cells or the visited HNSW nodes may hold fewer than k of them.
+        """
+        scores = np.full((len(queries), k), -np.inf, dtype="float32")
+        indices = np.full((len(queries), k), -1, dtype="int64")
+
+        if not len(ids):
+            return scores, indices
+
+        all_scores = queries @ self.store.vectors(ids).T
+        top = min(k, len(ids))
+        if len(ids) > top:
+            candidates = np.argpartition(-all_scores, top - 1, axis=1)[:, :top]
+        else:
+            candidates = np.tile(np.arange(len(ids)), (len(queries), 1))
+
+        candidate_scores = np.take_along_axis(all_scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+
+        scores[:, :top] = np.take_along_axis(candidate_scores, order, axis=1)
+        indices[:, :top] = ids[np.take_along_axis(candidates, order, axis=1)]
+
+        return scores, indices
+
+    def _rerank(self, queries, indices, k):
+        scores = np.full(indices.shape, -np.inf, dtype="float32")
+        found = indices >= 0
+
+        # Read each candidate vector once, in id order
+        ids, inverse = np.unique(indices[found], return_inverse=True)
+        vectors = self.store.vectors(ids)
+        rows = np.nonzero(found)[0]
+        scores[found] = np.einsum("ij,ij->i", queries[rows], vectors[inverse])
+
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        indices[~np.isfinite(scores)] = -1
+
+        return scores, indices
+
+    @timed("index.search")
+    def search(self, query_vector, k=3, nprobe=None, ef_search=None, rerank=None, filter=None):
+        """
+        nprobe (IVF) and ef_search (HNSW) override the defaults for this
+        query only; higher values trade speed for recall. So does rerank
+        on compressed indexes. filter restricts the results to chunks
+        with matching metadata (see filter_mask).
+        """
+        return self._search_batch([query_vector], k, nprobe, ef_search, rerank, filter)[0]
+
+    @timed("index.search_batch")
+    def search_batch(self, queries, k=3, nprobe=None, ef_search=None, rerank=None, filter=None):
+        """
+        Search an (n, dimension) matrix of queries in one FAISS call.
+
+        Returns:
+            list with one result list per query
+        """
+        return self._search_batch(queries, k, nprobe, ef_search, rerank, filter)
+
+    def _search_batch(self, queries, k, nprobe, ef_search, rerank, filter):
+        # Untimed, so a search() isn't also counted as a search_batch()
+        queries = to_float32(queries).reshape(-1, self.dimension)
+        mask = self.filter_mask(filter) if filter else None
+
+        distances, indices = self._dense_search(queries, k, nprobe, ef_search, rerank, mask)
+
+        all_results = []
+
+        for row_scores, row_ids in zip(distances, indices):
+            results = []
+
+            for score, idx in zip(row_scores, row_ids):
+                if 0 <= idx < len(self.store):
+                    results.append({
+                        "id": int(idx),
+                        "text": self.store.text(idx),
+                        "score": float(score),
+                        "source": self.store.source(idx)
+                    })
+
+            all_results.append(results)
+
+        return all_results
+
+    @timed("index.hybrid_search")
+    def hybrid_search(
+        self,
+        query_vector,
+        query_text,
+        k=3,
+        method="rrf",
+        alpha=0.5,
+        candidates=100,
+        prefilter=False,
+        nprobe=None,
+        ef_search=None,
+        filter=None
+    ):
+        """
+        Combine BM25 keyword matches with dense similarity.
+
+        Parameters:
+            method (str): "rrf" (reciprocal rank fusion) or "weighted"
+            alpha (float): weight of the dense score for method="weighted"
+            candidates (int): results taken from each side before fusion
+            prefilter (bool): only score the BM25 candidates densely (exact
+                dot products on the stored vectors) instead of searching
+                the whole FAISS index. Falls back to dense search when no
+                keyword matches.
+            filter (dict): metadata filter for both sides (see filter_mask)
+
+        Returns:
+            list of results like search(), plus dense_score / keyword_score
+        """
+        query = to_float32(query_vector).reshape(-1)
+        mask = self.filter_mask(filter) if filter else None
+
+        if mask is not None:
+            sparse_ids, sparse_scores = self.bm25.search(query_text, candidates, include=mask)
+        else:
+            deleted = self.store.deleted_ids() if self.store.num_deleted() else None
+            sparse_ids, sparse_scores = self.bm25.search(query_text, candidates, exclude=deleted)
+
+        if prefilter and len(sparse_ids):
+            dense_ids = sparse_ids
+            dense_scores = self.store.vectors(sparse_ids) @ query
+            order = np.argsort(-dense_scores, kind="stable")
+            dense_ids, dense_scores = dense_ids[order], dense_scores[order]
+        else:
+            distances, indices = self._dense_search(
+                query[None, :], candidates, nprobe, ef_search, mask=mask
+            )
+            found = indices[0] >= 0
+            dense_ids, dense_scores = indices[0][found], distances[0][found]
+
+        dense = dict(zip(dense_ids.tolist(), dense_scores.tolist()))
+        sparse = dict(zip(sparse_ids.tolist(), sparse_scores.tolist()))
+
+        if method == "rrf":
+            fused = reciprocal_rank_fusion([dense_ids, sparse_ids])
+        elif method == "weighted":
+            fused = weighted_fusion(dense, sparse, alpha)
+        else:
+            raise ValueError(f"Unknown fusion method {method!r}, expected 'rrf' or 'weighted'")
+
+        top = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+        return [
+            {
+                "id": idx,
+                "text": self.store.text(idx),
+                "score": float(score),
+                "dense_score": dense.get(idx),
+                "keyword_score": sparse.get(idx),
+                "source": self.store.source(idx)
+            }
+            for idx, score in top
+        ]
+
+    def reconstruct_all(self):
+        """
+        Returns the full-precision vectors of every live chunk as an
+        (n, dimension) array.
+        """
+        return self.store.vectors(self.store.live_ids())
+
+    def migrate(self, index_type, **options):
+        """
+        Rebuild the index as another index type from the stored
+        full-precision vectors. The new index is trained on them.
+        """
+        self._check_options(
+            index_type,
+            options.get("storage", self.storage),
+            options.get("reduction", self.reduction)
+        )
+
+        with self._lock:
+            self.index_type = index_type
+            for name, value in options.items():
+                setattr(self, name, value)
+
+            self._rebuild()
+            self.version = next(_versions)
+
+    def num_chunks(self):
+        """
+        Number of live (not deleted) chunks, without listing them.
+        """
+        return len(self.store) - self.store.num_deleted()
+
+    def _rebuild(self):
+        ids = self.store.live_ids()
+        vectors = self.store.vectors(ids)
+
+        self._buffered = len(ids) < self.min_training_size()
+        self.index = self._build_buffer() if self._buffered else self._build_index()
+
+        if len(ids):
+            if not self._buffered:
+                self.train(vectors)
+            self.index.add_with_ids(vectors, ids)
+
+        # The old snapshot no longer matches; write a new one on save
+        self._invalidate_snapshot()
+
+    def _invalidate_snapshot(self):
+        self._manifest = None
+        self._epoch += 1
+
+    # ---------- persistence ----------
+
+    def _config(self):
+        return {
+            "dimension": self.dimension,
+            "index_type": self.index_type,
+            "nlist": self.nlist,
+            "pq_m": self.pq_m,
+            "hnsw_m": self.hnsw_m,
+            "nprobe": self.nprobe,
+            "ef_search": self.ef_search,
+            "storage": self.storage,
+            "reduce_dim": self.reduce_dim,
+            "reduction": self.reduction,
+            "rerank": self.rerank,
+        }
+
+    def _tail_size(self):
+        if self._manifest is None:
+            return len(self.store)
+
+        return (
+            len(self.store) - self._manifest["indexed"]
+            + self.store.num_deleted() - self._manifest["deletes_applied"]
+        )
+
+    @timed("index.save")
     def save_index(self):
-        os.makedirs("data/faiss_index", exist_ok=True)
+        """
+        Append new chunks and deletions to disk. The FAISS snapshot is only
+        rewritten when there is none yet or the log tail has grown large,
+        and then in a background thread, so callers holding a write lock
+        (IndexService) never wait for it.
+        """
+        if not self.index_dir:
+            return
+
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self.store.flush()
+
+            if self._sections is not None:
+                self._save_sections()
+
+            if self._files_changed:
+                self._save_files()
+
+            if self._manifest is None:
+                # After reset() or a rebuild the snapshot on disk is stale.
+                # Until the new one is written, a manifest without one
+                # makes load_index() rebuild from the chunk store.
+                self._write_manifest({
+                    **self._config(),
+                    "buffered": self._buffered,
+                    "generation": self._generation,
+                    "snapshot": None,
+                    # Deleted by the compaction, or on load if it never ran
+                    "previous": self._snapshot_file,
+                })
+                compact = True
+            else:
+                tail = self._tail_size()
+                compact = tail > max(self.compact_min, self.compact_ratio * self._manifest["indexed"])
+
+        if compact:
+            self.compact(background=True)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._path("manifest.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path("manifest.json"))
+
+    def wait_for_compaction(self):
+        """
+        Block until a running background compaction has finished, e.g.
+        before the process exits or gives up its directory lock.
+        """
+        with self._compact_lock:
+            pass
+
+    def _save_sections(self):
+        directory = self._path("sections")
+        os.makedirs(directory, exist_ok=True)
+
+        self._sections.save_index()
+
+        members = {
+            str(section_id): ids.tolist()
+            for section_id, ids in self._members.items()
+        }
+
+        tmp_path = os.path.join(directory, "members.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(members, f)
+        os.replace(tmp_path, os.path.join(directory, "members.json"))
+
+    def compact(self, background=False):
+        """
+        Write a snapshot of the in-memory index so loading no longer has
+        to replay the log. Returns the thread when background=True.
+        """
+        if background:
+            thread = threading.Thread(target=self.compact, daemon=True)
+            thread.start()
+            return thread
+
+        if not self.index_dir:
+            return
+
+        # Skip if another compaction is already running
+        if not self._compact_lock.acquire(blocking=False):
+            return
+
+        try:
+            with self._lock:
+                epoch = self._epoch
+                self.store.flush()
+                data = faiss.serialize_index(self.index)
+                bm25_snapshot = self.bm25.snapshot()
+                centroids = self._centroid_snapshot()
+                self._generation += 1
+                manifest = {
+                    **self._config(),
+                    "indexed": len(self.store),
+                    "deletes_applied": self.store.num_deleted(),
+                    "buffered": self._buffered,
+                    "generation": self._generation,
+                    "snapshot": f"index.{self._generation}.bin",
+                }
+
+            # Slow part outside the lock: writes and searches can go on
+            data.tofile(self._path(manifest["snapshot"]))
+            BM25Index.save(bm25_snapshot, self.index_dir)
+            self._save_centroids(centroids)
+
+            with self._lock:
+                if self._epoch != epoch:
+                    # Reset or rebuilt meanwhile: the snapshot is of the old
+                    # index, and the next save_index() compacts the new one
+                    os.remove(self._path(manifest["snapshot"]))
+                    return
+
+                # Under the lock, so a save_index() cannot overwrite it
+                self._write_manifest(manifest)
+                old_snapshot = self._snapshot_file
+                self._manifest = manifest
+                self._snapshot_file = manifest["snapshot"]
+
+            if old_snapshot and os.path.exists(self._path(old_snapshot)):
+                os.remove(self._path(old_snapshot))
+
+        finally:
+            self._compact_lock.release()
 
-        faiss.write_index(self.index, "data/faiss_index/index.bin")
+    def _centroid_snapshot(self):
+        sources = list(self._centroid_counts)
+        sums = [self._centroid_sums[source] for source in sources]
 
-        with open("data/faiss_index/meta.pkl", "wb") as f:
-            pickle.dump((self.texts, self.sources), f)
+        return {
+            "sources": np.array(sources, dtype=str),
+            "sums": np.vstack(sums) if sums else np.zeros((0, self.dimension), dtype="float32"),
+            "counts": np.array([self._centroid_counts[source] for source in sources], dtype="int64"),
+            # What the snapshot covers, so the log tail can be replayed
+            "indexed": len(self.store),
+            "deletes_applied": self.store.num_deleted(),
+        }
+
+    def _save_centroids(self, snapshot):
+        tmp_path = self._path("centroids.npz.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **snapshot)
+        os.replace(tmp_path, self._path("centroids.npz"))
+
+    def _load_centroids(self):
+        self._centroid_sums = {}
+        self._centroid_counts = {}
+        indexed = 0
+        deletes_applied = 0
+
+        path = self._path("centroids.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                for source, vector_sum, count in zip(
+                    data["sources"].tolist(), data["sums"], data["counts"].tolist()
+                ):
+                    self._centroid_sums[source] = vector_sum.astype("float32")
+                    self._centroid_counts[source] = count
+
+                indexed = int(data["indexed"])
+                deletes_applied = int(data["deletes_applied"])
+
+        # A snapshot from before a reset(): rebuild from the live chunks
+        if indexed > len(self.store):
+            self._centroid_sums = {}
+            self._centroid_counts = {}
+            self._accumulate_centroids(self.store.live_ids())
+            return
+
+        # Replay chunks added and deleted since the snapshot
+        self._accumulate_centroids(np.arange(indexed, len(self.store), dtype="int64"))
+
+        deletes = self.store.deletes_since(deletes_applied)
+        if deletes:
+            self._accumulate_centroids(np.array(deletes, dtype="int64"), sign=-1)
 
     def load_index(self):
-        self.index = faiss.read_index("data/faiss_index/index.bin")
+        if os.path.exists(self._path("files.json")):
+            with open(self._path("files.json")) as f:
+                self._files = json.load(f)
+
+        if not os.path.exists(self._path("manifest.json")):
+            self._load_legacy()
+        else:
+            self._load_snapshot()
+
+        if self._snapshot_file is None:
+            # Saved without a snapshot: the keyword index and centroids on
+            # disk may be from before a reset
+            self.bm25 = BM25Index()
+            self._centroid_sums = {}
+            self._centroid_counts = {}
+            self._accumulate_centroids(self.store.live_ids())
+        else:
+            self._load_centroids()
+
+            # The keyword index snapshot may lag behind the chunk store
+            self.bm25 = BM25Index.load(self.index_dir)
+            if len(self.bm25) > len(self.store):
+                self.bm25 = BM25Index()
+
+        for idx in range(len(self.bm25), len(self.store)):
+            self.bm25.add([idx], [self.store.text(idx)])
+
+    def _load_snapshot(self):
+        with open(self._path("manifest.json")) as f:
+            manifest = json.load(f)
+
+        for name in self._config():
+            # Manifests written before storage modes existed lack some keys
+            if name in manifest:
+                setattr(self, name, manifest[name])
+
+        self._generation = manifest["generation"]
+        if manifest["snapshot"] is None:
+            # Saved before its first snapshot was written (see save_index)
+            previous = manifest.get("previous")
+            if previous and os.path.exists(self._path(previous)):
+                os.remove(self._path(previous))
+            self._rebuild()
+            return
 
-        with open("data/faiss_index/meta.pkl", "rb") as f:
-            self.texts, self.sources = pickle.load(f)
+        self.index = faiss.read_index(self._path(manifest["snapshot"]))
+        self._manifest = manifest
+        self._snapshot_file = manifest["snapshot"]
+
+        self._buffered = manifest.get("buffered", False)
+
+        # Older IVF snapshots were wrapped in an IndexIDMap whose ids
+        # went wrong after deletes; rebuild them from the stored vectors
+        if (
+            not self._buffered
+            and self._stores_ids()
+            and isinstance(faiss.downcast_index(self.index), faiss.IndexIDMap)
+        ):
+            self._rebuild()
+            return
+
+        # Replay the log written since the snapshot
+        indexed = manifest["indexed"]
+        if len(self.store) > indexed:
+            ids = np.arange(indexed, len(self.store), dtype="int64")
+            self.index.add_with_ids(self.store.vectors(ids), ids)
+
+        deletes = self.store.deletes_since(manifest["deletes_applied"])
+        if deletes and self.supports_remove():
+            self.index.remove_ids(faiss.IDSelectorBatch(np.array(deletes, dtype="int64")))
+
+        # The log may have brought in enough vectors to train
+        if self._buffered and self.num_chunks() >= self.min_training_size():
+            self._rebuild()
+
+    def _load_legacy(self):
+        """
+        Convert an index saved by older versions (index.bin holding plain
+        vectors in chunk order, texts in meta.pkl or the chunk store).
+        """
+        legacy = faiss.read_index(self._path("index.bin"))
+
+        config_path = self._path("config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                for name, value in json.load(f).items():
+                    setattr(self, name, value)
+        else:
+            self.index_type = "flat"
+
+        ivf = faiss.try_extract_index_ivf(legacy)
+        if ivf is not None:
+            ivf.make_direct_map()
+        vectors = legacy.reconstruct_n(0, legacy.ntotal)
+
+        meta_path = self._path("meta.pkl")
+        if os.path.exists(meta_path) and len(self.store) == 0:
+            with open(meta_path, "rb") as f:
+                texts, sources = pickle.load(f)
+
+            # Consecutive chunks of one source are appended together
+            start = 0
+            for end in range(1, len(texts) + 1):
+                if end == len(texts) or sources[end] != sources[start]:
+                    self.store.append(texts[start:end], sources[start], vectors[start:end])
+                    start = end
+        elif not self.store.has_vectors():
+            self.store.write_vectors(vectors)
+
+        self._rebuild()
+        self.bm25.add(range(len(self.store)), [self.store.text(i) for i in range(len(self.store))])
+        self._accumulate_centroids(self.store.live_ids())
+        self.compact()
+
+        for name in ("index.bin", "config.json", "meta.pkl"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
 
     def reset(self):
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.texts = []
-        self.sources = []
+        with self._lock:
+            self.index = self._build_index()
+            self._buffered = False
+            self.store.reset()
+            self.bm25 = BM25Index()
+            self._centroid_sums = {}
+            self._centroid_counts = {}
+            self._duplicate_index = None
+            self._files = {}
+            self._files_changed = True
+            self._invalidate_snapshot()
+            self.version = next(_versions)
+
+            if self._has_sections():
+                self._section_index().reset()
+                self._members = {}
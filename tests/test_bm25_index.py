@@ -0,0 +1,100 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+from models.bm25_index import BM25Index, tokenize
+
+
+DOCUMENTS = [
+    "sparse attention for long documents",
+    "attention is all you need attention attention",
+    "graph neural networks for molecules",
+    "long range dependencies in recurrent networks",
+    "protein structure prediction with attention",
+    "molecules and graph kernels",
+]
+
+
+def brute_force_scores(documents, query, k1=1.5, b=0.75):
+    tokenized = [tokenize(document) for document in documents]
+    average = sum(map(len, tokenized)) / len(tokenized)
+    scores = {}
+
+    for term in set(tokenize(query)):
+        containing = [i for i, tokens in enumerate(tokenized) if term in tokens]
+        idf = math.log(1 + (len(documents) - len(containing) + 0.5) / (len(containing) + 0.5))
+
+        for i in containing:
+            tf = Counter(tokenized[i])[term]
+            norm = k1 * (1 - b + b * len(tokenized[i]) / average)
+            scores[i] = scores.get(i, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+    return scores
+
+
+def assert_matches_brute_force(index, documents, query):
+    ids, scores = index.search(query, k=len(documents))
+    expected = brute_force_scores(documents, query)
+
+    assert sorted(ids.tolist()) == sorted(expected)
+    for idx, score in zip(ids.tolist(), scores.tolist()):
+        assert math.isclose(score, expected[idx], rel_tol=1e-5)
+
+
+def test_scores_match_brute_force():
+    index = BM25Index()
+    index.add(range(len(DOCUMENTS)), DOCUMENTS)
+
+    for query in ("attention", "graph molecules", "long networks", "unknown words"):
+        assert_matches_brute_force(index, DOCUMENTS, query)
+
+
+def test_postings_are_delta_encoded():
+    index = BM25Index()
+    index.add(range(len(DOCUMENTS)), DOCUMENTS)
+
+    tid = index._term_ids["attention"]
+    assert list(index._tail_deltas[tid]) == [0, 1, 3]
+    assert list(index._tail_tfs[tid]) == [1, 3, 1]
+
+    ids, tfs = index._postings(tid)
+    assert ids.tolist() == [0, 1, 4]
+    assert tfs.tolist() == [1, 3, 1]
+
+
+def test_tail_postings_after_reload(tmp_path):
+    index = BM25Index()
+    index.add(range(4), DOCUMENTS[:4])
+    BM25Index.save(index.snapshot(), str(tmp_path))
+
+    # Loaded postings are the base; new ones go to the tails and continue
+    # the deltas from the last loaded id
+    reloaded = BM25Index.load(str(tmp_path))
+    reloaded.add(range(4, len(DOCUMENTS)), DOCUMENTS[4:])
+
+    tid = reloaded._term_ids["attention"]
+    assert reloaded._base_deltas[tid].tolist() == [0, 1]
+    assert list(reloaded._tail_deltas[tid]) == [3]
+
+    for query in ("attention", "graph molecules", "long networks"):
+        assert_matches_brute_force(reloaded, DOCUMENTS, query)
+
+    # A second round trip merges base and tail
+    BM25Index.save(reloaded.snapshot(), str(tmp_path))
+    merged = BM25Index.load(str(tmp_path))
+    assert merged._base_deltas[tid].tolist() == [0, 1, 3]
+    assert_matches_brute_force(merged, DOCUMENTS, "attention graph")
+
+
+def test_exclude_and_include():
+    index = BM25Index()
+    index.add(range(len(DOCUMENTS)), DOCUMENTS)
+
+    ids, _ = index.search("attention", exclude=np.array([1]))
+    assert sorted(ids.tolist()) == [0, 4]
+
+    include = np.zeros(len(DOCUMENTS), dtype=bool)
+    include[4] = True
+    ids, _ = index.search("attention", include=include)
+    assert ids.tolist() == [4]
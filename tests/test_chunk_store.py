@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+from models.chunk_store import ChunkStore
+
+
+DIMENSION = 4
+
+
+def vectors(count, start=0):
+    return np.arange(start * DIMENSION, (start + count) * DIMENSION, dtype="float32").reshape(count, DIMENSION)
+
+
+def test_flushed_chunks_survive_reopen(tmp_path):
+    store = ChunkStore(str(tmp_path), DIMENSION)
+    store.append(["one", "two"], "a.pdf", vectors(2), metadata=[{"page_start": 1}, {"page_start": 2}])
+    store.append(["three"], "b.pdf", vectors(1, start=2))
+    store.delete([1])
+    store.flush()
+
+    reopened = ChunkStore(str(tmp_path), DIMENSION)
+    assert len(reopened) == 3
+    assert [reopened.text(i) for i in range(3)] == ["one", "two", "three"]
+    assert reopened.source(2) == "b.pdf"
+    assert reopened.metadata(1)["page_start"] == 2
+    assert np.array_equal(reopened.vectors(np.arange(3)), vectors(3))
+    assert reopened.live_ids().tolist() == [0, 2]
+
+
+def test_unflushed_chunks_are_lost(tmp_path):
+    store = ChunkStore(str(tmp_path), DIMENSION)
+    store.append(["one"], "a.pdf", vectors(1))
+    store.flush()
+
+    # Never flushed, as if the process died here
+    store.append(["two"], "a.pdf", vectors(1, start=1))
+    store.delete([0])
+
+    reopened = ChunkStore(str(tmp_path), DIMENSION)
+    assert len(reopened) == 1
+    assert reopened.num_deleted() == 0
+
+
+def test_interrupted_flush_is_dropped(tmp_path):
+    store = ChunkStore(str(tmp_path), DIMENSION)
+    store.append(["one", "two"], "a.pdf", vectors(2))
+    store.flush()
+
+    # A flush that wrote texts and vectors but died before offsets.bin,
+    # the commit point
+    with open(os.path.join(tmp_path, "texts.bin"), "ab") as f:
+        f.write(b"half written")
+    with open(os.path.join(tmp_path, "vectors.bin"), "ab") as f:
+        f.write(vectors(1, start=9).tobytes())
+
+    reopened = ChunkStore(str(tmp_path), DIMENSION)
+    assert len(reopened) == 2
+
+    # The next flush writes over the leftovers
+    reopened.append(["three"], "b.pdf", vectors(1, start=2))
+    reopened.flush()
+
+    reopened = ChunkStore(str(tmp_path), DIMENSION)
+    assert [reopened.text(i) for i in range(3)] == ["one", "two", "three"]
+    assert np.array_equal(reopened.vectors(np.arange(3)), vectors(3))
+
+
+def test_deletes_since(tmp_path):
+    store = ChunkStore(str(tmp_path), DIMENSION)
+    store.append(["one", "two", "three"], "a.pdf", vectors(3))
+    store.delete([0])
+    store.flush()
+    store.delete([2, 0])
+    store.flush()
+
+    reopened = ChunkStore(str(tmp_path), DIMENSION)
+    assert reopened.num_deleted() == 2
+    assert list(reopened.deletes_since(1)) == [2]
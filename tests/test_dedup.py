@@ -0,0 +1,65 @@
+import numpy as np
+
+from models.dedup import BANDS, NearDuplicateIndex, minhash_bands, minhash_signatures
+
+
+ABSTRACT = (
+    "We propose a new network architecture based solely on attention mechanisms, "
+    "dispensing with recurrence and convolutions entirely. Experiments on two machine "
+    "translation tasks show these models to be superior in quality while being more "
+    "parallelizable and requiring significantly less time to train."
+)
+
+
+def test_signature_is_deterministic():
+    signature = minhash_bands(ABSTRACT)
+
+    assert signature.shape == (BANDS,)
+    assert signature.dtype == np.uint64
+    assert signature.all()
+    assert np.array_equal(signature, minhash_bands(ABSTRACT))
+    # Case and punctuation don't change the words
+    assert np.array_equal(signature, minhash_bands(ABSTRACT.upper().replace(",", "")))
+
+
+def test_text_without_words_has_no_signature():
+    assert not minhash_bands(" ... ").any()
+    assert NearDuplicateIndex().find(minhash_bands("")) is None
+
+
+def test_finds_near_duplicates_only():
+    index = NearDuplicateIndex()
+    index.add([7], [minhash_bands(ABSTRACT)])
+
+    # A preprint with one word changed
+    assert index.find(minhash_bands(ABSTRACT.replace("superior", "better"))) == 7
+    assert index.find(minhash_bands("Graph neural networks predict molecular properties from structure.")) is None
+
+
+def test_unique_within_a_batch():
+    index = NearDuplicateIndex()
+    index.add([0], [minhash_bands("an earlier chunk about protein folding and structure prediction")])
+
+    signatures = minhash_signatures([
+        ABSTRACT,
+        "an earlier chunk about protein folding and structure prediction",
+        ABSTRACT + " ",
+        "something else entirely, about graph kernels",
+    ])
+
+    assert index.unique(signatures).tolist() == [True, False, False, True]
+    # unique() does not add the batch
+    assert len(index) == 1
+
+
+def test_removed_chunks_no_longer_match():
+    index = NearDuplicateIndex()
+    signature = minhash_bands(ABSTRACT)
+    index.add([1, 2], [signature, signature])
+
+    index.remove([1])
+    assert index.find(signature) == 2
+
+    index.remove([2])
+    assert index.find(signature) is None
+    assert len(index) == 0
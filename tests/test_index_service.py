@@ -0,0 +1,142 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from models.directory_lock import DirectoryLock, DirectoryLockedError
+from models.index_service import IndexService, ReadWriteLock, index_directory
+
+
+DIMENSION = 8
+NAMESPACE = "alice/default"
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).random((count, DIMENSION), dtype="float32")
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read():
+            # Only passes if all three readers are inside at once
+            inside.wait()
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not inside.broken
+
+
+def test_writer_excludes_readers_and_is_preferred():
+    lock = ReadWriteLock()
+    events = []
+
+    reader_inside = threading.Event()
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reader_inside.set()
+            release_reader.wait(5)
+            events.append("first reader out")
+
+    def writer():
+        with lock.write():
+            events.append("writer")
+
+    def late_reader():
+        with lock.read():
+            events.append("late reader")
+
+    threads = [threading.Thread(target=first_reader)]
+    threads[0].start()
+    reader_inside.wait(5)
+
+    threads.append(threading.Thread(target=writer))
+    threads[1].start()
+    # The writer is waiting; a reader arriving now queues behind it
+    while not lock._writers_waiting:
+        time.sleep(0.001)
+
+    threads.append(threading.Thread(target=late_reader))
+    threads[2].start()
+    time.sleep(0.05)
+    assert events == []
+
+    release_reader.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert events == ["first reader out", "writer", "late reader"]
+
+
+def test_concurrent_writes_and_reads(tmp_path):
+    service = IndexService(root=str(tmp_path), dimension=DIMENSION, dedupe=False)
+    errors = []
+
+    def write(number):
+        try:
+            for paper in range(5):
+                source = f"writer{number}-paper{paper}.pdf"
+                texts = [f"{source} chunk {i}" for i in range(4)]
+                service.add_documents(NAMESPACE, random_vectors(4, seed=10 * number + paper), texts, source)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(20):
+                service.search(NAMESPACE, random_vectors(1)[0], k=3)
+                service.size(NAMESPACE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(number,)) for number in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert service.size(NAMESPACE) == 4 * 5 * 4
+    service.close()
+
+    # Every write was saved, with no chunk lost or overwritten
+    reopened = IndexService(root=str(tmp_path), dimension=DIMENSION)
+    assert reopened.size(NAMESPACE) == 80
+    assert len(reopened.sources(NAMESPACE)) == 20
+    reopened.close()
+
+
+def test_size_follows_writes(tmp_path):
+    service = IndexService(root=str(tmp_path), dimension=DIMENSION, dedupe=False)
+    assert service.size(NAMESPACE) == 0
+
+    service.add_documents(NAMESPACE, random_vectors(3), ["one", "two", "three"], "a.pdf")
+    assert service.size(NAMESPACE) == 3
+
+    service.remove_document(NAMESPACE, "a.pdf")
+    assert service.size(NAMESPACE) == 0
+    service.close()
+
+
+def test_open_namespace_is_locked(tmp_path):
+    service = IndexService(root=str(tmp_path), dimension=DIMENSION)
+    service.size(NAMESPACE)
+
+    # flock locks are per open file, so a second lock in this process
+    # conflicts just like one in another process would
+    with pytest.raises(DirectoryLockedError):
+        DirectoryLock(index_directory(NAMESPACE, str(tmp_path))).acquire()
+
+    service.close()
+    with DirectoryLock(index_directory(NAMESPACE, str(tmp_path))):
+        pass
@@ -0,0 +1,71 @@
+import pytest
+
+from models.chunker import TokenChunker
+from models.paper_compressor import PaperCompressor, clean_text
+
+
+SENTENCES = [
+    "Transformers replace recurrence with attention over every token.",
+    "The model is trained on eight GPUs for three days (see Fig. 2 and Eq. 4).",
+    "Results show that the approach scales to long documents.",
+    "Prior work by Smith et al. used sparse patterns instead.",
+    "We compare against recurrent baselines [12] and convolutional ones [3].",
+]
+
+# Raw page texts as a PDF reader returns them: wrapped lines, words
+# hyphenated across lines and pages, headings, page numbers, runs of
+# spaces and pages without text
+PAGES = [
+    "A Study of Attention\nJane Doe  and  John Roe\n\nAbstract\n" + " ".join(SENTENCES[:3]) + "\nWe intro-\nduce a model that is effi-",
+    "cient on long inputs. " + "\n".join(SENTENCES) + "\n2\n",
+    "",
+    "1. Introduction\n" + " ".join(SENTENCES * 3) + "\n3\n2 Related Work\n" + "\n".join(SENTENCES[::-1]),
+    None,
+    "3.1 Experimental Setup\n" + " ".join(SENTENCES * 4) + "\nReferences\n[1] A. Author. A cited paper title. 2017.",
+]
+
+
+def make_compressor(pages, max_tokens):
+    compressor = PaperCompressor(chunker=TokenChunker(max_tokens=max_tokens, overlap=max_tokens // 4))
+    # The page texts stand in for a PDF
+    compressor.iter_pages = lambda pdf_file: iter(enumerate(pages, start=1))
+    return compressor
+
+
+def whole_document_chunks(compressor, pages):
+    # What extract_content() chunks: the cleaned text of all pages at once
+    text = "".join(
+        f"\n\n[Page {number}]\n\n" + page
+        for number, page in enumerate(pages, start=1)
+        if page
+    )
+    return compressor.chunk_text(clean_text(text).strip())
+
+
+@pytest.mark.parametrize("max_tokens", [16, 40, 256])
+def test_stream_chunks_match_chunk_text(max_tokens):
+    compressor = make_compressor(PAGES, max_tokens)
+
+    streamed = list(compressor.stream_chunks("paper.pdf"))
+
+    assert streamed == whole_document_chunks(compressor, PAGES)
+    assert len(streamed) > 1 or max_tokens == 256
+
+
+def test_stream_chunks_provenance():
+    compressor = make_compressor(PAGES, 40)
+    chunks = list(compressor.stream_chunks("paper.pdf"))
+
+    # Words hyphenated across lines are joined
+    assert any("We introduce a model" in chunk["text"] for chunk in chunks)
+    assert {chunk["section"] for chunk in chunks} >= {"Abstract", "1. Introduction", "2 Related Work"}
+    assert all(chunk["page_start"] <= chunk["page_end"] for chunk in chunks)
+    assert chunks[-1]["page_end"] == 6
+
+
+def test_stream_chunks_collects_citations():
+    compressor = make_compressor(PAGES, 40)
+    citations = set()
+
+    list(compressor.stream_chunks("paper.pdf", citations=citations))
+    assert citations == {"1", "3", "12"}
@@ -0,0 +1,131 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from models.scaledown_client import ScaleDownClient
+
+
+class StubAPI(ThreadingHTTPServer):
+    """
+    Local stand-in for the ScaleDown API. Each POST takes the next
+    scripted (status, body) pair; once the script is used up every
+    request succeeds with "compressed: <prompt>".
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.prompts = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/compress/raw/"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.prompts.append(payload["prompt"])
+
+        if self.server.script:
+            status, body = self.server.script.pop(0)
+        else:
+            status, body = 200, {
+                "successful": True,
+                "results": {"success": True, "compressed_prompt": "compressed: " + payload["prompt"]}
+            }
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    server = StubAPI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(api, tmp_path, **options):
+    return ScaleDownClient(
+        "test-key",
+        base_url=api.url,
+        requests_per_second=None,
+        backoff_base=0,
+        cache_path=str(tmp_path / "responses.db"),
+        **options
+    )
+
+
+def test_cache_hit_sends_no_request(api, tmp_path):
+    client = make_client(api, tmp_path)
+    assert client.compress_many(["a", "b", "a"]) == ["compressed: a", "compressed: b", "compressed: a"]
+    client.close()
+    assert sorted(api.prompts) == ["a", "b"]
+
+    # A new client reads the same cache file
+    client = make_client(api, tmp_path)
+    assert client.compress_paper("a") == "compressed: a"
+    assert client.requests_sent == 0
+    client.close()
+
+
+def test_failure_is_not_cached(api, tmp_path):
+    api.script = [(200, {"successful": False})]
+
+    client = make_client(api, tmp_path)
+    assert client.compress_paper("a") is None
+    assert client.compress_paper("a") == "compressed: a"
+    assert api.prompts == ["a", "a"]
+    client.close()
+
+
+def test_cache_is_per_endpoint(api, tmp_path):
+    client = make_client(api, tmp_path)
+    client.compress_paper("a")
+    client.close()
+
+    # Same server, but a different endpoint URL: not answered from the cache
+    client = ScaleDownClient(
+        "test-key",
+        base_url=api.url + "?version=2",
+        requests_per_second=None,
+        cache_path=str(tmp_path / "responses.db")
+    )
+    client.compress_paper("a")
+    assert api.prompts == ["a", "a"]
+    client.close()
+
+
+def test_retries_server_errors(api, tmp_path):
+    api.script = [(503, {}), (429, {})]
+
+    client = make_client(api, tmp_path)
+    assert client.compress_paper("a") == "compressed: a"
+    assert client.retries == 2
+    assert api.prompts == ["a", "a", "a"]
+    client.close()
+
+
+def test_gives_up_after_max_retries(api, tmp_path):
+    api.script = [(503, {})] * 3
+
+    client = make_client(api, tmp_path, max_retries=2)
+    assert client.compress_paper("a") is None
+    assert len(api.prompts) == 3
+
+    # Nothing was cached, so the next call asks again
+    assert client.compress_paper("a") == "compressed: a"
+    client.close()
@@ -0,0 +1,166 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from models.vector_engine import VectorEngine
+
+
+DIMENSION = 8
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).random((count, DIMENSION), dtype="float32")
+
+
+def texts(prefix, count):
+    return [f"{prefix} chunk number {i} about topic {prefix}{i}" for i in range(count)]
+
+
+def open_engine(directory, **options):
+    # compact_min keeps save_index() from compacting the log tail
+    options.setdefault("compact_min", 10_000)
+    return VectorEngine(dimension=DIMENSION, index_dir=str(directory), dedupe=False, **options)
+
+
+def manifest(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        return json.load(f)
+
+
+def test_log_replay_after_crash(tmp_path):
+    engine = open_engine(tmp_path)
+    first = random_vectors(20, seed=1)
+    engine.add_documents(first, texts("a", 20), "a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+    assert manifest(tmp_path)["indexed"] == 20
+
+    # Written to the log only: no new snapshot
+    second = random_vectors(10, seed=2)
+    engine.add_documents(second, texts("b", 10), "b.pdf")
+    engine.remove_document("a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+    assert manifest(tmp_path)["indexed"] == 20
+
+    expected = engine.search(second[3], k=5)
+
+    # Opened again without close(), as after a crash
+    reloaded = open_engine(tmp_path)
+    assert reloaded.num_chunks() == 10
+    assert reloaded.index.ntotal == 10
+    assert reloaded.sources() == ["b.pdf"]
+    assert reloaded.search(second[3], k=5) == expected
+    assert reloaded.bm25.search("b3")[0].tolist() == [23]
+
+
+def test_unsaved_changes_are_lost(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_documents(random_vectors(5), texts("a", 5), "a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+
+    engine.add_documents(random_vectors(5, seed=1), texts("b", 5), "b.pdf")
+
+    reloaded = open_engine(tmp_path)
+    assert reloaded.num_chunks() == 5
+    assert reloaded.sources() == ["a.pdf"]
+
+
+def test_compaction_snapshots_the_log(tmp_path):
+    engine = open_engine(tmp_path, compact_min=0, compact_ratio=0)
+    engine.add_documents(random_vectors(10), texts("a", 10), "a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+    first_snapshot = manifest(tmp_path)["snapshot"]
+
+    engine.add_documents(random_vectors(5, seed=1), texts("b", 5), "b.pdf")
+    engine.remove_document("a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+
+    snapshot = manifest(tmp_path)
+    assert snapshot["indexed"] == 15
+    assert snapshot["deletes_applied"] == 10
+    assert snapshot["snapshot"] != first_snapshot
+    # The replaced snapshot file is removed
+    assert not os.path.exists(os.path.join(tmp_path, first_snapshot))
+
+    reloaded = open_engine(tmp_path)
+    assert reloaded.index.ntotal == 5
+    assert reloaded.sources() == ["b.pdf"]
+
+
+def test_reset_before_compaction_rebuilds_on_load(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_documents(random_vectors(10), texts("a", 10), "a.pdf")
+    engine.save_index()
+    engine.wait_for_compaction()
+
+    engine.reset()
+    engine.add_documents(random_vectors(3, seed=1), texts("b", 3), "b.pdf")
+
+    # The process stops before the background compaction can run
+    with engine._compact_lock:
+        engine.save_index()
+    assert manifest(tmp_path)["snapshot"] is None
+
+    reloaded = open_engine(tmp_path)
+    assert reloaded.num_chunks() == 3
+    assert reloaded.sources() == ["b.pdf"]
+    assert reloaded.bm25.search("a1")[0].tolist() == []
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_filtered_search_matches_brute_force(index_type):
+    engine = VectorEngine(dimension=DIMENSION, index_type=index_type, index_dir=None, dedupe=False)
+    vectors = random_vectors(60)
+
+    for number in range(3):
+        rows = slice(20 * number, 20 * (number + 1))
+        engine.add_documents(
+            vectors[rows],
+            texts(f"p{number}", 20),
+            f"paper{number}.pdf",
+            metadata=[{"page_start": page, "page_end": page, "year": 2020 + number} for page in range(20)]
+        )
+    engine.remove_document("paper2.pdf")
+
+    query = random_vectors(1, seed=5)[0]
+    search_filter = {"source": ["paper0.pdf", "paper2.pdf"], "page": (5, 14)}
+    results = engine.search(query, k=4, filter=search_filter)
+
+    # Only live chunks of paper0 on pages 5-14 qualify
+    candidates = np.arange(5, 15)
+    scores = vectors[candidates] @ query
+    expected = candidates[np.argsort(-scores)[:4]]
+
+    assert [result["id"] for result in results] == expected.tolist()
+    assert {result["source"] for result in results} == {"paper0.pdf"}
+
+
+def test_filter_without_matches_returns_nothing():
+    engine = VectorEngine(dimension=DIMENSION, index_dir=None, dedupe=False)
+    engine.add_documents(random_vectors(5), texts("a", 5), "a.pdf", metadata=[{"year": 2020}] * 5)
+
+    assert engine.search(random_vectors(1)[0], k=3, filter={"year": 1999}) == []
+
+
+def test_near_duplicate_chunks_are_skipped():
+    engine = VectorEngine(dimension=DIMENSION, index_dir=None, dedupe=True)
+    chunk = "transformers replace recurrence with self attention over every token of the input sequence"
+
+    ids = engine.add_documents(random_vectors(2), [chunk, "an unrelated chunk about protein folding and structure"], "a.pdf")
+    assert (ids >= 0).all()
+
+    # The same chunk in a preprint: skipped, and its id is -1
+    ids = engine.add_documents(random_vectors(2, seed=1), [chunk + ".", "graph neural networks on molecules"], "b.pdf")
+    assert ids[0] == -1 and ids[1] >= 0
+    assert engine.num_chunks() == 3
+
+    # Once the original is removed the text can be added again
+    engine.remove_document("a.pdf")
+    ids = engine.add_documents(random_vectors(1, seed=2), [chunk], "c.pdf")
+    assert ids[0] >= 0